@@ -27,10 +27,1125 @@
 
 # Copyright 2019-2020 by Linus Romer
 
-import fontforge,math
+import math,heapq,time
+# FontForge is imported on first use only (see Curvatura.load_fontforge()),
+# such that the geometry and the batch methods for UFO sources and .sfd
+# files (e.g. in worker processes) start without it.
+fontforge = None
+from array import array
+from collections import OrderedDict
+try: # numpy is optional, it only speeds up the batch methods
+	import numpy
+except ImportError:
+	numpy = None
+
+# A compact copy of a fontforge contour that the contour methods of
+# Curvatura work on. The coordinates are kept in the flat arrays x and y,
+# the point properties in the byte array flags (see the constants below)
+# and closed and is_quadratic form the header. A buffer is filled from a
+# fontforge contour in one pass and write_back() only touches the points
+# that have actually changed.
+class ContourBuffer:
+	ON_CURVE = 1
+	SELECTED = 2
+	SMOOTH = 4 # point type 1 or 2 in fontforge
+	
+	def __init__(self,x,y,flags,closed=False,is_quadratic=False):
+		self.x = x
+		self.y = y
+		self.flags = flags
+		self.closed = closed
+		self.is_quadratic = is_quadratic
+		# copies for finding the changes and the index of every point
+		# in the original contour (-1 for inserted points):
+		self.x0 = array('d',x)
+		self.y0 = array('d',y)
+		self.flags0 = bytearray(flags)
+		self.origin = array('l',range(len(x)))
+		self.restructured = False # True iff points were inserted or merged
+		self.topology = None # see Curvatura.topology()
+		
+	def __len__(self):
+		return len(self.x)
+		
+	# Returns a new buffer holding the points of the fontforge contour c.
+	@classmethod
+	def from_contour(cls,c):
+		x = array('d')
+		y = array('d')
+		flags = bytearray()
+		for p in c: # one pass through the points
+			x.append(p.x)
+			y.append(p.y)
+			flags.append((p.on_curve and cls.ON_CURVE) 
+			| (p.selected and cls.SELECTED) 
+			| (p.type in {1,2} and cls.SMOOTH))
+		return cls(x,y,flags,c.closed,c.is_quadratic)
+		
+	# Returns True iff at least one point of the buffer is selected.
+	def any_selected(self):
+		for f in self.flags:
+			if f & self.SELECTED:
+				return True
+		return False
+		
+	# Replaces the n points starting at index i by the points with
+	# the coordinates xs, ys and the flags fs (the range must not wrap).
+	def replace(self,i,n,xs,ys,fs):
+		self.x[i:i+n] = array('d',xs)
+		self.y[i:i+n] = array('d',ys)
+		self.flags[i:i+n] = bytearray(fs)
+		self.origin[i:i+n] = array('l',[-1]*len(xs))
+		self.restructured = True
+		self.topology = None
+
+	# Same as replace() for several ranges at once, which are given as a
+	# list of tuples (i,n,xs,ys,fs) in ascending order of i (the ranges
+	# must neither overlap nor wrap). The buffer is rebuilt in one pass.
+	def replace_many(self,replacements):
+		if len(replacements) == 0:
+			return
+		x, y, flags, origin = array('d'), array('d'), bytearray(), array('l')
+		k = 0 # the first point that has not been copied yet
+		for i, n, xs, ys, fs in replacements:
+			x += self.x[k:i]
+			y += self.y[k:i]
+			flags += self.flags[k:i]
+			origin += self.origin[k:i]
+			x.extend(xs)
+			y.extend(ys)
+			flags.extend(fs)
+			origin.extend([-1]*len(xs))
+			k = i+n
+		self.x = x+self.x[k:]
+		self.y = y+self.y[k:]
+		self.flags = flags+self.flags[k:]
+		self.origin = origin+self.origin[k:]
+		self.restructured = True
+		self.topology = None
+
+	# Removes the on-curve point i together with its neighbouring
+	# off-curve points i-1 and i+1, such that the two adjacent cubic
+	# segments become one. Returns the index of the starting point of
+	# the merged segment. A closed contour keeps starting on-curve.
+	def merge(self,i):
+		l = len(self)
+		if 1 <= i < l-1:
+			del self.x[i-1:i+2], self.y[i-1:i+2], \
+			self.flags[i-1:i+2], self.origin[i-1:i+2]
+			start = i-3
+		else: # the removed points wrap around the end of the contour
+			keep = list(range(i+2,l-1)) if i == 0 else list(range(1,l-2))
+			keep.append(keep.pop(0)) # rotate the off-curve point to the end
+			self.x = array('d',[self.x[k] for k in keep])
+			self.y = array('d',[self.y[k] for k in keep])
+			self.flags = bytearray([self.flags[k] for k in keep])
+			self.origin = array('l',[self.origin[k] for k in keep])
+			start = len(keep)-3
+		self.restructured = True
+		self.topology = None
+		return start % len(self)
+
+	# Removes the on-curve points with the indices nodes together with
+	# their neighbouring off-curve points like merge() does, but for many
+	# nodes at once (the buffer is rebuilt in one pass). A closed contour
+	# keeps starting on-curve.
+	def remove_nodes(self,nodes):
+		if len(nodes) == 0:
+			return
+		l = len(self)
+		removed = bytearray(l)
+		for i in nodes:
+			removed[(i-1)%l] = removed[i] = removed[(i+1)%l] = 1
+		keep = [k for k in range(l) if not removed[k]]
+		if self.closed: # rotate the leading off-curve points to the end
+			r = 0
+			while r < len(keep) and not self.flags[keep[r]] & self.ON_CURVE:
+				r += 1
+			keep = keep[r:]+keep[:r]
+		self.x = array('d',[self.x[k] for k in keep])
+		self.y = array('d',[self.y[k] for k in keep])
+		self.flags = bytearray([self.flags[k] for k in keep])
+		self.origin = array('l',[self.origin[k] for k in keep])
+		self.restructured = True
+		self.topology = None
+
+	# Writes the changes back to the fontforge contour c and returns
+	# the resulting contour. This is c itself if no points have been
+	# inserted or merged (only changed points are touched then) and a
+	# new fontforge contour otherwise.
+	def write_back(self,c):
+		x, y, flags = self.x, self.y, self.flags
+		if not self.restructured:
+			x0, y0, flags0 = self.x0, self.y0, self.flags0
+			for k in range(len(x)):
+				if x[k] != x0[k] or y[k] != y0[k]:
+					p = c[k]
+					p.x, p.y = x[k], y[k]
+				if flags[k] != flags0[k]:
+					c[k].selected = bool(flags[k] & self.SELECTED)
+			return c
+		new = Curvatura.load_fontforge().contour()
+		new.is_quadratic = self.is_quadratic
+		for k in range(len(x)):
+			if self.origin[k] >= 0:
+				p = c[self.origin[k]]
+				p.x, p.y = x[k], y[k]
+			else:
+				p = fontforge.point(x[k],y[k],bool(flags[k] & self.ON_CURVE))
+			p.selected = bool(flags[k] & self.SELECTED)
+			new += p
+		new.closed = self.closed
+		return new
+
+# The index of a contour buffer c that the actions iterate over, built
+# in one pass over the on-curve points: the mask selected of the points
+# that count as selected (all of them if is_glyph_variant), the starting
+# points of the selected cubic segments (see segment_selected_cubic())
+# with the indices of their four points in segment_points and the
+# selected smooth nodes between two segments (see 
+# segments_selected_cubic() and segments_selected_quadratic()) with the
+# indices of the points from i-3 to i+3 (i-2 to i+2 for quadratic
+# contours) around every node i in neighbours (node_index maps the nodes
+# to their positions in these lists). It only depends on the
+# flags of the points, hence compatible contours (e.g. of the masters of
+# a glyph) share it. Inserting or merging points invalidates it (see 
+# Curvatura.topology()).
+class Topology:
+	def __init__(self,c,is_glyph_variant):
+		self.is_glyph_variant = is_glyph_variant
+		l = len(c)
+		f = c.flags
+		on, smooth = ContourBuffer.ON_CURVE, ContourBuffer.SMOOTH
+		if is_glyph_variant:
+			self.selected = bytearray([1])*l
+		else:
+			self.selected = bytearray(1 if p & ContourBuffer.SELECTED else 0
+			for p in f)
+		sel = self.selected
+		degree = 2 if c.is_quadratic else 3 # the points per segment
+		ons = [k for k in range(l) if f[k] & on]
+		# the distances to the next on-curve points (0 for none):
+		gaps = [ons[k+1]-ons[k] for k in range(len(ons)-1)]
+		if ons:
+			gaps.append(ons[0]+l-ons[-1] if c.closed else 0)
+		self.segments, self.segment_points = [], []
+		self.nodes, self.neighbours = [], []
+		for k in range(len(ons)):
+			i = ons[k]
+			if gaps[k] != degree:
+				continue
+			if degree == 3 and l > 3:
+				i1, i2, i3 = (i+1)%l, (i+2)%l, (i+3)%l
+				if sel[i] and sel[i3] or sel[i2] or sel[i1]:
+					self.segments.append(i)
+					self.segment_points.append((i,i1,i2,i3))
+			if f[i] & smooth and sel[i] and gaps[k-1] == degree \
+			and (k > 0 or c.closed):
+				self.nodes.append(i)
+				self.neighbours.append(tuple((i+d)%l 
+				for d in range(-degree,degree+1)))
+		self.node_index = dict((self.nodes[k],k) 
+		for k in range(len(self.nodes)))
+
+# A bounded least recently used cache for the results of segment 
+# computations (tunnify, inflection, scale_handles). Segments are keyed
+# by their chord-normalized geometry (see Curvatura.chord_angles), hence
+# translated, rotated or scaled copies of a segment share their result.
+# hits and misses count how much work has been skipped.
+class SegmentCache:
+	def __init__(self,size=100000,digits=12):
+		self.size = size
+		self.digits = digits # significant digits of the keys
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		
+	# Returns the key for the given normalized values, which is None
+	# if a value is not finite (such segments are not cached).
+	def key(self,name,*values):
+		for v in values:
+			if not -1e300 < v < 1e300:
+				return None
+		# relative rounding keeps tiny values apart from 0, where
+		# e.g. scale_handles() is very sensitive:
+		return (name,)+tuple(float("%.*g" % (self.digits,v)) for v in values)
+		
+	# Returns the list of the values for the keys. The values of keys 
+	# that are not in the cache are computed by compute(indices), which
+	# gets the indices of the first occurences of these keys and returns
+	# their values. Every key is computed only once. The values for the
+	# key None are computed, but not cached.
+	def lookup(self,keys,compute):
+		values = [None]*len(keys)
+		missing = OrderedDict() # key -> indices
+		uncached = []
+		for i in range(len(keys)):
+			k = keys[i]
+			if k is None:
+				uncached.append(i)
+			elif k in self.entries:
+				self.entries.move_to_end(k)
+				values[i] = self.entries[k]
+				self.hits += 1
+			elif k in missing: # duplicate within this lookup
+				missing[k].append(i)
+				self.hits += 1
+			else:
+				missing[k] = [i]
+				self.misses += 1
+		first = [indices[0] for indices in missing.values()]
+		computed = compute(first+uncached) if first or uncached else []
+		for n, (k, indices) in enumerate(missing.items()):
+			self.entries[k] = computed[n]
+			for i in indices:
+				values[i] = computed[n]
+		for n in range(len(uncached)):
+			values[uncached[n]] = computed[len(first)+n]
+		while len(self.entries) > self.size:
+			self.entries.popitem(last=False)
+		return values
+		
+	# Returns the statistics of the cache as a dictionary.
+	def stats(self):
+		total = self.hits + self.misses
+		return {"hits": self.hits, "misses": self.misses, 
+		"entries": len(self.entries), 
+		"hit_rate": self.hits/total if total > 0 else 0.}
+
+# A persistent cache on disk (a sqlite file next to the fonts) for the 
+# results of whole glyphs in batch runs. The results are keyed by the 
+# actions and the hash of the outline of the active layer, so unchanged
+# glyphs are restored without being processed again. The whole cache is
+# dropped as soon as the code of Curvatura (or its options) changes. 
+# At most size glyphs are kept, the least recently used are evicted.
+# A read_only cache (e.g. in a worker process) only looks results up,
+# the keys of the hits are collected in used.
+class ResultCache:
+	def __init__(self,path,size=200000,read_only=False):
+		import sqlite3
+		self.size = size
+		self.hits = 0
+		self.misses = 0
+		self.read_only = read_only
+		self.path = path
+		self.used = []
+		if read_only:
+			import os
+			self.db = sqlite3.connect("file:"+os.path.abspath(path)+"?mode=ro",
+			uri=True)
+			return
+		self.db = sqlite3.connect(path)
+		try:
+			self.setup()
+		except sqlite3.DatabaseError: # not a cache file (anymore)
+			self.db.close()
+			import os
+			os.remove(path)
+			self.db = sqlite3.connect(path)
+			self.setup()
+			
+	# Creates the tables if needed and drops all results that have been
+	# computed by another version of the code.
+	def setup(self):
+		self.db.execute("create table if not exists meta "
+		+"(name text primary key, value text)")
+		self.db.execute("create table if not exists results "
+		+"(key text primary key, data blob, used integer)")
+		row = self.db.execute("select value from meta where name = 'code'"
+		).fetchone()
+		code = self.code_hash()
+		if row is None or row[0] != code:
+			self.db.execute("delete from results")
+			self.db.execute("insert or replace into meta values ('code',?)",
+			(code,))
+		self.db.commit()
+		self.run = self.db.execute("select coalesce(max(used),0)+1 "
+		+"from results").fetchone()[0]
+		
+	# Returns a hash of everything the results depend on besides the
+	# outlines: the source of Curvatura and its options.
+	@staticmethod
+	def code_hash():
+		import hashlib
+		h = hashlib.sha1(Curvatura.version.encode())
+		try:
+			with open(__file__,"rb") as f:
+				h.update(f.read())
+		except (IOError,NameError):
+			pass
+		h.update(repr(sorted(Curvatura.energy_options.items())).encode())
+		h.update(repr(sorted(Curvatura.harmonize_options.items())).encode())
+		h.update(repr(sorted(Curvatura.reduce_options.items())).encode())
+		h.update(repr(sorted(Curvatura.tunnify_options.items())).encode())
+		h.update(repr(sorted(Curvatura.layer_options.items())).encode())
+		h.update(repr(numpy is None).encode())
+		return h.hexdigest()
+		
+	# Returns the key for applying the actions to the contour buffers
+	# of a layer (or of the layers of a glyph with the groups masters
+	# of compatible buffers, see master_groups()).
+	@staticmethod
+	def key(actions,buffers,masters=None):
+		import hashlib
+		h = hashlib.sha1(",".join(actions).encode())
+		if masters is not None:
+			h.update(repr(masters).encode())
+		for b in buffers:
+			h.update(bytes([b.closed,b.is_quadratic]))
+			h.update(array('l',[len(b)]).tobytes())
+			h.update(b.x.tobytes())
+			h.update(b.y.tobytes())
+			h.update(bytes(b.flags))
+		return h.hexdigest()
+		
+	# Restores the result for key into the contour buffers (which have
+	# to hold the outline the key has been computed of). Returns False
+	# iff the result is not in the cache.
+	def restore(self,key,buffers):
+		row = self.db.execute("select data from results where key = ?",
+		(key,)).fetchone()
+		contours = None if row is None else self.unpack(bytes(row[0]))
+		if contours is None or len(contours) != len(buffers):
+			self.misses += 1
+			return False
+		for b, (x, y, origin, flags, restructured) in zip(buffers,contours):
+			b.x, b.y, b.origin, b.flags = x, y, origin, flags
+			b.restructured = restructured
+			b.topology = None
+		if self.read_only:
+			self.used.append(key)
+		else:
+			self.touch([key])
+		self.hits += 1
+		return True
+		
+	# Returns the list of the contours (x, y, origin, flags, restructured)
+	# packed by pack() or None if data is broken.
+	@staticmethod
+	def unpack(data):
+		header = array('q')
+		if len(data) < 8:
+			return None
+		header.frombytes(data[:8])
+		n = header[0]
+		if not 0 <= n <= (len(data)-8)//16:
+			return None
+		header.frombytes(data[8:16*n+8])
+		if len(data) != 16*n+8+25*sum(header[1::2]) \
+		or min(header[1::2],default=0) < 0:
+			return None
+		contours = []
+		pos = 16*n+8
+		for k in range(n):
+			l = header[2*k+1]
+			x, y, origin = array('d'), array('d'), array('q')
+			x.frombytes(data[pos:pos+8*l])
+			y.frombytes(data[pos+8*l:pos+16*l])
+			origin.frombytes(data[pos+16*l:pos+24*l])
+			contours.append((x,y,array('l',origin),
+			bytearray(data[pos+24*l:pos+25*l]),bool(header[2*k+2])))
+			pos += 25*l
+		return contours
+		
+	# Marks the results for the keys as used in this run.
+	def touch(self,keys):
+		self.db.executemany("update results set used = ? where key = ?",
+		[(self.run,key) for key in keys])
+		
+	# Stores the result of the processed contour buffers for key.
+	def store(self,key,buffers):
+		self.store_data(key,self.pack(buffers))
+		
+	# Stores the result data of pack() for key.
+	def store_data(self,key,data):
+		self.db.execute("insert or replace into results values (?,?,?)",
+		(key,data,self.run))
+		
+	# Returns the contour buffers packed as bytes (see unpack()).
+	@staticmethod
+	def pack(buffers):
+		header = array('q',[len(buffers)])
+		for b in buffers:
+			header.extend((len(b),b.restructured))
+		data = [header.tobytes()]
+		for b in buffers:
+			data += [b.x.tobytes(),b.y.tobytes(),
+			array('q',b.origin).tobytes(),bytes(b.flags)]
+		return b"".join(data)
+		
+	# Writes the changes to disk after evicting the least recently 
+	# used results beyond size.
+	def commit(self):
+		if self.read_only:
+			return
+		self.db.execute("delete from results where key in (select key "
+		+"from results order by used desc limit -1 offset ?)",(self.size,))
+		self.db.commit()
+		
+	def close(self):
+		self.commit()
+		self.db.close()
+		
+	# Returns the statistics of the cache as a dictionary.
+	def stats(self):
+		total = self.hits + self.misses
+		return {"hits": self.hits, "misses": self.misses, 
+		"hit_rate": self.hits/total if total > 0 else 0.}
+
+# The outline of a .glif file of a UFO source (given as bytes text) as
+# contour buffers, such that Curvatura runs without FontForge. A closed
+# contour is rotated to start on-curve (rotations holds the offsets).
+# to_text() returns the file with the changed outline, everything else
+# (including the other attributes of the points) is kept.
+class Glif:
+	def __init__(self,text):
+		import xml.etree.ElementTree as ET
+		self.text = text
+		self.buffers = []
+		self.points = [] # the point elements of every contour
+		self.rotations = []
+		root = ET.fromstring(text)
+		self.name = root.get("name")
+		outline = root.find("outline")
+		self.items = [] if outline is None else list(outline)
+		for item in self.items:
+			if item.tag != "contour":
+				continue
+			points = item.findall("point")
+			types = [p.get("type","offcurve") for p in points]
+			closed = len(points) == 0 or types[0] != "move"
+			r = 0
+			if closed:
+				while r < len(points) and types[r] == "offcurve":
+					r += 1
+				if r == len(points): # only off-curve points
+					r = 0
+			points = points[r:]+points[:r]
+			x = array('d',[float(p.get("x")) for p in points])
+			y = array('d',[float(p.get("y")) for p in points])
+			flags = bytearray((p.get("type","offcurve") != "offcurve" 
+			and ContourBuffer.ON_CURVE) | (p.get("smooth") == "yes" 
+			and ContourBuffer.SMOOTH) for p in points)
+			self.buffers.append(ContourBuffer(x,y,flags,closed,
+			"qcurve" in types))
+			self.points.append(points)
+			self.rotations.append(r)
+			
+	# Returns True iff the outline has been changed.
+	def changed(self):
+		for b in self.buffers:
+			if b.restructured or b.x != b.x0 or b.y != b.y0:
+				return True
+		return False
+		
+	# Returns the number as short as possible for the file.
+	@staticmethod
+	def number(v):
+		v = round(v,6)
+		return str(int(v)) if v == int(v) else repr(v)
+		
+	# Returns the text of the file with the current outline.
+	def to_text(self):
+		import re
+		import xml.etree.ElementTree as ET
+		from xml.sax.saxutils import escape
+		text = self.text.decode("utf-8")
+		match = re.search(r"([ \t]*)<outline\s*/>|([ \t]*)<outline>.*?</outline>",
+		text,re.S)
+		if match is None:
+			return self.text
+		indent = match.group(1) or match.group(2) or ""
+		unit = indent if indent else "  "
+		attribute = lambda k, v: ' %s="%s"' % (k,escape(v,{'"': "&quot;"}))
+		lines = [indent+"<outline>"]
+		n = 0 # the number of the contour
+		for item in self.items:
+			if item.tag != "contour": # e.g. a component
+				item.tail = None
+				lines.append(indent+unit+("<"+item.tag+"".join(attribute(k,v)
+				for k, v in item.attrib.items())+"/>" if len(item) == 0 
+				else ET.tostring(item,encoding="unicode").strip()))
+				continue
+			b, points = self.buffers[n], self.points[n]
+			n += 1
+			lines.append(indent+unit+"<contour"+"".join(attribute(k,v) 
+			for k, v in item.attrib.items())+">")
+			l = len(b)
+			start = 0 # the first point of the file comes first again
+			if b.closed and self.rotations[n-1] > 0:
+				first = (len(points)-self.rotations[n-1]) % len(points)
+				for k in range(l):
+					if b.origin[k] == first:
+						start = k
+						break
+			for m in range(l):
+				k = (start+m) % l
+				if b.origin[k] >= 0:
+					attrib = dict(points[b.origin[k]].attrib)
+				else: # new point (e.g. a point of inflection)
+					attrib = {"x": "", "y": ""}
+					if b.flags[k] & ContourBuffer.SMOOTH:
+						attrib["smooth"] = "yes"
+				attrib["x"], attrib["y"] = self.number(b.x[k]), self.number(b.y[k])
+				if not b.flags[k] & ContourBuffer.ON_CURVE:
+					attrib.pop("type",None)
+				elif attrib.get("type") != "move":
+					if b.flags[(k-1)%l] & ContourBuffer.ON_CURVE \
+					or not b.closed and k == 0:
+						attrib["type"] = "line"
+					else:
+						attrib["type"] = "qcurve" if b.is_quadratic else "curve"
+				if b.origin[k] < 0: # keep the usual order of the attributes
+					attrib = dict((key,attrib[key]) for key in 
+					("x","y","type","smooth") if key in attrib)
+				lines.append(indent+2*unit+"<point"+"".join(attribute(key,v) 
+				for key, v in attrib.items())+"/>")
+			lines.append(indent+unit+"</contour>")
+		lines.append(indent+"</outline>")
+		return (text[:match.start()]+"\n".join(lines)+text[match.end():]
+		).encode("utf-8")
+
+# The glyph of an .sfd file (given as the list of its lines from 
+# StartChar to EndChar) with the contours of the SplineSet of the Fore
+# layer as contour buffers, such that Curvatura runs on huge .sfd files
+# without FontForge (see stream_sfd()). Contours that cannot be read 
+# (e.g. unusual quadratic ones) are kept as they are. lines() returns 
+# the glyph with the changed contours, everything else is kept.
+class SFDGlyph:
+	def __init__(self,lines,is_quadratic=False):
+		self.text = lines
+		self.name = lines[0].split(":",1)[1].strip()
+		self.is_quadratic = is_quadratic
+		self.start = self.end = None # the lines of the SplineSet
+		layer = None
+		for k in range(len(lines)):
+			line = lines[k].strip()
+			if line in {"Back","Fore"} or line.startswith("Layer:"):
+				layer = line
+			elif line == "SplineSet" and layer == "Fore":
+				self.start = k+1
+			elif line == "EndSplineSet" and self.start is not None:
+				self.end = k
+				break
+		self.buffers = []
+		self.contours = [] # (first line, end line, point lines, buffer)
+		if self.start is None or self.end is None:
+			self.start = self.end = None
+			return
+		k = self.start
+		while k < self.end:
+			first = k
+			k += 1
+			while k < self.end and not self.point_line(lines[k]) == "m":
+				k += 1
+			self.read_contour(lines,first,k)
+			
+	# Returns whether the Fore layer is quadratic after the header line
+	# line of an .sfd file (Order2 or Layer), where is_quadratic is the
+	# value before.
+	@staticmethod
+	def header_quadratic(line,is_quadratic):
+		tokens = line.split()
+		if line.startswith("Order2:"):
+			return tokens[1:2] == ["1"]
+		elif line.startswith("Layer:") and tokens[1:2] == ["1"]:
+			return tokens[2:3] == ["1"] # Fore
+		return is_quadratic
+		
+	# Returns the operator of a point line ("m", "l" or "c") or None.
+	@staticmethod
+	def point_line(line):
+		tokens = line.split()
+		if len(tokens) >= 4 and tokens[2] in {"m","l"} \
+		or len(tokens) >= 8 and tokens[6] == "c":
+			return tokens[2] if tokens[2] in {"m","l"} else "c"
+		return None
+		
+	# Reads the contour of the lines first to end (point lines and 
+	# additional lines like Spiro blocks).
+	def read_contour(self,lines,first,end):
+		points = [] # (coordinates, operator, flags and the rest)
+		spiro = False
+		for k in range(first,end):
+			line = lines[k].strip()
+			if line == "Spiro":
+				spiro = True
+			elif line == "EndSpiro":
+				spiro = False
+			elif not spiro and self.point_line(line):
+				tokens = line.split()
+				n = 2 if tokens[2] in {"m","l"} else 6
+				try:
+					points.append(([float(t) for t in tokens[:n]],tokens[n],
+					" ".join(tokens[n+1:])))
+				except ValueError:
+					return # kept as it is
+		if len(points) == 0 or points[0][1] != "m":
+			return
+		x, y, flags, info = array('d'), array('d'), bytearray(), []
+		on, smooth = ContourBuffer.ON_CURVE, ContourBuffer.SMOOTH
+		for coordinates, op, rest in points:
+			if op == "c":
+				if self.is_quadratic:
+					if coordinates[:2] != coordinates[2:4]:
+						return # not a quadratic segment
+					controls = [coordinates[:2]]
+				else:
+					controls = [coordinates[:2],coordinates[2:4]]
+				for cx, cy in controls:
+					x.append(cx)
+					y.append(cy)
+					flags.append(0)
+					info.append(None)
+			x.append(coordinates[-2])
+			y.append(coordinates[-1])
+			try:
+				pointtype = int(rest.split(",")[0].split()[0]) & 3
+			except (ValueError,IndexError):
+				pointtype = 0
+			# 0 curve and 3 hvcurve are smooth, 1 corner and 2 tangent not:
+			flags.append(on | (pointtype in {0,3} and smooth))
+			info.append(rest)
+		closed = len(info) > 1 and x[0] == x[-1] and y[0] == y[-1] \
+		and len([i for i in info if i is not None]) > 1
+		closing = None
+		if closed: # the last point is the first one again
+			closing = info.pop()
+			x.pop()
+			y.pop()
+			flags.pop()
+		b = ContourBuffer(x,y,flags,closed,self.is_quadratic)
+		self.buffers.append(b)
+		self.contours.append((first,end,info,closing,b))
+		
+	# Returns True iff a contour has been changed.
+	def changed(self):
+		for b in self.buffers:
+			if b.restructured or b.x != b.x0 or b.y != b.y0:
+				return True
+		return False
+		
+	# Returns the lines of the contour buffer b, where info holds the 
+	# flags (and the rest) of the original on-curve points and closing
+	# those of the closing point. Spiro data is dropped.
+	@staticmethod
+	def contour_lines(b,info,closing):
+		number = Glif.number
+		lines = []
+		controls = []
+		l = len(b)
+		for k in list(range(l))+([0] if b.closed else []):
+			if not b.flags[k] & ContourBuffer.ON_CURVE:
+				controls.append(number(b.x[k])+" "+number(b.y[k]))
+				continue
+			if lines and k == 0:
+				rest = closing
+			elif b.origin[k] >= 0:
+				rest = info[b.origin[k]]
+			else:
+				rest = "0" # a new curve point
+			point = number(b.x[k])+" "+number(b.y[k])
+			if not lines:
+				lines.append((point+" m "+rest).rstrip())
+			elif len(controls) == 0:
+				lines.append((" "+point+" l "+rest).rstrip())
+			else:
+				if len(controls) == 1: # quadratic
+					controls.append(controls[0])
+				lines.append((" "+" ".join(controls)+" "+point+" c "+rest).rstrip())
+			controls = []
+		return lines
+		
+	# Returns the lines of the glyph with the current contours.
+	def lines(self):
+		if not self.changed():
+			return self.text
+		lines = self.text[:self.start]
+		k = self.start
+		for first, end, info, closing, b in self.contours:
+			lines += self.text[k:first]
+			if b.restructured or b.x != b.x0 or b.y != b.y0:
+				lines += [line+"\n" for line in 
+				self.contour_lines(b,info,closing)]
+			else:
+				lines += self.text[first:end]
+			k = end
+		return lines+self.text[k:]
+
+# Opt-in statistics of Curvatura runs for finding the expensive glyphs
+# and branches. Instrumentation is enabled by setting Curvatura.stats to
+# a Stats object; while it is None, the instrumented places only check
+# for None. counters maps names like "tunnify.visited" to numbers,
+# times the actions to seconds and glyphs the glyph names to the 
+# seconds per action.
+class Stats:
+	def __init__(self):
+		self.counters = {}
+		self.times = {}
+		self.glyphs = {}
+		
+	def count(self,name,n=1):
+		self.counters[name] = self.counters.get(name,0)+n
+		
+	# Adds the wall time seconds of the action (on the glyph if given).
+	def add_time(self,action,seconds,glyph=None):
+		self.times[action] = self.times.get(action,0.)+seconds
+		if glyph is not None:
+			times = self.glyphs.setdefault(glyph,{})
+			times[action] = times.get(action,0.)+seconds
+			
+	# Adds the statistics of as_dict() (e.g. of a worker process).
+	def merge(self,stats):
+		for name, n in stats["counters"].items():
+			self.count(name,n)
+		for action, seconds in stats["action_seconds"].items():
+			self.add_time(action,seconds)
+		for glyph, times in stats["glyph_seconds"].items():
+			for action, seconds in times.items():
+				g = self.glyphs.setdefault(glyph,{})
+				g[action] = g.get(action,0.)+seconds
+				
+	# Returns the statistics as a dictionary (for JSON), the glyphs 
+	# ordered by their total time (slowest first).
+	def as_dict(self):
+		glyphs = sorted(self.glyphs.items(),key=lambda g: -sum(g[1].values()))
+		return {"counters": dict(sorted(self.counters.items())),
+		"action_seconds": dict(self.times),
+		"glyph_seconds": OrderedDict(glyphs)}
+
+# A compact record of the changes of a Curvatura run, such that the run
+# can be reverted without FontForge keeping a copy of every layer in its
+# undo stacks. For every changed contour, contours holds the glyph, the
+# layer key, the index of the contour, the number of its points after
+# the run, the origins of the points (see ContourBuffer, None if no
+# points have been inserted or merged), the original indices of the
+# moved points with their old coordinates and selection and the 
+# removed points (original index, coordinates, on-curve, type and
+# selection). font is the font of the glyphs (if known), which 
+# Curvatura.revert_last() checks.
+class Journal:
+	ON_CURVE = 4 # the bits of the removed points next to the type
+	SELECTED = 8
+	
+	def __init__(self,font=None):
+		self.contours = []
+		self.font = font
+		
+	# Records the changes of the contour buffers of the glyph layer with
+	# the key (the fontforge layer still holds the old contours).
+	def record(self,glyph,key,layer,buffers):
+		for i in range(len(buffers)):
+			b = buffers[i]
+			origin = b.origin if b.restructured else range(len(b))
+			moved = array('l')
+			for k in range(len(b)):
+				o = origin[k]
+				if o >= 0 and (b.x[k] != b.x0[o] or b.y[k] != b.y0[o] 
+				or b.flags[k] != b.flags0[o]):
+					moved.append(o)
+			removed, rx, ry, rflags = array('l'), array('d'), array('d'), \
+			bytearray()
+			if b.restructured:
+				kept = set(b.origin)
+				c = layer[i]
+				for o in range(len(b.x0)):
+					if o not in kept:
+						p = c[o]
+						removed.append(o)
+						rx.append(p.x)
+						ry.append(p.y)
+						rflags.append(p.type | (p.on_curve and self.ON_CURVE)
+						| (p.selected and self.SELECTED))
+			elif len(moved) == 0:
+				continue
+			self.contours.append((glyph,key,i,len(b),
+			array('l',b.origin) if b.restructured else None,moved,
+			array('d',[b.x0[o] for o in moved]),
+			array('d',[b.y0[o] for o in moved]),
+			bytearray(b.flags0[o] & ContourBuffer.SELECTED for o in moved),
+			(removed,rx,ry,rflags)))
+			
+	# Restores the recorded contours (the latest first). Contours that
+	# do not have the number of points after the run anymore (i.e. they
+	# have been edited since) are skipped. Returns the number of the 
+	# restored contours.
+	def revert(self):
+		fontforge = Curvatura.load_fontforge()
+		restored = 0
+		k = len(self.contours)
+		while k > 0: # the contours of a layer are consecutive
+			glyph, key = self.contours[k-1][:2]
+			layer = glyph.layers[key]
+			contours = list(layer)
+			restructured = False
+			while k > 0 and self.contours[k-1][0] is glyph \
+			and self.contours[k-1][1] == key:
+				k -= 1
+				i, l, origin, moved, x, y, selected, removed = \
+				self.contours[k][2:]
+				if i >= len(contours) or len(contours[i]) != l:
+					continue
+				c = contours[i]
+				if origin is not None: # rebuild the old contour
+					points = [None]*(sum(1 for o in origin if o >= 0)
+					+len(removed[0]))
+					for j in range(l):
+						if origin[j] >= 0:
+							points[origin[j]] = c[j]
+					for j in range(len(removed[0])):
+						f = removed[3][j]
+						p = fontforge.point(removed[1][j],removed[2][j],
+						bool(f & self.ON_CURVE))
+						p.type = f & 3
+						p.selected = bool(f & self.SELECTED)
+						points[removed[0][j]] = p
+					new = fontforge.contour()
+					new.is_quadratic = c.is_quadratic
+					for p in points:
+						new += p
+					new.closed = c.closed
+					c = contours[i] = new
+					restructured = True
+				for j in range(len(moved)):
+					p = c[moved[j]]
+					p.x, p.y = x[j], y[j]
+					p.selected = bool(selected[j])
+				restored += 1
+			if restructured:
+				new = fontforge.layer()
+				new.is_quadratic = layer.is_quadratic
+				for c in contours:
+					new += c
+				layer = new
+			glyph.layers[key] = layer
+		self.contours = []
+		return restored
+
+# A font-wide run of actions (see Curvatura.modify_pipeline()) on the
+# glyphs, which is done in chunks of about budget seconds such that the
+# caller keeps control in between: step() processes the next chunk and
+# run() all of them. After every chunk progress(done,total) is called
+# (if given) and the job is cancelled if it returns False. cancel() 
+# stops the job, the changed glyphs are kept if keep is True and get
+# back their layers from before the job otherwise. The undo mode is 
+# the one of Curvatura.undo_options unless it is given. The changes
+# are recorded in the Journal journal in the mode "journal" and if
+# they might be rolled back. The glyphs are fontforge glyphs (or 
+# objects with the same interface, see CurvaturaBenchmark.py).
+class Job:
+	def __init__(self,actions,glyphs,budget=.1,progress=None,keep=True,
+	undo=None):
+		self.actions = [actions] if isinstance(actions,str) else actions
+		self.glyphs = list(glyphs)
+		self.budget = budget
+		self.progress = progress
+		self.keep = keep
+		self.undo = undo or Curvatura.undo_options["mode"]
+		self.done = 0 # the number of processed glyphs
+		self.cancelled = False
+		self.journal = None
+		if self.undo == "journal" or not keep:
+			self.journal = Journal()
+		self.cache = SegmentCache()
+		self.rate = None # the seconds per point of the last chunk
+		
+	def finished(self):
+		return self.cancelled or self.done == len(self.glyphs)
+		
+	# Processes the next chunk of glyphs, whose size is estimated from
+	# the rate of the chunk before (the first chunk is a single glyph).
+	# Returns True iff the job is neither finished nor cancelled.
+	def step(self):
+		if self.finished():
+			return False
+		start = time.perf_counter()
+		chunk, buffers, masters = [], [], []
+		points = 0
+		while self.done+len(chunk) < len(self.glyphs):
+			glyph = self.glyphs[self.done+len(chunk)]
+			keys, layers, glyph_buffers = Curvatura.read_layers(glyph)
+			chunk.append((glyph,keys,layers,glyph_buffers))
+			flat = [b for bs in glyph_buffers for b in bs]
+			groups = Curvatura.master_groups(glyph_buffers) \
+			or [[k] for k in range(len(flat))]
+			masters += [[len(buffers)+k for k in g] for g in groups]
+			buffers += flat
+			points += sum(len(b) for b in flat)
+			if self.rate is None or (points+1)*self.rate > self.budget:
+				break
+		Curvatura.modify_pipeline(self.actions,buffers,True,self.cache,None,
+		masters if len(masters) < len(buffers) else None)
+		for glyph, keys, layers, glyph_buffers in chunk:
+			if self.undo == "layer":
+				for k in keys:
+					glyph.preserveLayerAsUndo(k)
+			Curvatura.write_layers(glyph,keys,layers,glyph_buffers,
+			self.journal)
+		self.done += len(chunk)
+		self.rate = (time.perf_counter()-start)/max(1,points)
+		if self.progress is not None \
+		and self.progress(self.done,len(self.glyphs)) is False:
+			self.cancel()
+		return not self.finished()
+		
+	# Processes all the remaining glyphs. Returns False iff the job
+	# has been cancelled.
+	def run(self):
+		while self.step():
+			pass
+		return not self.cancelled
+		
+	# Stops the job and restores the glyphs changed so far unless keep.
+	def cancel(self):
+		self.cancelled = True
+		if not self.keep:
+			self.journal.revert()
+
+# A resident service for build tools and editors, which reads requests
+# as JSON lines and answers every one with a JSON line (in the order of
+# the requests, so they may be pipelined). A request holds an id, the
+# actions (a name or a list of names, see Curvatura.modify_pipeline()),
+# optionally the options ("harmonize", "reduce", "tunnify" and 
+# "energy", which update the corresponding dictionaries of Curvatura for
+# this request) and the contours, each as {"closed": bool, "quadratic":
+# bool, "points": [[x,y,flags],...]} with the flags of ContourBuffer. The
+# answer holds the id and the changed contours or an error. Like in
+# modify_contours(), the whole outline is changed if no point is 
+# selected. The SegmentCache cache and the results of the last 
+# results_size outlines stay warm between the requests.
+class Service:
+	actions = {"harmonize","harmonizehandles","tunnify","inflection",
+	"softmerge","softmergeall","reduce"}
+	
+	def __init__(self,cache_size=100000,results_size=10000):
+		self.cache = SegmentCache(cache_size) if cache_size > 0 else None
+		self.results = OrderedDict()
+		self.results_size = results_size
+		self.hits = 0
+		self.misses = 0
+		
+	# Returns the answer to the request (a dictionary). Malformed 
+	# requests raise a ValueError.
+	def handle(self,request):
+		if not isinstance(request,dict):
+			raise ValueError("the request is no object")
+		actions = request.get("actions",request.get("action"))
+		actions = [actions] if isinstance(actions,str) else actions
+		if not actions or not set(actions) <= self.actions:
+			raise ValueError("unknown actions: %r" % (actions,))
+		buffers = []
+		contours = request.get("contours")
+		if not isinstance(contours,list) \
+		or not all(isinstance(c,dict) for c in contours):
+			raise ValueError("contours is no list of objects")
+		for c in contours:
+			points = c["points"]
+			buffers.append(ContourBuffer(array('d',[p[0] for p in points]),
+			array('d',[p[1] for p in points]),bytearray(int(p[2]) & 7
+			for p in points),bool(c.get("closed",True)),
+			bool(c.get("quadratic",False))))
+		options = request.get("options",{})
+		if not isinstance(options,dict) \
+		or not all(isinstance(v,dict) for v in options.values()):
+			raise ValueError("options is no object of objects")
+		key = ResultCache.key(actions,buffers)+repr(sorted((name,
+		sorted(values.items())) for name, values in options.items()))
+		if key in self.results:
+			self.results.move_to_end(key)
+			self.hits += 1
+			return {"id": request.get("id"), "contours": self.results[key]}
+		self.misses += 1
+		saved = {}
+		try:
+			for name, values in options.items():
+				if name not in {"harmonize","reduce","tunnify","energy"}:
+					raise ValueError("unknown options: %r" % name)
+				target = getattr(Curvatura,name+"_options")
+				if not set(values) <= set(target):
+					raise ValueError("unknown %s options: %r" % (name,
+					sorted(set(values)-set(target))))
+				saved[name] = dict(target)
+				target.update(values)
+			Curvatura.check_harmonize_options(**Curvatura.harmonize_options)
+			is_glyph_variant = not any(b.any_selected() for b in buffers)
+			Curvatura.modify_pipeline(actions,buffers,is_glyph_variant,
+			self.cache)
+		finally:
+			for name, values in saved.items():
+				getattr(Curvatura,name+"_options").update(values)
+		contours = [{"closed": b.closed, "quadratic": b.is_quadratic,
+		"points": [[b.x[k],b.y[k],b.flags[k]] for k in range(len(b))]}
+		for b in buffers]
+		self.results[key] = contours
+		if len(self.results) > self.results_size:
+			self.results.popitem(last=False)
+		return {"id": request.get("id"), "contours": contours}
+		
+	# Answers the request lines of the text stream infile on the text 
+	# stream outfile until the end of infile. Broken requests (and the 
+	# requests the actions fail on) get an answer with an error instead
+	# of the contours, the service keeps running.
+	def serve(self,infile,outfile):
+		import json
+		for line in infile:
+			if not line.strip():
+				continue
+			request = None
+			try:
+				request = json.loads(line)
+				answer = self.handle(request)
+			except Exception as e:
+				answer = {"id": request.get("id") 
+				if isinstance(request,dict) else None, 
+				"error": "%s: %s" % (type(e).__name__,e)}
+			outfile.write(json.dumps(answer)+"\n")
+			outfile.flush()
+			
+	# Serves the connections to the Unix socket path (one thread each,
+	# the requests are handled one at a time) until it is interrupted.
+	def serve_socket(self,path):
+		import os, socketserver, threading
+		lock = threading.Lock()
+		service = self
+		class Handler(socketserver.StreamRequestHandler):
+			def handle(self):
+				import io
+				infile = io.TextIOWrapper(self.rfile,encoding="utf-8")
+				outfile = io.TextIOWrapper(self.wfile,encoding="utf-8")
+				for line in infile:
+					with lock:
+						service.serve([line],outfile)
+		if os.path.exists(path):
+			os.remove(path)
+		server = socketserver.ThreadingUnixStreamServer(path,Handler)
+		server.daemon_threads = True # open connections do not block the exit
+		try:
+			server.serve_forever()
+		finally:
+			server.server_close()
+			os.remove(path)
 
 class Curvatura:
+	
+	# Returns the fontforge module (imported on the first call) or None
+	# if FontForge is not available.
+	@staticmethod
+	def load_fontforge():
+		global fontforge
+		if fontforge is None:
+			try:
+				import fontforge
+			except ImportError:
+				return None
+		return fontforge
 						
+	# Counts n for name in the statistics (if enabled).
+	@staticmethod
+	def count(name,n=1):
+		if Curvatura.stats is not None:
+			Curvatura.stats.count(name,n)
+			
 	# Returns the signed distance of the point p from the line
 	# starting in q and going to r. The value is positive, iff
 	# p is right from the line.
@@ -51,6 +1166,21 @@ class Curvatura:
 		else: # generic case
 			return c-a,d-b
 			
+	# Same as direction_at_start() but for many cubic bezier paths at 
+	# once. segments is an array of shape (n,8) where every row holds 
+	# a,b,c,d,e,f,g,h. Returns the arrays of the x and y directions.
+	@staticmethod
+	def direction_at_start_batch(segments):
+		if numpy is None:
+			directions = [Curvatura.direction_at_start(*s) for s in segments]
+			return [d[0] for d in directions], [d[1] for d in directions]
+		a,b,c,d,e,f,g,h = numpy.asarray(segments,dtype=float).reshape(-1,8).T
+		first = (c == a) & (d == b) # first handle has length 0
+		both = first & (e == g) & (f == h) # both handles have length 0
+		dx = numpy.where(both,g-a,numpy.where(first,e-a,c-a))
+		dy = numpy.where(both,h-b,numpy.where(first,f-b,d-b))
+		return dx, dy
+			
 	# Returns for a cubic bezier path (a,b), (c,d), (e,f), (g,h)
 	# the curvature at (a,b). 
 	@staticmethod
@@ -58,7 +1188,267 @@ class Curvatura:
 		if b == d and a == c:
 			return 0
 		return 2./3.*(c*f-a*f-d*e+b*e+a*d-b*c)/((b-d)**2+(a-c)**2)**1.5
+
+	# Same as curvature_at_start() but for many cubic bezier paths at
+	# once. segments is an array of shape (n,8) where every row holds
+	# a,b,c,d,e,f,g,h. Returns the array of the curvatures.
+	@staticmethod
+	def curvature_at_start_batch(segments):
+		if numpy is None:
+			return [Curvatura.curvature_at_start(*s) for s in segments]
+		a,b,c,d,e,f,g,h = numpy.asarray(segments,dtype=float).reshape(-1,8).T
+		with numpy.errstate(divide='ignore',invalid='ignore'):
+			k = 2./3.*(c*f-a*f-d*e+b*e+a*d-b*c)/((b-d)**2+(a-c)**2)**1.5
+		return numpy.where((b == d) & (a == c),0.,k)
+	
+	# Returns for a cubic bezier path (a,b), (c,d), (e,f), (g,h) the 
+	# point and the first and second derivative at time t (all of them
+	# numbers or numpy arrays) as x, y, dx, dy, ddx, ddy.
+	@staticmethod
+	def bezier_derivatives(a,b,c,d,e,f,g,h,t):
+		s = 1-t
+		return s*s*s*a+3*s*s*t*c+3*s*t*t*e+t*t*t*g, \
+		s*s*s*b+3*s*s*t*d+3*s*t*t*f+t*t*t*h, \
+		3*(s*s*(c-a)+2*s*t*(e-c)+t*t*(g-e)), \
+		3*(s*s*(d-b)+2*s*t*(f-d)+t*t*(h-f)), \
+		6*(s*(e-2*c+a)+t*(g-2*e+c)), \
+		6*(s*(f-2*d+b)+t*(h-2*f+d))
+		
+	# Returns the times 0, 1/m, ..., 1 and the arc-lengths of the cubic
+	# bezier paths a,b,c,d,e,f,g,h (numpy arrays of length n) from their
+	# start up to these times as an array of shape (n,m+1). Every step
+	# is integrated with Gauss-Legendre (4 nodes).
+	@staticmethod
+	def arc_lengths(a,b,c,d,e,f,g,h,m=32):
+		x, w = Curvatura.gauss_legendre(4)
+		p = [v[:,None] for v in (a,b,c,d,e,f,g,h)]
+		steps = numpy.zeros((len(a),m))
+		for i in range(4):
+			t = (numpy.arange(m)+.5*(x[i]+1))[None,:]/m
+			dx, dy = Curvatura.bezier_derivatives(*p,t)[2:4]
+			steps += .5*w[i]/m*numpy.hypot(dx,dy)
+		return numpy.linspace(0.,1.,m+1), numpy.concatenate(
+		(numpy.zeros((len(a),1)),numpy.cumsum(steps,axis=1)),axis=1)
+		
+	# Returns the arc-lengths of the cubic bezier paths a,b,c,d,e,f,g,h
+	# (numpy arrays of length n) from their start up to the times t,
+	# where lengths holds their rows of arc_lengths() (so only the part
+	# from the last grid time before t is integrated), and the speeds at t.
+	@staticmethod
+	def arc_lengths_at(a,b,c,d,e,f,g,h,lengths,t,m=32):
+		x, w = Curvatura.gauss_legendre(4)
+		i = numpy.minimum(numpy.floor(t*m),m-1)
+		start, step = i/m, t-i/m
+		s = lengths[numpy.arange(len(t)),i.astype(int)]
+		for k in range(4):
+			dx, dy = Curvatura.bezier_derivatives(a,b,c,d,e,f,g,h,
+			start+.5*(x[k]+1)*step)[2:4]
+			s = s+.5*w[k]*step*numpy.hypot(dx,dy)
+		dx, dy = Curvatura.bezier_derivatives(a,b,c,d,e,f,g,h,t)[2:4]
+		return s, numpy.hypot(dx,dy)
 		
+	# Samples many cubic bezier paths densely (segments is an array of 
+	# shape (n,8) where every row holds a,b,c,d,e,f,g,h): at the times
+	# 0, 1/samples, ..., 1 or, if spacing is given, in equal arc-length
+	# steps of at most spacing font units (at least one step per path; 
+	# up to the error of the Gauss-Legendre integration, which only shows
+	# near cusps, where the speed almost vanishes, e.g. .6% of a step of
+	# .5 units). Both ends are sampled, so a comb shows the curvature 
+	# jumps at the nodes. samples must be at least 1 and spacing 
+	# positive (ValueError otherwise). Returns a dictionary of the arrays
+	# (lists without numpy) of all the samples: the row "segment" of the
+	# path,
+	# the time "t", the point "x", "y", the unit tangent "tx", "ty", the 
+	# "curvature" (signed like in curvature_at_start(), 0 where the
+	# derivative vanishes) and the "speed" (the length of the derivative, 
+	# which turns sums over the times into integrals over the arc-length).
+	# Where the derivative vanishes (a retracted handle), the tangent is
+	# the limit direction like in direction_at_start().
+	@staticmethod
+	def sample_segments(segments,samples=8,spacing=None):
+		if spacing is None and not samples >= 1:
+			raise ValueError("samples must be at least 1")
+		if spacing is not None and not spacing > 0:
+			raise ValueError("spacing must be positive")
+		if numpy is None:
+			return Curvatura.sample_segments_python(segments,samples,spacing)
+		p = numpy.asarray(segments,dtype=float).reshape(-1,8)
+		n = len(p)
+		arc = spacing is not None and n > 0
+		if arc:
+			m = 32
+			grid, lengths = Curvatura.arc_lengths(*p.T,m)
+			total = lengths[:,-1]
+			counts = numpy.maximum(1,numpy.ceil(total/spacing)).astype(int)
+		else:
+			counts = numpy.full(n,samples,dtype=int)
+		segment = numpy.repeat(numpy.arange(n),counts+1)
+		first = numpy.cumsum(counts+1)-(counts+1)
+		t = (numpy.arange(len(segment))-first[segment])/counts[segment]
+		if arc: # inverts the arc-lengths piecewise linearly (the rows are
+			# shifted apart such that one interpolation serves all of them)
+			with numpy.errstate(divide='ignore',invalid='ignore'):
+				s = numpy.where(total[:,None] > 0,lengths/total[:,None],grid)
+			s += 2*numpy.arange(n)[:,None]
+			u, target = t, t*total[segment]
+			t = numpy.interp(t+2*segment,s.ravel(),numpy.tile(grid,n))
+			# and refines the times in the grid step of the linear guess
+			# with Newton steps (bisecting where they leave the bracket)
+			lo = numpy.minimum(numpy.floor(t*m),m-1)/m
+			hi = lo+1/m
+			q = p[segment].T
+			for j in range(4):
+				s, speed = Curvatura.arc_lengths_at(*q,lengths[segment],t,m)
+				lo = numpy.where(s < target,t,lo)
+				hi = numpy.where(s > target,t,hi)
+				with numpy.errstate(divide='ignore',invalid='ignore'):
+					newton = t-(s-target)/speed
+				t = numpy.where(s == target,t,numpy.where((newton >= lo) 
+				& (newton <= hi),newton,.5*(lo+hi)))
+			t = numpy.where((u > 0) & (u < 1),t,u) # keeps the ends exact
+		x, y, dx, dy, ddx, ddy = Curvatura.bezier_derivatives(*p[segment].T,t)
+		speed = numpy.hypot(dx,dy)
+		with numpy.errstate(divide='ignore',invalid='ignore'):
+			k = numpy.where(speed > 0,(dx*ddy-dy*ddx)/speed**3,0.)
+		# the limit direction where the derivative vanishes:
+		sign = numpy.where(t < .5,1.,-1.)
+		tx = numpy.where(speed > 0,dx,sign*ddx)
+		ty = numpy.where(speed > 0,dy,sign*ddy)
+		norm = numpy.hypot(tx,ty)
+		norm[norm == 0] = 1.
+		return {"segment": segment, "t": t, "x": x, "y": y, "tx": tx/norm,
+		"ty": ty/norm, "curvature": k, "speed": speed}
+		
+	# The version of sample_segments() without numpy.
+	@staticmethod
+	def sample_segments_python(segments,samples=8,spacing=None,m=32):
+		names = ["segment","t","x","y","tx","ty","curvature","speed"]
+		result = dict((name,[]) for name in names)
+		nodes, weights = Curvatura.gauss_legendre(4)
+		for r in range(len(segments)):
+			p = tuple(segments[r])
+			if spacing is None:
+				times = [j/samples for j in range(samples+1)]
+			else: # like arc_lengths() and the inversion in sample_segments()
+				lengths = [0.]
+				for i in range(m):
+					step = 0.
+					for xi, wi in zip(nodes,weights):
+						dx, dy = Curvatura.bezier_derivatives(*p,
+						(i+.5*(xi+1))/m)[2:4]
+						step += .5*wi/m*math.hypot(dx,dy)
+					lengths.append(lengths[-1]+step)
+				total = lengths[-1]
+				n = max(1,math.ceil(total/spacing))
+				times, i = [], 0
+				for j in range(n+1):
+					target = total*j/n
+					while i < m-1 and lengths[i+1] < target:
+						i += 1
+					step = lengths[i+1]-lengths[i]
+					if step == 0 or j in (0,n):
+						times.append(j/n)
+						continue
+					t = (i+(target-lengths[i])/step)/m
+					lo, hi = i/m, (i+1)/m
+					for k in range(4): # the Newton steps
+						s, h = lengths[i], t-i/m
+						for xi, wi in zip(nodes,weights):
+							dx, dy = Curvatura.bezier_derivatives(*p,
+							i/m+.5*(xi+1)*h)[2:4]
+							s += .5*wi*h*math.hypot(dx,dy)
+						if s == target:
+							break
+						elif s < target:
+							lo = t
+						else:
+							hi = t
+						speed = math.hypot(*Curvatura.bezier_derivatives(*p,
+						t)[2:4])
+						t = t-(s-target)/speed if speed > 0 else -1.
+						if not lo <= t <= hi:
+							t = .5*(lo+hi)
+					times.append(t)
+			for t in times:
+				x, y, dx, dy, ddx, ddy = Curvatura.bezier_derivatives(*p,t)
+				speed = math.hypot(dx,dy)
+				if speed > 0:
+					k, tx, ty = (dx*ddy-dy*ddx)/speed**3, dx, dy
+				else:
+					k, tx, ty = 0., (ddx if t < .5 else -ddx), \
+					(ddy if t < .5 else -ddy)
+				norm = math.hypot(tx,ty) or 1.
+				for name, v in zip(names,(r,t,x,y,tx/norm,ty/norm,k,speed)):
+					result[name].append(v)
+		return result
+		
+	# Returns all the segments of the contour buffer c (regardless of the
+	# selection) as cubic bezier paths a,b,c,d,e,f,g,h together with the 
+	# list of the indices of their starting points. Lines and quadratic
+	# segments (with the implied on-curve points between two off-curve
+	# points) are elevated to cubic ones.
+	@staticmethod
+	def contour_segments(c):
+		l = len(c)
+		x, y = c.x, c.y
+		ons = [k for k in range(l) if c.flags[k] & ContourBuffer.ON_CURVE]
+		segments, starts = [], []
+		for k in range(len(ons) if c.closed else len(ons)-1):
+			i = ons[k]
+			j = ons[k+1] if k+1 < len(ons) else ons[0]+l
+			if j-i == 1: # a line
+				a, b, g, h = x[i], y[i], x[j%l], y[j%l]
+				segments.append((a,b,(2*a+g)/3,(2*b+h)/3,(a+2*g)/3,(b+2*h)/3,g,h))
+				starts.append(i)
+			elif not c.is_quadratic:
+				if j-i == 3:
+					segments.append(tuple(v for m in range(i,j+1) 
+					for v in (x[m%l],y[m%l])))
+					starts.append(i)
+			else:
+				a, b = x[i], y[i]
+				for m in range(i+1,j):
+					qx, qy = x[m%l], y[m%l]
+					if m+1 < j: # the implied on-curve point
+						g, h = .5*(qx+x[(m+1)%l]), .5*(qy+y[(m+1)%l])
+					else:
+						g, h = x[j%l], y[j%l]
+					segments.append((a,b,a+2/3*(qx-a),b+2/3*(qy-b),
+					g+2/3*(qx-g),h+2/3*(qy-h),g,h))
+					starts.append(i)
+					a, b = g, h
+		return segments, starts
+		
+	# Samples all the segments of the contour buffers in one batch like
+	# sample_segments() (e.g. for curvature combs, plots or energy 
+	# metrics of whole fonts). The dictionary additionally holds the 
+	# index "contour" of the buffer and the starting point "node" of the
+	# segment of every sample.
+	@staticmethod
+	def sample_buffers(buffers,samples=8,spacing=None):
+		segments, contours, starts = [], [], []
+		for k in range(len(buffers)):
+			s, n = Curvatura.contour_segments(buffers[k])
+			segments += s
+			contours += [k]*len(s)
+			starts += n
+		result = Curvatura.sample_segments(segments,samples,spacing)
+		segment = result["segment"]
+		if numpy is None:
+			result["contour"] = [contours[r] for r in segment]
+			result["node"] = [starts[r] for r in segment]
+		else:
+			result["contour"] = numpy.asarray(contours,dtype=int)[segment]
+			result["node"] = numpy.asarray(starts,dtype=int)[segment]
+		return result
+		
+	# Samples the contours of the active layer of the fontforge glyph
+	# (see sample_buffers()).
+	@staticmethod
+	def sample_glyph(glyph,samples=8,spacing=None):
+		return Curvatura.sample_buffers([ContourBuffer.from_contour(c)
+		for c in glyph.layers[glyph.activeLayer]],samples,spacing)
+
 	# Returns for a cubic bezier path from (0,0) to (1,0) with
 	# enclosing angles alpha and beta with the x-axis and 
 	# handle lengths a and b the energy with simpson's rule (10 divisions).
@@ -96,6 +1486,203 @@ class Curvatura:
 			integral += .1/6*(curv_before+4*curv_between+curv)
 			curv_before = curv
 		return integral/10
+		
+	# Returns the coefficients that energy_integrand() needs for the 
+	# cubic bezier paths given like in energy() (alpha,beta,a,b may be
+	# numbers or numpy arrays).
+	@staticmethod
+	def energy_coefficients(alpha,beta,a,b):
+		m = math if isinstance(alpha,(int,float)) else numpy
+		sa, sb = m.sin(alpha), m.sin(beta)
+		ca, cb = m.cos(alpha), m.cos(beta)
+		return (3*b*cb+3*a*ca-2, -2*b*cb-4*a*ca+2, a*ca, 
+		-3*b*sb+3*a*sa, -4*a*sa+2*b*sb, a*sa, 
+		-b*cb-2*a*ca+1, b*sb-2*a*sa)
+		
+	# Returns the integrand of energy() (the squared curvature times 
+	# the speed) at time t for the coefficients k of energy_coefficients().
+	@staticmethod
+	def energy_integrand(k,t):
+		xx = 3*((k[0]*t+k[1])*t+k[2])
+		yy = 3*((k[3]*t+k[4])*t+k[5])
+		xxx = 6*(k[0]*t+k[6])
+		yyy = 6*(k[3]*t+k[7])
+		return (xx*yyy-xxx*yy)**2/(xx**2+yy**2)**2.5
+		
+	# The version of Curvatura (also invalidates the ResultCache)
+	version = "20220121"
+	
+	# The nodes and weights of gauss_legendre() that are already known
+	gauss_legendre_cache = {}
+	
+	# The SegmentCache of the last run of modify_glyphs() resp. of the 
+	# current worker process in batch_fonts() (e.g. for its statistics)
+	segment_cache = None
+	
+	# The Stats object that collects the statistics of the current run
+	# (None disables the instrumentation)
+	stats = None
+	
+	# The options for harmonize_solve(), which harmonize_contour() uses 
+	# instead of its fixed sweeps if a tolerance is given
+	harmonize_options = {"tolerance": None, "method": "gauss-seidel",
+	"relaxation": 1., "iterations": 100}
+	
+	# The actions of the menu entry "Clean up", which runs them as one
+	# pipeline (see modify_contours())
+	cleanup_actions = ["inflection","harmonize","tunnify"]
+	
+	# The quadrature options for energy_quadrature() that are used 
+	# for choosing between several solutions in scale_handles_batch()
+	energy_options = {"method": "simpson", "nodes": 10}
+	
+	# The tolerances for reduce_contour() (distance in font units, the
+	# curvature change relative to the chord or None)
+	reduce_options = {"distance": 1., "curvature": None}
+	
+	# If fast is True, tunnify uses tunnify_fast() (without the 
+	# SegmentCache), which hands the segments with an angle whose sine is
+	# below angle over to the exact tunnify_batch(). Discriminants below
+	# double_root in absolute value are a double root and areas (ff in 
+	# tunnify()) below it are 0 (on integer grids both are often exactly
+	# 0 and the rounding, which differs between math, numpy and 
+	# tunnify_fast(), would decide otherwise).
+	tunnify_options = {"fast": False, "angle": 1e-2, "double_root": 1e-12}
+	
+	# The thresholds of audit_glyphs() above which a glyph needs work: 
+	# the curvature jump at a smooth node (in 1/font units), the number 
+	# of missing inflection points and the tunni imbalance (how far 
+	# tunnify would move a handle, in font units)
+	audit_options = {"curvature_jump": 1e-4, "inflections": 1, "tunni": 1.}
+	
+	# The layers of a glyph that are changed: None for the active layer
+	# only, "all" for all the foreground layers or a list of layer 
+	# indices or names. If compatible is True, the layers that are 
+	# compatible with the active one are processed as its masters (see
+	# master_groups()), otherwise every layer on its own.
+	layer_options = {"layers": None, "compatible": False}
+	
+	# How the changes of modify_contours() and modify_glyphs() can be
+	# undone: "layer" for FontForge's undo snapshots of the whole layers,
+	# "journal" for a compact Journal of the changed points only (see 
+	# revert_last()) or "none" for no undo at all (e.g. in batch runs).
+	undo_options = {"mode": "layer"}
+	
+	# The Journal of the last run in the undo mode "journal"
+	journal = None
+	
+	# Returns the nodes and weights of the Gauss-Legendre quadrature 
+	# with n nodes on [-1,1] (computed once by Newton's method).
+	@staticmethod
+	def gauss_legendre(n):
+		if not n in Curvatura.gauss_legendre_cache:
+			nodes, weights = [], []
+			for i in range(1,n+1):
+				x = math.cos(math.pi*(i-.25)/(n+.5))
+				for k in range(100):
+					p0, p1 = 1., x # the Legendre polynomials of degree n-1, n
+					for j in range(2,n+1):
+						p0, p1 = p1, ((2*j-1)*x*p1-(j-1)*p0)/j
+					dp = n*(x*p1-p0)/(x*x-1)
+					dx = p1/dp
+					x -= dx
+					if abs(dx) < 1e-15:
+						break
+				nodes.append(x)
+				weights.append(2/((1-x*x)*dp*dp))
+			Curvatura.gauss_legendre_cache[n] = (nodes, weights)
+		return Curvatura.gauss_legendre_cache[n]
+		
+	# Same as energy() but for many cubic bezier paths at once (alpha, 
+	# beta, a, b are arrays of the same length) and with a selectable
+	# quadrature (see energy_quadrature()). Returns the array of the 
+	# energies.
+	@staticmethod
+	def energy_batch(alpha,beta,a,b,method="simpson",nodes=10,tolerance=1e-6):
+		if numpy is None:
+			return [Curvatura.energy_quadrature(Curvatura.energy_coefficients(
+			*t),method,nodes,tolerance) for t in zip(alpha,beta,a,b)]
+		alpha, beta, a, b = [numpy.asarray(v,dtype=float).reshape(-1)
+		for v in (alpha,beta,a,b)]
+		with numpy.errstate(divide='ignore',invalid='ignore'):
+			return Curvatura.energy_quadrature(Curvatura.energy_coefficients(
+			alpha,beta,a,b),method,nodes,tolerance)
+		
+	# Integrates energy_integrand() for the coefficients k (whose entries
+	# are numbers or arrays) like energy() does. The quadrature method 
+	# "simpson" uses Simpson's rule on nodes intervals (this is energy() 
+	# for nodes = 10), "gauss" uses Gauss-Legendre with the given number
+	# of nodes and "adaptive" starts with Simpson's rule on nodes intervals
+	# and doubles their number (for every path separately) until the 
+	# relative error estimate is below tolerance twice in a row.
+	@staticmethod
+	def energy_quadrature(k,method="simpson",nodes=10,tolerance=1e-6):
+		f = Curvatura.energy_integrand
+		if method == "gauss":
+			x, w = Curvatura.gauss_legendre(nodes)
+			integral = 0
+			for i in range(nodes):
+				integral = integral + .5*w[i]*f(k,.5*(x[i]+1))
+			return integral/10
+		if method != "simpson" and method != "adaptive":
+			raise ValueError("unknown quadrature method "+str(method))
+		n = nodes
+		h = 1./n
+		# the trapezoid sums on the interval ends and on the midpoints:
+		ends = .5*(f(k,0.)+f(k,1.))
+		for i in range(1,n):
+			ends = ends + f(k,i*h)
+		mids = 0
+		for i in range(n):
+			mids = mids + f(k,(i+.5)*h)
+		integral = h/3*(ends+2*mids)
+		if method == "simpson":
+			return integral/10
+		scalar = isinstance(integral,float)
+		calm = False # the last error estimate was below tolerance
+		if not scalar: # finished paths are stored in result
+			result = integral.copy()
+			index = numpy.arange(len(integral))
+		while n < 4096:
+			ends, n, h = ends+mids, 2*n, .5*h
+			mids = 0
+			for i in range(n):
+				mids = mids + f(k,(i+.5)*h)
+			refined = h/3*(ends+2*mids)
+			error = abs(refined-integral)/15 # Richardson estimate
+			integral = refined
+			if scalar:
+				if not error > tolerance*abs(integral):
+					if calm:
+						break
+					calm = True
+				else:
+					calm = False
+			else:
+				result[index] = integral
+				small = ~(error > tolerance*abs(integral))
+				active = ~(small & calm)
+				if not active.any():
+					break
+				index = index[active]
+				k = tuple(v[active] for v in k)
+				ends, mids, integral = ends[active], mids[active], integral[active]
+				calm = small[active]
+		return (integral if scalar else result)/10
+		
+	# Returns a cheap lower bound of the exact energy integral of
+	# energy(alpha,beta,a,b) (works for numbers and numpy arrays): by 
+	# Cauchy-Schwarz the integral of the squared curvature is at least
+	# the squared turning angle (at least |alpha+beta|) divided by the
+	# length (at most the length of the control polygon). It is no bound
+	# of Simpson's rule in energy(), which misses the curvature peaks
+	# near cusps (where the speed almost vanishes) and may fall below it.
+	@staticmethod
+	def energy_bound(alpha,beta,a,b):
+		m = math if isinstance(alpha,(int,float)) else numpy
+		length = a + b + m.sqrt((1-b*m.cos(beta)-a*m.cos(alpha))**2
+		+(b*m.sin(beta)-a*m.sin(alpha))**2)
+		return (alpha+beta)**2/length/10
 	
 	# Returns the coefficients of the polynomial with the 
 	# coefficients coeffs. (The polynomial a*x^2+b*x+c is represented by 
@@ -143,9 +1730,9 @@ class Curvatura:
 	# Same as newton_root() but returns ALL real roots
 	@staticmethod
 	def newton_roots(coeffs):
-		f = coeffs
+		f = list(coeffs) # do not change the coefficients of the caller
 		while f[0] == 0:
-			f.remove(0)
+			f.pop(0)
 		roots = []
 		while len(f) > 1:
 			r = Curvatura.newton_root(f)
@@ -154,40 +1741,187 @@ class Curvatura:
 			roots.append(r)
 			f = Curvatura.polynomial_division(f,r)
 		return roots
+		
+	# Returns all real roots (in ascending order) of the polynomial with
+	# coefficients coeffs, which may have leading zeros. Other than 
+	# newton_roots() this works in bounded time and does not miss roots:
+	# every root is isolated between two real roots of the derivative
+	# (or Fujiwara's bound) and found there by bisection safeguarded 
+	# Newton steps. Roots of even multiplicity are found at the roots
+	# of the derivative.
+	@staticmethod
+	def real_roots(coeffs):
+		f = list(coeffs)
+		while len(f) > 0 and f[0] == 0:
+			f.pop(0)
+		n = len(f)-1 # degree
+		if n < 1:
+			return []
+		if n == 1:
+			return [-f[1]/f[0]]
+		if n == 2: # the numerically stable quadratic formula
+			a, b, c = f
+			discriminant = b**2-4*a*c
+			if discriminant < 0:
+				return []
+			if discriminant == 0:
+				return [-b/(2*a)]
+			q = -.5*(b+math.copysign(discriminant**.5,b))
+			return sorted([q/a,c/q])
+		bound = 2*max([abs(f[k]/f[0])**(1./k) for k in range(1,n)]
+		+[abs(.5*f[n]/f[0])**(1./n)])
+		if bound == 0: # f is a multiple of x**n
+			return [0.]
+		points = [-bound]+[p for p in Curvatura.real_roots(
+		Curvatura.derive(f)) if -bound < p < bound]+[bound]
+		values = [Curvatura.evaluate(f,p) for p in points]
+		# values which are zero up to rounding errors:
+		zero = [0 < k < len(points)-1 and abs(values[k]) <= 1e-12
+		*Curvatura.evaluate([abs(v) for v in f],abs(points[k])) 
+		for k in range(len(points))]
+		derivative = Curvatura.derive(f)
+		roots = []
+		newton = bisection = failed = 0 # for the statistics
+		for k in range(len(points)-1):
+			if zero[k]:
+				roots.append(points[k])
+			elif not zero[k+1] and values[k]*values[k+1] < 0:
+				lo, hi = points[k], points[k+1]
+				x = .5*(lo+hi)
+				width = hi-lo
+				for i in range(200): # bisection needs at most ~ 100 steps
+					v = Curvatura.evaluate(f,x)
+					if v == 0:
+						break
+					if (v < 0) == (values[k] < 0):
+						lo = x
+					else:
+						hi = x
+					d = Curvatura.evaluate(derivative,x)
+					step = x-v/d if d != 0 else lo-1
+					# bisect if Newton leaves the bracket or is too slow:
+					if not lo < step < hi or hi-lo > .5*width:
+						step = .5*(lo+hi)
+						bisection += 1
+					else:
+						newton += 1
+					width = hi-lo
+					if abs(step-x) <= 1e-15*max(1,abs(x)):
+						x = step
+						break
+					x = step
+				else:
+					failed += 1
+				roots.append(x)
+		stats = Curvatura.stats
+		if stats is not None:
+			stats.count("real_roots.calls")
+			stats.count("real_roots.newton_steps",newton)
+			stats.count("real_roots.bisection_steps",bisection)
+			stats.count("real_roots.not_converged",failed)
+		return roots
+		
+	# Same as real_roots() but for many polynomials of degree at most 4
+	# at once. coeffs is an array of shape (n,5). Returns an array of 
+	# shape (n,4) holding the real roots of every polynomial in ascending
+	# order, padded with nan. The quartics are solved as eigenvalues of 
+	# their companion matrices (followed by two Newton steps), the rare 
+	# polynomials of lower degree by real_roots().
+	@staticmethod
+	def real_roots_batch(coeffs):
+		if numpy is None:
+			roots = [Curvatura.real_roots(f) for f in coeffs]
+			return [r+[float('nan')]*(4-len(r)) for r in roots]
+		f = numpy.asarray(coeffs,dtype=float).reshape(-1,5)
+		result = numpy.full((len(f),4),numpy.nan)
+		quartic = f[:,0] != 0
+		if quartic.any():
+			q = f[quartic]
+			companion = numpy.zeros((len(q),4,4))
+			companion[:,0,:] = -q[:,1:]/q[:,:1]
+			companion[:,1,0] = companion[:,2,1] = companion[:,3,2] = 1
+			eigenvalues = numpy.linalg.eigvals(companion)
+			real = numpy.abs(eigenvalues.imag) <= 1e-7*(1+numpy.abs(eigenvalues))
+			x = numpy.where(real,eigenvalues.real,numpy.nan)
+			d = q[:,:4]*[4,3,2,1] # coefficients of the derivatives
+			with numpy.errstate(divide='ignore',invalid='ignore'):
+				for i in range(2): # polish the roots by Newton steps
+					v = (((q[:,:1]*x+q[:,1:2])*x+q[:,2:3])*x+q[:,3:4])*x+q[:,4:]
+					dv = ((d[:,:1]*x+d[:,1:2])*x+d[:,2:3])*x+d[:,3:]
+					x = numpy.where(dv != 0,x-v/dv,x)
+				stats = Curvatura.stats
+				if stats is not None:
+					step = numpy.abs(numpy.where(dv != 0,v/dv,0))
+					stats.count("real_roots_batch.quartics",len(q))
+					stats.count("real_roots_batch.newton_steps",
+					2*int(numpy.isfinite(x).sum()))
+					stats.count("real_roots_batch.not_converged",
+					int((step > 1e-9*(1+numpy.abs(x))).sum()))
+			result[quartic] = numpy.sort(x,axis=1) # nan goes last
+		for k in numpy.nonzero(~quartic)[0]:
+			r = Curvatura.real_roots(f[k])
+			result[k,:len(r)] = r
+		return result
 	
-	# Splits a contour c after point number i and time 0 < t < 1
+	# Splits a contour buffer c after point number i and time 0 < t < 1
 	# such that the bezier segment c[i],c[i+1],c[i+2],c[i+3]
 	# becomes two segments c[i],q1,q2,q3 and
 	# q3,r1,r2,c[i+3].
 	@staticmethod
 	def split(c,i,t):
+		Curvatura.split_segments(c,[(i,[t])])
+
+	# Splits many segments of a contour buffer c at once. splits is a
+	# list of pairs (i,times) in ascending order of i, where the segment
+	# c[i],c[i+1],c[i+2],c[i+3] is split at every time 0 < t < 1 of the
+	# ascending list times (like split() does for one time). The new
+	# nodes are smooth and also selected if selected is True. The buffer
+	# is rebuilt only once, which keeps this linear in the contour length.
+	# Returns the number of new nodes.
+	@staticmethod
+	def split_segments(c,splits,selected=False):
 		l = len(c)
-		if 0 < t < 1 and i % 1 == 0 and 0 <= i < l and c[i].on_curve \
-		and not c[i+1].on_curve and not c[i+2].on_curve \
-		and c[(i+3)%l].on_curve:
-			qx1 = c[i].x + t*(c[i+1].x-c[i].x)
-			qy1 = c[i].y + t*(c[i+1].y-c[i].y)
-			qx2 = c[i+1].x + t*(c[i+2].x-c[i+1].x)
-			qy2 = c[i+1].y + t*(c[i+2].y-c[i+1].y)
-			rx2 = c[i+2].x + t*(c[(i+3)%l].x-c[i+2].x)
-			ry2 = c[i+2].y + t*(c[(i+3)%l].y-c[i+2].y)
-			rx1 = qx2 + t*(rx2-qx2)
-			ry1 = qy2 + t*(ry2-qy2)
-			qx2 = qx1 + t*(qx2-qx1)
-			qy2 = qy1 + t*(qy2-qy1)
-			qx3 = qx2 + t*(rx1-qx2)
-			qy3 = qy2 + t*(ry1-qy2)     
-			doublesegment = fontforge.contour()
-			doublesegment.moveTo(c[i].x,c[i].y)
-			doublesegment.cubicTo(qx1,qy1,qx2,qy2,qx3,qy3)
-			doublesegment.cubicTo(rx1,ry1,rx2,ry2,c[(i+3)%l].x,c[(i+3)%l].y)
-			if i+3 == l and c.closed: # end point is starting point 
-				c.reverseDirection() # dirty hack because ff2017 is buggy
-				doublesegment.reverseDirection()
-				c[0:4] = doublesegment
-				c.reverseDirection()
-			else: # generic case
-				c[i:i+4] = doublesegment		
+		x, y, flags = c.x, c.y, c.flags
+		on = ContourBuffer.ON_CURVE
+		node = on | ContourBuffer.SMOOTH | (selected and ContourBuffer.SELECTED)
+		replacements = []
+		end = 0 # the segments must not overlap
+		for i, times in splits:
+			if not (i % 1 == 0 and end <= i < l-2 and flags[i] & on \
+			and not flags[i+1] & on and not flags[i+2] & on \
+			and flags[(i+3)%l] & on):
+				continue
+			px0, px1, px2, px3 = x[i], x[i+1], x[i+2], x[(i+3)%l]
+			py0, py1, py2, py3 = y[i], y[i+1], y[i+2], y[(i+3)%l]
+			xs, ys, fs = [], [], []
+			done = 0. # the time where the remaining segment starts
+			for t in times:
+				if not done < t < 1:
+					continue
+				s = (t-done)/(1-done) # the time on the remaining segment
+				qx1 = px0 + s*(px1-px0)
+				qy1 = py0 + s*(py1-py0)
+				qx2 = px1 + s*(px2-px1)
+				qy2 = py1 + s*(py2-py1)
+				rx2 = px2 + s*(px3-px2)
+				ry2 = py2 + s*(py3-py2)
+				rx1 = qx2 + s*(rx2-qx2)
+				ry1 = qy2 + s*(ry2-qy2)
+				qx2 = qx1 + s*(qx2-qx1)
+				qy2 = qy1 + s*(qy2-qy1)
+				qx3 = qx2 + s*(rx1-qx2)
+				qy3 = qy2 + s*(ry1-qy2)
+				xs += [qx1,qx2,qx3]
+				ys += [qy1,qy2,qy3]
+				fs += [0,0,node]
+				px0, px1, px2 = qx3, rx1, rx2
+				py0, py1, py2 = qy3, ry1, ry2
+				done = t
+			if len(fs) > 0: # the two handles are replaced by the new points
+				replacements.append((i+1,2,xs+[px1,px2],ys+[py1,py2],fs+[0,0]))
+				end = i+3
+		c.replace_many(replacements)
+		return sum(len(r[4])//3 for r in replacements)
 
 	# Returns the "corner point" of a cubic bezier segment
 	# (a,b),(c,d),(e,f),(g,h), which is the intersection of the
@@ -217,52 +1951,95 @@ class Curvatura:
 				/(c*h-a*h-d*g+b*g-c*f+a*f+d*e-b*e)
 
 	# Returns True iff a cubic bezier segment which lives in 
-	# a contour c from c[i] to c[i+3] is selected.
+	# a contour buffer c from c[i] to c[i+3] is selected.
 	# The boolean is_glyph_variant is true iff the point selection
 	# in the UI does not matter.
 	@staticmethod
 	def segment_selected_cubic(c,i,is_glyph_variant):
 		l = len(c)
-		return not c.is_quadratic \
-		and ((c[i].on_curve and not c[(i+1)%l].on_curve \
-		and not c[(i+2)%l].on_curve and c[(i+3)%l].on_curve) \
-		and (c[i].selected and c[(i+3)%l].selected \
-		or c[(i+2)%l].selected or c[(i+1)%l].selected \
-		or is_glyph_variant) and (i+3)%l != i)
+		f = c.flags
+		on, sel = ContourBuffer.ON_CURVE, ContourBuffer.SELECTED
+		return bool(not c.is_quadratic \
+		and ((f[i] & on and not f[(i+1)%l] & on \
+		and not f[(i+2)%l] & on and f[(i+3)%l] & on) \
+		and (f[i] & sel and f[(i+3)%l] & sel \
+		or f[(i+2)%l] & sel or f[(i+1)%l] & sel \
+		or is_glyph_variant) and (i+3)%l != i))
+		
+	# Collects the selected cubic bezier segments of the contour buffers
+	# (skipping the quadratic ones). Returns the list of the control 
+	# points a,b,c,d,e,f,g,h of every segment and the list of the 
+	# corresponding pairs (buffer,index of the starting point).
+	@staticmethod
+	def selected_segments(buffers,is_glyph_variant):
+		segments = []
+		where = []
+		for c in buffers:
+			if c.is_quadratic:
+				continue
+			x, y = c.x, c.y
+			for j, j1, j2, j3 in Curvatura.topology(c,
+			is_glyph_variant).segment_points:
+				segments.append((x[j],y[j],x[j1],y[j1],
+				x[j2],y[j2],x[j3],y[j3]))
+				where.append((c,j))
+		return segments, where
+		
+	# Returns the Topology of the contour buffer c, which is computed
+	# only if c has none (anymore) or one for the other is_glyph_variant.
+	@staticmethod
+	def topology(c,is_glyph_variant):
+		t = c.topology
+		if t is None or t.is_glyph_variant != is_glyph_variant:
+			t = c.topology = Topology(c,is_glyph_variant)
+		return t
+		
+	# Lets the contour buffers of every group (a list of compatible 
+	# buffers, e.g. of masters) share the Topology of the first one.
+	@staticmethod
+	def share_topology(groups,is_glyph_variant):
+		for group in groups:
+			t = Curvatura.topology(group[0],is_glyph_variant)
+			for c in group[1:]:
+				c.topology = t
 		
 	# Returns True iff at least two smooth adjacent cubic bezier segments
-	# which live in a contour c from c[i-3] to c[i+3] are selected.
+	# which live in a contour buffer c from c[i-3] to c[i+3] are selected.
 	# The boolean is_glyph_variant is true iff the point selection
 	# in the UI does not matter.
 	@staticmethod
 	def segments_selected_cubic(c,i,is_glyph_variant):
 		l = len(c)
-		return not c.is_quadratic and c[i].type in {1,2} \
-		and c[i].on_curve and (c[i].selected or is_glyph_variant) \
-		and (c.closed and not c[(i+1)%l].on_curve \
-		and not c[(i+2)%l].on_curve and c[(i+3)%l].on_curve \
-		and not c[(i-1)%l].on_curve and not c[(i-2)%l].on_curve	\
-		and c[(i-3)%l].on_curve	\
-		or l>= 7 and 3 <= i < l-3 and not c[i+1].on_curve \
-		and not c[i+2].on_curve and c[i+3].on_curve \
-		and not c[i-1].on_curve and not c[i-2].on_curve	\
-		and c[i-3].on_curve)
+		f = c.flags
+		on = ContourBuffer.ON_CURVE
+		return bool(not c.is_quadratic and f[i] & ContourBuffer.SMOOTH \
+		and f[i] & on and (f[i] & ContourBuffer.SELECTED or is_glyph_variant) \
+		and (c.closed and not f[(i+1)%l] & on \
+		and not f[(i+2)%l] & on and f[(i+3)%l] & on \
+		and not f[(i-1)%l] & on and not f[(i-2)%l] & on \
+		and f[(i-3)%l] & on \
+		or l>= 7 and 3 <= i < l-3 and not f[i+1] & on \
+		and not f[i+2] & on and f[i+3] & on \
+		and not f[i-1] & on and not f[i-2] & on \
+		and f[i-3] & on))
 		
 	# Returns True iff at least two adjacent quadratic bezier segments
-	# which live in a contour c from c[i-2] to c[i+2] are selected.
+	# which live in a contour buffer c from c[i-2] to c[i+2] are selected.
 	# The boolean is_glyph_variant is true iff the point selection
 	# in the UI does not matter.
 	@staticmethod
 	def segments_selected_quadratic(c,i,is_glyph_variant):
 		l = len(c)
-		return c.is_quadratic and c[i].type in {1,2} \
-		and c[i].on_curve and (c[i].selected or is_glyph_variant) \
-		and (c.closed and not c[(i+1)%l].on_curve \
-		and c[(i+2)%l].on_curve and not c[(i-1)%l].on_curve \
-		and c[(i-2)%l].on_curve	\
-		or l>= 5 and 2 <= i < l-2 and not c[i+1].on_curve \
-		and c[i+2].on_curve and not c[i-1].on_curve \
-		and c[i-2].on_curve)
+		f = c.flags
+		on = ContourBuffer.ON_CURVE
+		return bool(c.is_quadratic and f[i] & ContourBuffer.SMOOTH \
+		and f[i] & on and (f[i] & ContourBuffer.SELECTED or is_glyph_variant) \
+		and (c.closed and not f[(i+1)%l] & on \
+		and f[(i+2)%l] & on and not f[(i-1)%l] & on \
+		and f[(i-2)%l] & on \
+		or l>= 5 and 2 <= i < l-2 and not f[i+1] & on \
+		and f[i+2] & on and not f[i-1] & on \
+		and f[i-2] & on))
 		
 	# Returns True iff the curvature sign of two adjacent cubic 
 	# bezier segments (a,b), (c,d), (e,f), (g,h)
@@ -282,8 +2059,8 @@ class Curvatura:
 		aa = e*h-2*c*h+a*h-f*g+2*d*g-b*g+3*c*f-2*a*f-3*d*e+2*b*e+a*d-b*c
 		bb = c*h-a*h-d*g+b*g-3*c*f+3*a*f+3*d*e-3*b*e-2*a*d+2*b*c
 		cc = c*f-a*f-d*e+b*e+a*d-b*c
-		if aa == 0 and not bb == 0 and 0.001 < -c/bb < 0.999: # lin. eq.
-			return -c/bb
+		if aa == 0 and not bb == 0 and 0.001 < -cc/bb < 0.999: # lin. eq.
+			return -cc/bb
 		else:
 			discriminant = bb**2-4*aa*cc
 			if discriminant >= 0 and not aa == 0:
@@ -294,71 +2071,409 @@ class Curvatura:
 				elif 0.001 < t2 < 0.999:
 					return t2
 		return None
-			
-	# Adds missing inflection points to a fontforge contour c.
+		
+	# Same as inflection() but for many cubic bezier segments at once.
+	# segments is an array of shape (n,8) where every row holds
+	# a,b,c,d,e,f,g,h. Returns the array of the inflection point times,
+	# which are nan where there is no inflection point.
+	@staticmethod
+	def inflection_batch(segments):
+		if numpy is None:
+			times = [Curvatura.inflection(*s) for s in segments]
+			return [float('nan') if t is None else t for t in times]
+		a,b,c,d,e,f,g,h = numpy.asarray(segments,dtype=float).reshape(-1,8).T
+		aa = e*h-2*c*h+a*h-f*g+2*d*g-b*g+3*c*f-2*a*f-3*d*e+2*b*e+a*d-b*c
+		bb = c*h-a*h-d*g+b*g-3*c*f+3*a*f+3*d*e-3*b*e-2*a*d+2*b*c
+		cc = c*f-a*f-d*e+b*e+a*d-b*c
+		t = numpy.full(aa.shape,numpy.nan)
+		with numpy.errstate(divide='ignore',invalid='ignore'):
+			tl = -cc/bb # solution of the linear equation
+			linear = (aa == 0) & (bb != 0) & (0.001 < tl) & (tl < 0.999)
+			discriminant = bb**2-4*aa*cc
+			quadratic = ~linear & (aa != 0) & (discriminant >= 0)
+			root = numpy.sqrt(numpy.where(quadratic,discriminant,0))
+			t1 = (-bb + root)/(2*aa)
+			t2 = (-bb - root)/(2*aa)
+		t = numpy.where(linear,tl,t)
+		t = numpy.where(quadratic & (0.001 < t2) & (t2 < 0.999),t2,t)
+		t = numpy.where(quadratic & (0.001 < t1) & (t1 < 0.999),t1,t)
+		return t
+
+	# Returns the ascending list of all the inflection point times of a
+	# cubic bezier segment (a,b),(c,d),(e,f),(g,h) (there are at most two).
+	@staticmethod
+	def inflections(a,b,c,d,e,f,g,h):
+		# the coefficients of curvature=0 as in inflection():
+		aa = e*h-2*c*h+a*h-f*g+2*d*g-b*g+3*c*f-2*a*f-3*d*e+2*b*e+a*d-b*c
+		bb = c*h-a*h-d*g+b*g-3*c*f+3*a*f+3*d*e-3*b*e-2*a*d+2*b*c
+		cc = c*f-a*f-d*e+b*e+a*d-b*c
+		times = []
+		if aa == 0:
+			if not bb == 0: # lin. eq.
+				times.append(-cc/bb)
+		else:
+			discriminant = bb**2-4*aa*cc
+			if discriminant == 0:
+				times.append(-bb/(2*aa))
+			elif discriminant > 0:
+				times.append((-bb + discriminant**.5)/(2*aa))
+				times.append((-bb - discriminant**.5)/(2*aa))
+		return sorted(t for t in times if 0.001 < t < 0.999) # rounding issues
+
+	# Same as inflections() but for many cubic bezier segments at once.
+	# segments is an array of shape (n,8) where every row holds
+	# a,b,c,d,e,f,g,h. Returns an array of shape (n,2) where every row
+	# holds the inflection point times in ascending order, padded with nan.
+	@staticmethod
+	def inflections_batch(segments):
+		if numpy is None:
+			times = [Curvatura.inflections(*s) for s in segments]
+			return [t+[float('nan')]*(2-len(t)) for t in times]
+		a,b,c,d,e,f,g,h = numpy.asarray(segments,dtype=float).reshape(-1,8).T
+		aa = e*h-2*c*h+a*h-f*g+2*d*g-b*g+3*c*f-2*a*f-3*d*e+2*b*e+a*d-b*c
+		bb = c*h-a*h-d*g+b*g-3*c*f+3*a*f+3*d*e-3*b*e-2*a*d+2*b*c
+		cc = c*f-a*f-d*e+b*e+a*d-b*c
+		with numpy.errstate(divide='ignore',invalid='ignore'):
+			tl = -cc/bb # solution of the linear equation
+			discriminant = bb**2-4*aa*cc
+			quadratic = (aa != 0) & (discriminant >= 0)
+			root = numpy.sqrt(numpy.where(quadratic,discriminant,0))
+			t1 = numpy.where(aa == 0,tl,(-bb + root)/(2*aa))
+			t2 = (-bb - root)/(2*aa)
+		first = (aa == 0) & (bb != 0) | quadratic
+		second = quadratic & (discriminant > 0)
+		t = numpy.stack((numpy.where(first,t1,numpy.nan),
+		numpy.where(second,t2,numpy.nan)),axis=1)
+		t[~((0.001 < t) & (t < 0.999))] = numpy.nan # rounding issues
+		return numpy.sort(t,axis=1) # nan goes last
+
+	# Adds missing inflection points to a contour buffer c.
 	# The boolean is_glyph_variant is true iff the point selection
 	# in the UI does not matter.
 	@staticmethod
 	def inflection_contour(c,is_glyph_variant):
-		l = len(c)
-		j = 0 # index that will run from 0 to l-1 (may contain jumps)
-		while j < l: # going through the points c[j]
-			if Curvatura.segment_selected_cubic(c,j,is_glyph_variant):
-				t = Curvatura.inflection(c[j].x,c[j].y,c[(j+1)%l].x,c[(j+1)%l].y,
-				c[(j+2)%l].x,c[(j+2)%l].y,c[(j+3)%l].x,c[(j+3)%l].y)
-				if not t is None:
-					Curvatura.split(c,j,t)
-					if not is_glyph_variant:
-						c[(j+3)%l].selected = True # mark new points
-					j += 3 # we just added 3 points...
-					l += 3 # we just added 3 points...
-				j += 2 # we can jump by 2+1 instead of 1
-			j += 1
+		Curvatura.inflection_buffers([c],is_glyph_variant)
+
+	# Same as inflections_batch() but the times are looked up in the
+	# SegmentCache cache (as tuples without the padding). The inflection
+	# times only depend on the shape of a segment, which is given by the
+	# angles and relative handle lengths of chord_angles() together with
+	# the signs of the cosines of the angles (asin cannot tell forward
+	# and backward handles apart).
+	@staticmethod
+	def inflections_cached(segments,cache):
+		l,alpha,beta,da,db,dg,dh = Curvatura.chord_angles_batch(segments)
+		keys = []
+		for k in range(len(segments)):
+			a,b,c,d,e,f,g,h = segments[k]
+			keys.append(cache.key("inflections",alpha[k],beta[k],
+			((c-a)**2+(d-b)**2)**.5/l[k] if l[k] > 0 else math.nan,
+			((e-g)**2+(f-h)**2)**.5/l[k] if l[k] > 0 else math.nan,
+			math.copysign(1,(g-a)*da[k]+(h-b)*db[k]),
+			math.copysign(1,(a-g)*dg[k]+(b-h)*dh[k])))
+		return cache.lookup(keys,lambda indices: [tuple(t for t in times
+		if t == t) for times in Curvatura.inflections_batch(
+		[segments[i] for i in indices])])
+
+	# Adds missing inflection points to all the contour buffers
+	# (the inflection point times are computed in one batch). Every
+	# contour is rebuilt once with all its new points (see
+	# split_segments()), a segment may get two of them. If masters (see
+	# modify_buffers()) is given, the buffers of a group get the same 
+	# number of new points in the same segments such that they stay 
+	# compatible: a master with fewer inflection points in a segment than
+	# the others is split at the mean times of the others.
+	@staticmethod
+	def inflection_buffers(buffers,is_glyph_variant,cache=None,masters=None):
+		if masters is None:
+			masters = [[k] for k in range(len(buffers))]
+		groups = dict((id(buffers[g[0]]),[buffers[k] for k in g[1:]]) 
+		for g in masters)
+		segments, where = Curvatura.selected_segments([buffers[g[0]] 
+		for g in masters],is_glyph_variant)
+		others = [] # the indices of the segments of the other masters
+		for k in range(len(where)):
+			c, j = where[k]
+			others.append([])
+			for m in groups[id(c)]:
+				l = len(m)
+				j1, j2, j3 = (j+1)%l, (j+2)%l, (j+3)%l
+				others[k].append(len(segments))
+				segments.append((m.x[j],m.y[j],m.x[j1],m.y[j1],
+				m.x[j2],m.y[j2],m.x[j3],m.y[j3]))
+		if cache is None:
+			times = Curvatura.inflections_batch(segments)
+		else:
+			times = Curvatura.inflections_cached(segments,cache)
+		# the segments of a buffer are consecutive in where (ascending):
+		splits = 0
+		k = 0
+		while k < len(where):
+			c = where[k][0]
+			contour_splits = [[] for m in range(len(groups[id(c)])+1)]
+			while k < len(where) and where[k][0] is c:
+				t = [[s for s in times[i] if s == s] # not nan
+				for i in [k]+others[k]]
+				n = max(len(ti) for ti in t)
+				if n > 0:
+					full = [ti for ti in t if len(ti) == n]
+					mean = [sum(ts)/len(full) for ts in zip(*full)]
+					for m in range(len(t)):
+						contour_splits[m].append((where[k][1],
+						t[m] if len(t[m]) == n else mean))
+				k += 1
+			# new points are marked if the selection matters:
+			for m, ms in zip([c]+groups[id(c)],contour_splits):
+				splits += Curvatura.split_segments(m,ms,not is_glyph_variant)
+		Curvatura.count("inflection.modified",splits)
 
 	# Tunnifies a cubic bezier path (a,b), (c,d), (e,f), (g,h).
 	# i.e. moves the handles (c,d) and (e,f) on the lines (a,b)--(c,d) 
 	# and (e,f)--(g,h) in order to reach the ideal stated by Eduardo Tunni.
 	@staticmethod
 	def tunnify(a,b,c,d,e,f,g,h):
+		if a == g and b == h: # then tunnify makes no sense
+			Curvatura.count("tunnify.degenerate")
+			return c,d,e,f
 		l,alpha,beta,da,db,dg,dh = Curvatura.chord_angles(a,b,c,d,e,f,g,h) # too much computation...
+		# the same angles with atan2() (the arcsine loses half of the 
+		# digits near right angles, where tunnify_fast() is exact):
+		alpha = math.atan2((g-a)*db-(h-b)*da,abs((g-a)*da+(h-b)*db))
+		beta = math.atan2((g-a)*dh-(h-b)*dg,abs((g-a)*dg+(h-b)*dh))
 		aa = ((c-a)**2+(d-b)**2)**.5/l
 		bb = ((e-g)**2+(f-h)**2)**.5/l
 		if aa == 0 and bb == 0 or l == 0: # then tunnify makes no sense
+			Curvatura.count("tunnify.degenerate")
 			return c,d,e,f 
-		if abs(alpha+beta)%math.pi == 0: 
-			return a+.5*(aa+bb)/aa*(c-a),b+.5*(aa+bb)/aa*(d-b),g+.5*(aa+bb)/bb*(e-g),h+.5*(aa+bb)/bb*(f-h)		
+		if abs(alpha+beta)%math.pi == 0: # handles get their mean length
+			Curvatura.count("tunnify.symmetric")
+			if aa > 0:
+				c, d = a+.5*(aa+bb)/aa*(c-a), b+.5*(aa+bb)/aa*(d-b)
+			if bb > 0:
+				e, f = g+.5*(aa+bb)/bb*(e-g), h+.5*(aa+bb)/bb*(f-h)
+			return c,d,e,f
 		if alpha < 0: # make alpha nonnegative
 			alpha = -alpha
 			beta = -beta
 		if beta <= 0 or alpha == 0: # then tunnify makes no sense
+			Curvatura.count("tunnify.no_solution")
 			return c,d,e,f 
 		asa = aa*math.sin(alpha)
 		bsb = bb*math.sin(beta)
 		ff = 2*(asa+bsb)-aa*bb*math.sin(alpha+beta) # ff = area*20/3
+		epsilon = Curvatura.tunnify_options["double_root"]
+		if abs(ff) < epsilon:
+			ff = 0.
 		cotab = 1/math.tan(alpha) + 1/math.tan(beta)
 		discriminant = 4-cotab*ff
+		if abs(discriminant) < epsilon:
+			discriminant = 0.
 		if discriminant < 0: # then tunnify makes no sense
+			Curvatura.count("tunnify.no_solution")
 			return c,d,e,f 
 		hh = (2-discriminant**.5)/cotab # take the smaller solution as the larger could have loops
 		if hh < 0:
 			hh = (2+discriminant**.5)/cotab
 		return a+hh/math.sin(alpha)*da*l,b+hh/math.sin(alpha)*db*l, \
 		g+hh/math.sin(beta)*dg*l,h+hh/math.sin(beta)*dh*l	
+		
+	# Same as tunnify() but for many cubic bezier paths at once.
+	# segments is an array of shape (n,8) where every row holds
+	# a,b,c,d,e,f,g,h. Returns an array of shape (n,4) where every row
+	# holds the new handles c,d,e,f. The degenerate cases are treated
+	# like in tunnify() (where tunnify() would divide by zero, the 
+	# handles are not changed).
+	@staticmethod
+	def tunnify_batch(segments):
+		if numpy is None:
+			return [Curvatura.tunnify(*s) for s in segments]
+		s = numpy.asarray(segments,dtype=float).reshape(-1,8)
+		a,b,c,d,e,f,g,h = s.T
+		result = s[:,2:6].copy()
+		if len(s) == 0:
+			return result
+		with numpy.errstate(divide='ignore',invalid='ignore'):
+			l,alpha,beta,da,db,dg,dh = Curvatura.chord_angles_batch(s)
+			alpha = numpy.arctan2((g-a)*db-(h-b)*da,  # like in tunnify()
+			numpy.abs((g-a)*da+(h-b)*db))
+			beta = numpy.arctan2((g-a)*dh-(h-b)*dg,numpy.abs((g-a)*dg+(h-b)*dh))
+			aa = numpy.sqrt((c-a)**2+(d-b)**2)/l
+			bb = numpy.sqrt((e-g)**2+(f-h)**2)/l
+			# then tunnify makes no sense:
+			unchanged = (aa == 0) & (bb == 0) | (l == 0) | numpy.isnan(l) 
+			symmetric = ~unchanged & (numpy.abs(alpha+beta)%math.pi == 0)
+			sa = .5*(aa+bb)/aa
+			sb = .5*(aa+bb)/bb
+			scaled = numpy.stack((a+sa*(c-a),b+sa*(d-b),
+			g+sb*(e-g),h+sb*(f-h)),axis=1)
+			negative = alpha < 0 # make alpha nonnegative
+			alpha = numpy.where(negative,-alpha,alpha)
+			beta = numpy.where(negative,-beta,beta)
+			generic = ~unchanged & ~symmetric & (beta > 0) & (alpha != 0)
+			sin_alpha = numpy.sin(alpha)
+			sin_beta = numpy.sin(beta)
+			ff = 2*(aa*sin_alpha+bb*sin_beta)-aa*bb*numpy.sin(alpha+beta)
+			epsilon = Curvatura.tunnify_options["double_root"]
+			ff[numpy.abs(ff) < epsilon] = 0.
+			cotab = 1/numpy.tan(alpha) + 1/numpy.tan(beta)
+			discriminant = 4-cotab*ff
+			discriminant[numpy.abs(discriminant) < epsilon] = 0.
+			generic &= discriminant >= 0
+			root = numpy.sqrt(numpy.where(generic,discriminant,0))
+			hh = (2-root)/cotab # the smaller solution as the larger could have loops
+			hh = numpy.where(hh < 0,(2+root)/cotab,hh)
+			tunnified = numpy.stack((a+hh/sin_alpha*da*l,b+hh/sin_alpha*db*l,
+			g+hh/sin_beta*dg*l,h+hh/sin_beta*dh*l),axis=1)
+		result = numpy.where(symmetric[:,None] & numpy.isfinite(scaled),
+		scaled,result)
+		result = numpy.where(generic[:,None],tunnified,result)
+		stats = Curvatura.stats
+		if stats is not None:
+			stats.count("tunnify.degenerate",int(unchanged.sum()))
+			stats.count("tunnify.symmetric",int(symmetric.sum()))
+			stats.count("tunnify.no_solution",
+			int((~unchanged & ~symmetric & ~generic).sum()))
+		return result
+		
+	# A faster version of tunnify_batch() for previews and large batches
+	# (see tunnify_options). tunnify() only needs the sines and cosines of
+	# the angles of chord_angles() (asin yields nonnegative cosines), and
+	# these are cross and dot products of the chord with the handles over
+	# their lengths. Hence no trigonometric functions are needed and the
+	# smaller solution is taken in its cancellation-free form. The 
+	# segments where the sine of an angle is below angle (including 
+	# retracted handles and zero chords), both angles are right angles
+	# or the discriminant is negative are passed to tunnify_batch(). 
+	# Double roots are the ones of tunnify() (see tunnify_options).
+	@staticmethod
+	def tunnify_fast(segments,angle=1e-2):
+		if numpy is None:
+			return [Curvatura.tunnify_fast_segment(*s,angle) for s in segments]
+		s = numpy.asarray(segments,dtype=float).reshape(-1,8)
+		a,b,c,d,e,f,g,h = s.T
+		ux, uy = g-a, h-b # the chord and the handles:
+		ax, ay, bx, by = c-a, d-b, e-g, f-h
+		cross_a, cross_b = ux*ay-uy*ax, ux*by-uy*bx
+		dot_a, dot_b = numpy.abs(ux*ax+uy*ay), numpy.abs(ux*bx+uy*by)
+		cross_b = numpy.where(cross_a < 0,-cross_b,cross_b) # alpha >= 0
+		cross_a = numpy.abs(cross_a)
+		l2 = ux*ux+uy*uy
+		bound = angle*angle*l2
+		fast = (cross_a > 0) & (cross_b > 0) & (dot_a+dot_b > 0) \
+		& (cross_a*cross_a >= bound*(ax*ax+ay*ay)) \
+		& (cross_b*cross_b >= bound*(bx*bx+by*by))
+		with numpy.errstate(divide='ignore',invalid='ignore'):
+			ff = 2*(cross_a+cross_b)/l2-(cross_a*dot_b+dot_a*cross_b)/(l2*l2)
+			epsilon = Curvatura.tunnify_options["double_root"]
+			ff[numpy.abs(ff) < epsilon] = 0.
+			cotab = dot_a/cross_a+dot_b/cross_b
+			discriminant = 4-cotab*ff
+			discriminant[numpy.abs(discriminant) < epsilon] = 0.
+			fast &= discriminant >= 0
+			root = numpy.sqrt(numpy.where(fast,discriminant,0))
+			hh = numpy.where(ff >= 0,ff/(2+root),(2+root)/cotab)*l2
+			ra, rb = hh/cross_a, hh/cross_b
+			tunnified = numpy.stack((a+ra*ax,b+ra*ay,g+rb*bx,h+rb*by),axis=1)
+		result = numpy.empty((len(s),4))
+		result[fast] = tunnified[fast]
+		if not fast.all():
+			result[~fast] = Curvatura.tunnify_batch(s[~fast])
+		Curvatura.count("tunnify.fast",int(fast.sum()))
+		return result
+		
+	# The version of tunnify_fast() for a single segment (without numpy).
+	@staticmethod
+	def tunnify_fast_segment(a,b,c,d,e,f,g,h,angle=1e-2):
+		ux, uy = g-a, h-b
+		ax, ay, bx, by = c-a, d-b, e-g, f-h
+		cross_a, cross_b = ux*ay-uy*ax, ux*by-uy*bx
+		dot_a, dot_b = abs(ux*ax+uy*ay), abs(ux*bx+uy*by)
+		if cross_a < 0:
+			cross_a, cross_b = -cross_a, -cross_b
+		l2 = ux*ux+uy*uy
+		bound = angle*angle*l2
+		if cross_a > 0 and cross_b > 0 and dot_a+dot_b > 0 \
+		and cross_a*cross_a >= bound*(ax*ax+ay*ay) \
+		and cross_b*cross_b >= bound*(bx*bx+by*by):
+			ff = 2*(cross_a+cross_b)/l2-(cross_a*dot_b+dot_a*cross_b)/(l2*l2)
+			epsilon = Curvatura.tunnify_options["double_root"]
+			if abs(ff) < epsilon:
+				ff = 0.
+			cotab = dot_a/cross_a+dot_b/cross_b
+			discriminant = 4-cotab*ff
+			if abs(discriminant) < epsilon:
+				discriminant = 0.
+			if discriminant >= 0:
+				Curvatura.count("tunnify.fast")
+				root = discriminant**.5
+				hh = (ff/(2+root) if ff >= 0 else (2+root)/cotab)*l2
+				ra, rb = hh/cross_a, hh/cross_b
+				return a+ra*ax,b+ra*ay,g+rb*bx,h+rb*by
+		return Curvatura.tunnify(a,b,c,d,e,f,g,h)
 
-	# Tunnifies the handles of a fontforge contour c.
+	# Tunnifies the handles of a contour buffer c.
 	# The boolean is_glyph_variant is true iff the point selection
 	# in the UI does not matter.
 	@staticmethod
 	def tunnify_contour(c,is_glyph_variant):
-		l = len(c)
-		j = 0 # index that will run from 0 to l-1 (may contain jumps)
-		while j < l: # going through the points c[j]
-			if Curvatura.segment_selected_cubic(c,j,is_glyph_variant):
-				c[(j+1)%l].x,c[(j+1)%l].y,c[(j+2)%l].x,c[(j+2)%l].y = \
-				Curvatura.tunnify(c[j].x,c[j].y,c[(j+1)%l].x,c[(j+1)%l].y, 
-				c[(j+2)%l].x,c[(j+2)%l].y,c[(j+3)%l].x,c[(j+3)%l].y)
-				j += 2 # we can jump by 2+1 instead of 1
-			j += 1
+		Curvatura.tunnify_buffers([c],is_glyph_variant)
+		
+	# Same as tunnify_batch() but the results are looked up in the
+	# SegmentCache cache. Tunnify only depends on the angles and relative 
+	# handle lengths of chord_angles() and keeps the handle directions,
+	# so the cached results are the new handle lengths relative to the
+	# chord.
+	@staticmethod
+	def tunnify_cached(segments,cache):
+		l,alpha,beta,da,db,dg,dh = Curvatura.chord_angles_batch(segments)
+		keys = []
+		for k in range(len(segments)):
+			a,b,c,d,e,f,g,h = segments[k]
+			keys.append(cache.key("tunnify",alpha[k],beta[k],
+			((c-a)**2+(d-b)**2)**.5/l[k] if l[k] > 0 else math.nan,
+			((e-g)**2+(f-h)**2)**.5/l[k] if l[k] > 0 else math.nan))
+		def compute(indices):
+			handles = Curvatura.tunnify_batch([segments[i] for i in indices])
+			lengths = []
+			for n in range(len(indices)):
+				k = indices[n]
+				a,b,c,d,e,f,g,h = segments[k]
+				if keys[k] is None: # not cached, keep the handles
+					lengths.append(tuple(handles[n]))
+				else:
+					lengths.append((((handles[n][0]-a)*da[k]
+					+(handles[n][1]-b)*db[k])/l[k],((handles[n][2]-g)*dg[k]
+					+(handles[n][3]-h)*dh[k])/l[k]))
+			return lengths
+		lengths = cache.lookup(keys,compute)
+		handles = []
+		for k in range(len(segments)):
+			if keys[k] is None:
+				handles.append(lengths[k])
+			else:
+				a, b, g, h = segments[k][0], segments[k][1], \
+				segments[k][6], segments[k][7]
+				ra, rb = lengths[k][0]*l[k], lengths[k][1]*l[k]
+				handles.append((a+ra*da[k],b+ra*db[k],g+rb*dg[k],h+rb*dh[k]))
+		return handles
+		
+	# Tunnifies the handles of all the contour buffers 
+	# (in one batch, e.g. for a whole font).
+	@staticmethod
+	def tunnify_buffers(buffers,is_glyph_variant,cache=None):
+		segments, where = Curvatura.selected_segments(buffers,is_glyph_variant)
+		if Curvatura.tunnify_options["fast"]:
+			handles = Curvatura.tunnify_fast(segments,
+			Curvatura.tunnify_options["angle"])
+		elif cache is None:
+			handles = Curvatura.tunnify_batch(segments)
+		else:
+			handles = Curvatura.tunnify_cached(segments,cache)
+		for k in range(len(where)):
+			c, j = where[k]
+			l = len(c)
+			j1, j2 = (j+1)%l, (j+2)%l
+			c.x[j1], c.y[j1], c.x[j2], c.y[j2] = handles[k]
 			
 	# Given two adjacent cubic bezier curves (a,b), (c,d), (e,f), (g,h)
 	# and (g,h), (i,j), (k,l), (m,n) that are smooth at (g,h)
@@ -396,73 +2511,367 @@ class Curvatura:
 		t = (b2-(b2*j2)**.5)/(b2-j2)
 		return (1-t)*c+t*g, (1-t)*d+t*h
 				
-	# Harmonizes the nodes of a fontforge contour c.
+	# Harmonizes the nodes of a contour buffer c.
 	# The boolean is_glyph_variant is true iff the point selection
 	# in the UI does not matter.
 	@staticmethod
 	def harmonize_contour(c,is_glyph_variant):
-		l = len(c)
+		if Curvatura.harmonize_options["tolerance"] is not None:
+			Curvatura.harmonize_solve(c,is_glyph_variant,
+			**Curvatura.harmonize_options)
+			return
+		x, y = c.x, c.y
+		neighbours = Curvatura.topology(c,is_glyph_variant).neighbours
 		if c.is_quadratic:
 			# iterate 5 times
 			for fivetimes in range(5):
-				for i in range(l): # going through the points c[i]
-					if Curvatura.segments_selected_quadratic(c,i,is_glyph_variant):
-						c[i].x, c[i].y = Curvatura.harmonize_quadratic(
-						c[(i-2)%l].x, c[(i-2)%l].y, c[(i-1)%l].x, c[(i-1)%l].y, 
-						c[i].x, c[i].y, c[(i+1)%l].x, c[(i+1)%l].y, 
-						c[(i+2)%l].x, c[(i+2)%l].y)
-						i += 2 # makes things a little bit faster
-					else:
-						i += 1	
+				for h2, h1, i, i1, i2 in neighbours: # the selected nodes c[i]
+					x[i], y[i] = Curvatura.harmonize_quadratic(
+					x[h2], y[h2], x[h1], y[h1], x[i], y[i], 
+					x[i1], y[i1], x[i2], y[i2])
 		else:
-			for i in range(l): # going through the points c[i]
-				if Curvatura.segments_selected_cubic(c,i,is_glyph_variant):
-					c[i].x, c[i].y = Curvatura.harmonize_cubic(c[(i-3)%l].x,
-					c[(i-3)%l].y, c[(i-2)%l].x, c[(i-2)%l].y, c[(i-1)%l].x, 
-					c[(i-1)%l].y, c[i].x, c[i].y, c[(i+1)%l].x, c[(i+1)%l].y, 
-					c[(i+2)%l].x, c[(i+2)%l].y, c[(i+3)%l].x, c[(i+3)%l].y)
-					i += 3 # makes things a little bit faster
+			for h3, h2, h1, i, i1, i2, i3 in neighbours: # the nodes c[i]
+				x[i], y[i] = Curvatura.harmonize_cubic(x[h3], y[h3], 
+				x[h2], y[h2], x[h1], y[h1], x[i], y[i], 
+				x[i1], y[i1], x[i2], y[i2], x[i3], y[i3])
+					
+	# Harmonizes the nodes of a contour buffer c like harmonize_contour()
+	# but treats all the selected nodes as one system, which is iterated
+	# until no node moves more than tolerance (in font units) or after 
+	# iterations sweeps. The method is either "gauss-seidel" (every node
+	# sees the updates of its neighbours at once) or "jacobi" (all nodes 
+	# are updated at once, which is vectorized). The updates are scaled 
+	# by relaxation (successive over-relaxation for values above 1, see
+	# check_harmonize_options()). If the nodes still move after 
+	# iterations sweeps, they get back their coordinates from before 
+	# (rather than a distorted outline). Returns the number of sweeps.
+	# (In the cubic case the nodes do not depend on each other and the 
+	# second sweep only confirms the first.)
+	@staticmethod
+	def harmonize_solve(c,is_glyph_variant,tolerance=1e-6,
+	method="gauss-seidel",relaxation=1.,iterations=100):
+		Curvatura.check_harmonize_options(method=method,relaxation=relaxation)
+		x, y = c.x, c.y
+		neighbours = Curvatura.topology(c,is_glyph_variant).neighbours
+		if len(neighbours) == 0:
+			return 0
+		x0, y0 = x[:], y[:]
+		for sweep in range(1,iterations+1):
+			if method == "jacobi":
+				new = Curvatura.harmonize_nodes(x,y,neighbours,c.is_quadratic)
+			else:
+				new = None
+			moved = 0
+			for k in range(len(neighbours)):
+				p = neighbours[k]
+				i = p[len(p)//2]
+				if new is not None:
+					nx, ny = new[0][k], new[1][k]
+				elif c.is_quadratic:
+					nx, ny = Curvatura.harmonize_quadratic(x[p[0]], y[p[0]],
+					x[p[1]], y[p[1]], x[i], y[i], x[p[3]], y[p[3]], 
+					x[p[4]], y[p[4]])
 				else:
-					i += 1				
+					nx, ny = Curvatura.harmonize_cubic(x[p[0]], y[p[0]],
+					x[p[1]], y[p[1]], x[p[2]], y[p[2]], x[i], y[i],
+					x[p[4]], y[p[4]], x[p[5]], y[p[5]], x[p[6]], y[p[6]])
+				nx, ny = x[i]+relaxation*(nx-x[i]), y[i]+relaxation*(ny-y[i])
+				moved = max(moved,abs(nx-x[i]),abs(ny-y[i]))
+				x[i], y[i] = nx, ny
+			if moved <= tolerance: # early exit, nothing moves (anymore)
+				break
+		if moved > tolerance: # not converged
+			x[:], y[:] = x0, y0
+		stats = Curvatura.stats
+		if stats is not None:
+			stats.count("harmonize_solve.sweeps",sweep)
+			stats.count("harmonize_solve.not_converged",int(moved > tolerance))
+		return sweep
+		
+	# Raises a ValueError unless the options of harmonize_solve() (see
+	# harmonize_options) can converge: the method is "gauss-seidel" or 
+	# "jacobi" and the relaxation is in (0,2), for "jacobi" in (0,1] 
+	# (over-relaxing the simultaneous updates makes them diverge).
+	@staticmethod
+	def check_harmonize_options(method="gauss-seidel",relaxation=1.,
+	**others):
+		if method not in {"gauss-seidel","jacobi"}:
+			raise ValueError("unknown harmonize method: %r" % (method,))
+		if not 0 < relaxation < 2:
+			raise ValueError("the relaxation must be between 0 and 2")
+		if method == "jacobi" and relaxation > 1:
+			raise ValueError("the relaxation must be at most 1 for jacobi")
+			
+	# Re-harmonizes a contour buffer c after the points with the indices
+	# changed have been edited (e.g. a node has been dragged), such that
+	# only their neighbourhood is touched: the selected nodes whose
+	# neighbours (see Topology) contain a changed point are harmonized
+	# like in harmonize_contour() or, if handles is True, their handles
+	# are adjusted to the average curvatures like in 
+	# harmonizehandles_contour() (the nodes outside keep their 
+	# curvatures). The nodes next to the points that have moved by more
+	# than tolerance (in font units) are harmonized in the next round 
+	# and so on, at most iterations rounds. Hence the work depends on the
+	# size of the edit, not on the size of the contour. Returns the 
+	# sorted list of the indices of the points that have moved by more
+	# than tolerance.
+	@staticmethod
+	def harmonize_local(c,changed,is_glyph_variant=True,handles=False,
+	tolerance=1e-3,iterations=100,cache=None):
+		x, y = c.x, c.y
+		topology = Curvatura.topology(c,is_glyph_variant)
+		neighbours, node_index = topology.neighbours, topology.node_index
+		if handles and c.is_quadratic:
+			return []
+		l = len(c)
+		# the nodes whose neighbours contain one of the points:
+		def around(points):
+			nodes = set()
+			for k in points:
+				for d in range(-3,4):
+					i = (k+d)%l
+					if i in node_index and k in neighbours[node_index[i]]:
+						nodes.add(i)
+			return nodes
+		active = around(changed)
+		moved = set()
+		updates = 0
+		for sweep in range(iterations):
+			if not active:
+				break
+			updates += len(active)
+			if handles:
+				far = Curvatura.adjust_local(c,topology,active,cache,tolerance)
+			else:
+				far = []
+				for i in sorted(active):
+					p = neighbours[node_index[i]]
+					if c.is_quadratic:
+						nx, ny = Curvatura.harmonize_quadratic(x[p[0]], y[p[0]],
+						x[p[1]], y[p[1]], x[i], y[i], x[p[3]], y[p[3]], 
+						x[p[4]], y[p[4]])
+					else:
+						nx, ny = Curvatura.harmonize_cubic(x[p[0]], y[p[0]],
+						x[p[1]], y[p[1]], x[p[2]], y[p[2]], x[i], y[i],
+						x[p[4]], y[p[4]], x[p[5]], y[p[5]], x[p[6]], y[p[6]])
+					if abs(nx-x[i]) > tolerance or abs(ny-y[i]) > tolerance:
+						far.append(i)
+					x[i], y[i] = nx, ny
+			moved.update(far)
+			active = around(far)
+		Curvatura.count("harmonize_local.updates",updates)
+		return sorted(moved)
+		
+	# Adjusts the handles of the cubic segments next to the selected 
+	# nodes active of the contour buffer c with the Topology topology to
+	# the average curvatures at these nodes (for harmonize_local()). At
+	# the other ends of the segments the curvatures stay. Returns the 
+	# indices of the handles that have moved by more than tolerance.
+	@staticmethod
+	def adjust_local(c,topology,active,cache,tolerance):
+		x, y = c.x, c.y
+		targets = {} # the new curvatures before and after the nodes
+		for i in active:
+			h3, h2, h1, node, i1, i2, i3 = \
+			topology.neighbours[topology.node_index[i]]
+			post = Curvatura.curvature_at_start(
+			x[i], y[i], x[i1], y[i1], x[i2], y[i2], x[i3], y[i3])
+			pre = -Curvatura.curvature_at_start(
+			x[i], y[i], x[h1], y[h1], x[h2], y[h2], x[h3], y[h3])
+			if post*pre < 0: # inflection node
+				targets[i] = (0,0)
+			else:
+				targets[i] = (math.copysign(.5*(abs(post)+abs(pre)),pre),
+				math.copysign(.5*(abs(post)+abs(pre)),post))
+		starts = set() # the starting points of the segments to adjust
+		for i in active:
+			p = topology.neighbours[topology.node_index[i]]
+			starts.update((p[0],i))
+		segments, kas, kgs, where = [], [], [], []
+		for s in sorted(starts):
+			s1, s2, s3 = [(s+d)%len(c) for d in (1,2,3)]
+			if s in targets:
+				ka = targets[s][1]
+			else:
+				ka = Curvatura.curvature_at_start(
+				x[s], y[s], x[s1], y[s1], x[s2], y[s2], x[s3], y[s3])
+			if s3 in targets:
+				kg = targets[s3][0]
+			else:
+				kg = -Curvatura.curvature_at_start(
+				x[s3], y[s3], x[s2], y[s2], x[s1], y[s1], x[s], y[s])
+			segments.append((x[s], y[s], x[s1], y[s1], x[s2], y[s2],
+			x[s3], y[s3]))
+			kas.append(ka)
+			kgs.append(kg)
+			where.append((s1,s2))
+		handles = Curvatura.adjust_handles_batch(segments,kas,kgs,cache)
+		far = []
+		for k in range(len(where)):
+			j1, j2 = where[k]
+			nc, nd, ne, nf = handles[k]
+			if max(abs(nc-x[j1]),abs(nd-y[j1]),abs(ne-x[j2]),
+			abs(nf-y[j2])) > tolerance:
+				far += [j1,j2]
+			x[j1], y[j1], x[j2], y[j2] = nc, nd, ne, nf
+		return far
+		
+	# Returns the arrays of the harmonized positions of the nodes of the
+	# coordinate arrays x and y, which are given by their neighbours (see
+	# Topology), all computed from the current positions (for the jacobi
+	# method).
+	@staticmethod
+	def harmonize_nodes(x,y,neighbours,is_quadratic):
+		if numpy is None:
+			new = [(Curvatura.harmonize_quadratic if is_quadratic 
+			else Curvatura.harmonize_cubic)(*[v for k in p 
+			for v in (x[k],y[k])]) for p in neighbours]
+			return [p[0] for p in new], [p[1] for p in new]
+		x, y = numpy.asarray(x), numpy.asarray(y)
+		p = numpy.asarray(neighbours).reshape(len(neighbours),-1)
+		m = p.shape[1]//2 # the column of the nodes
+		i = p[:,m]
+		px, py = x[p[:,m-1]], y[p[:,m-1]] # the points next to the nodes
+		qx, qy = x[p[:,m+1]], y[p[:,m+1]]
+		ax, ay = x[p[:,m-2]], y[p[:,m-2]] # and the points next to them
+		bx, by = x[p[:,m+2]], y[p[:,m+2]]
+		u, v = qx-px, qy-py
+		with numpy.errstate(divide='ignore',invalid='ignore'):
+			norm = numpy.sqrt(u**2+v**2)
+			sa = numpy.abs((ay-py)*u-(ax-px)*v)/norm
+			sb = numpy.abs((by-py)*u-(bx-px)*v)/norm
+			# (sa-sqrt(sa*sb))/(sa-sb) of harmonize_quadratic() simplified:
+			t = numpy.sqrt(sa)/(numpy.sqrt(sa)+numpy.sqrt(sb))
+		t = numpy.where(sa == sb,.5,t)
+		fixed = norm == 0 # no changes
+		return numpy.where(fixed,x[i],px+t*u), numpy.where(fixed,y[i],py+t*v)
 	
 	# Sets the lengths a and b of the handles of a cubic bezier path 
 	# from (0,0) to (1,0) enclosing angles alpha and beta with the x-axis
 	# such that the curvature at (0,0) becomes ka and the curvature at
-	# (1,0) becomes kb.
+	# (1,0) becomes kb. Curvatures below 1e-12 are rounding errors of 
+	# zero (otherwise the quartic gets roots of the order 1/ka resp. 
+	# 1/kb, i.e. absurdly long handles).
 	@staticmethod
 	def scale_handles(alpha,beta,ka,kb):
+		ka = 0. if abs(ka) < 1e-12 else ka
+		kb = 0. if abs(kb) < 1e-12 else kb
 		solutions = []
 		sa = math.sin(alpha)
 		if alpha + beta == 0: # if ka = kb = 0, there is no solution (take the best available)
-			solutions.append(
-			[math.cos(alpha) if ka == 0 else (-2*sa/(3*ka))**.5 ,
-			math.cos(beta) if kb == 0 else (2*sa/(3*kb))**.5])
+			if (ka == 0 or -sa/ka >= 0) and (kb == 0 or sa/kb >= 0):
+				solutions.append(
+				[math.cos(alpha) if ka == 0 else (-2*sa/(3*ka))**.5 ,
+				math.cos(beta) if kb == 0 else (2*sa/(3*kb))**.5])
 		else:
 			sb = math.sin(beta)
 			sba = math.sin(alpha+beta)
-			b_roots = Curvatura.newton_roots([27*ka*kb**2,0,36*ka*sb*kb,
+			b_roots = Curvatura.real_roots([27*ka*kb**2,0,36*ka*sb*kb,
 			-8*sba**3,8*sa*sba**2+12*ka*sb**2])
-			print("alpha = ", alpha*57.3, "beta = ", beta*57.3, "ka = ", ka, "kb = ", kb, "roots = ", b_roots)
 			for i in b_roots:
-				if i > 0:
+				if i > 0 and sba != 0:
 					a = (sb+1.5*kb*i**2)/sba
 					if a > 0:
 						solutions.append([a,i])
-			print(solutions)
+		stats = Curvatura.stats
+		if stats is not None:
+			stats.count("scale_handles.calls")
+			if alpha + beta == 0:
+				stats.count("scale_handles.symmetric")
+			if len(solutions) == 0:
+				stats.count("scale_handles.no_solution")
+			elif len(solutions) > 1:
+				stats.count("scale_handles.several_solutions")
 		if len(solutions) == 0:
 			return None, None
 		elif len(solutions) == 1:
 			return solutions[0][0], solutions[0][1]
 		else: # we only take the solution with the smallest energy 
-			a, b = solutions[0][0], solutions[0][1]
+			# (starting with the smallest lower bound, the solutions 
+			# whose lower bound exceeds the best energy are skipped; 
+			# near cusps energy() may be below the bound, then such a
+			# solution is skipped although energy() would prefer it, 
+			# but its exact energy is large, see energy_bound())
+			bounds = [Curvatura.energy_bound(alpha,beta,s[0],s[1]) 
+			for s in solutions]
+			order = sorted(range(len(solutions)),key=lambda i: bounds[i])
+			a, b = solutions[order[0]][0], solutions[order[0]][1]
 			energy = Curvatura.energy(alpha,beta,a,b)
-			for i in range(1,len(solutions)):
+			for i in order[1:]:
+				if bounds[i] >= energy:
+					break
 				e = Curvatura.energy(alpha,beta,
 				solutions[i][0],solutions[i][1])
 				if e < energy:
 					a, b = solutions[i][0], solutions[i][1]
 					energy = e
 			return a, b
+			
+	# Same as scale_handles() but for many tuples (alpha,beta,ka,kb) 
+	# at once (the arguments are arrays of the same length). Returns 
+	# the arrays of the handle lengths a and b, which are nan where
+	# there is no solution.
+	@staticmethod
+	def scale_handles_batch(alpha,beta,ka,kb):
+		if numpy is None:
+			solutions = [Curvatura.scale_handles(*t) 
+			for t in zip(alpha,beta,ka,kb)]
+			nan = float('nan')
+			return [nan if s[0] is None else s[0] for s in solutions], \
+			[nan if s[1] is None else s[1] for s in solutions]
+		alpha, beta, ka, kb = [numpy.asarray(v,dtype=float).reshape(-1) 
+		for v in (alpha,beta,ka,kb)]
+		ka = numpy.where(numpy.abs(ka) < 1e-12,0.,ka)
+		kb = numpy.where(numpy.abs(kb) < 1e-12,0.,kb)
+		sa = numpy.sin(alpha)
+		sb = numpy.sin(beta)
+		sba = numpy.sin(alpha+beta)
+		with numpy.errstate(divide='ignore',invalid='ignore'):
+			roots = Curvatura.real_roots_batch(numpy.stack((27*ka*kb**2,
+			numpy.zeros_like(ka),36*ka*sb*kb,-8*sba**3,
+			8*sa*sba**2+12*ka*sb**2),axis=1))
+			a = (sb[:,None]+1.5*kb[:,None]*roots**2)/sba[:,None]
+			valid = (roots > 0) & (a > 0) & numpy.isfinite(a)
+			# Where there are several solutions, the one with the smallest
+			# energy is taken. The solutions with the smallest lower bound
+			# are integrated first and then only those solutions whose 
+			# lower bound is below that energy.
+			count = valid.sum(axis=1)
+			energies = numpy.full(roots.shape,numpy.inf)
+			energies[valid & (count == 1)[:,None]] = 0
+			several = numpy.nonzero(count > 1)[0]
+			if len(several) > 0:
+				bounds = numpy.where(valid,Curvatura.energy_bound(
+				alpha[:,None],beta[:,None],a,roots),numpy.inf)
+				first = numpy.argmin(bounds[several],axis=1)
+				energies[several,first] = Curvatura.energy_batch(
+				alpha[several],beta[several],a[several,first],
+				roots[several,first],**Curvatura.energy_options)
+				rest = numpy.nonzero(numpy.isinf(energies) 
+				& (bounds < energies.min(axis=1)[:,None]))
+				energies[rest] = Curvatura.energy_batch(alpha[rest[0]],
+				beta[rest[0]],a[rest],roots[rest],**Curvatura.energy_options)
+			best = numpy.argmin(energies,axis=1)
+			rows = numpy.arange(len(roots))
+			found = valid[rows,best]
+			result_a = numpy.where(found,a[rows,best],numpy.nan)
+			result_b = numpy.where(found,roots[rows,best],numpy.nan)
+			# the symmetric case alpha + beta = 0:
+			symmetric = alpha + beta == 0
+			result_a = numpy.where(symmetric,numpy.where(ka == 0,
+			numpy.cos(alpha),numpy.sqrt(-2*sa/(3*ka))),result_a)
+			result_b = numpy.where(symmetric,numpy.where(kb == 0,
+			numpy.cos(beta),numpy.sqrt(2*sa/(3*kb))),result_b)
+			invalid = numpy.isnan(result_a) | numpy.isnan(result_b)
+			result_a[invalid] = result_b[invalid] = numpy.nan
+		stats = Curvatura.stats
+		if stats is not None:
+			stats.count("scale_handles.calls",len(alpha))
+			stats.count("scale_handles.symmetric",int(symmetric.sum()))
+			stats.count("scale_handles.no_solution",int(invalid.sum()))
+			stats.count("scale_handles.several_solutions",
+			int((~symmetric & (count > 1)).sum()))
+		return result_a, result_b
 					
 	# Given a cubic bezier path (a,b), (c,d), (e,f), (g,h)
 	# this function returns the length of the chord from (a,b)
@@ -475,28 +2884,74 @@ class Curvatura:
 		da,db = Curvatura.direction_at_start(a,b,c,d,e,f,g,h)
 		dab = (da**2+db**2)**.5 # this can cause dab = 0 (rounding...)
 		if dab == 0: 
+			Curvatura.count("chord_angles.zero_direction")
 			dab = ((g-a)**2+(h-b)**2)**.5
 		da,db = da/dab,db/dab # norm length to 1
 		sinalpha = ((g-a)*db-(h-b)*da)/l
 		if sinalpha < -1:
+			Curvatura.count("chord_angles.clipped")
 			alpha = -.5*math.pi
 		elif sinalpha > 1:
+			Curvatura.count("chord_angles.clipped")
 			alpha = .5*math.pi
 		else:
 			alpha = math.asin(((g-a)*db-(h-b)*da)/l) # crossp for direction
 		dg,dh = Curvatura.direction_at_start(g,h,e,f,c,d,a,b)
 		dgh = (dg**2+dh**2)**.5 # this can cause dgh = 0 (rounding...)
 		if dgh == 0: 
+			Curvatura.count("chord_angles.zero_direction")
 			dgh = ((g-a)**2+(h-b)**2)**.5
 		dg,dh = dg/dgh,dh/dgh # norm length to 1
 		sinbeta = ((g-a)*dh-(h-b)*dg)/l
 		if sinbeta < -1:
+			Curvatura.count("chord_angles.clipped")
 			beta = -.5*math.pi
 		elif sinbeta > 1:
+			Curvatura.count("chord_angles.clipped")
 			beta = .5*math.pi
 		else:
 			beta = math.asin(((g-a)*dh-(h-b)*dg)/l) # crossp for direction
 		return l, alpha, beta, da, db, dg, dh
+		
+	# Same as chord_angles() but for many cubic bezier paths at once.
+	# segments is an array of shape (n,8) where every row holds
+	# a,b,c,d,e,f,g,h. Returns the arrays l,alpha,beta,da,db,dg,dh
+	# (with nan entries where the chord has length 0).
+	@staticmethod
+	def chord_angles_batch(segments):
+		if numpy is None:
+			nan = float('nan')
+			angles = [Curvatura.chord_angles(*s) if s[0] != s[6] or s[1] != s[7]
+			else (0.,nan,nan,nan,nan,nan,nan) for s in segments]
+			Curvatura.count("chord_angles.zero_chord",
+			sum(1 for r in angles if r[0] == 0))
+			return tuple([r[k] for r in angles] for k in range(7))
+		s = numpy.asarray(segments,dtype=float).reshape(-1,8)
+		a,b,c,d,e,f,g,h = s.T
+		with numpy.errstate(divide='ignore',invalid='ignore'):
+			l = numpy.sqrt((g-a)**2+(h-b)**2)
+			da,db = Curvatura.direction_at_start_batch(s)
+			dab = numpy.sqrt(da**2+db**2) # this can cause dab = 0 (rounding...)
+			zero = dab == 0
+			dab = numpy.where(dab == 0,l,dab)
+			da,db = da/dab,db/dab # norm length to 1
+			sin_alpha = ((g-a)*db-(h-b)*da)/l
+			alpha = numpy.arcsin(numpy.clip(sin_alpha,-1,1))
+			dg,dh = Curvatura.direction_at_start_batch(s[:,[6,7,4,5,2,3,0,1]])
+			dgh = numpy.sqrt(dg**2+dh**2)
+			zero |= dgh == 0
+			dgh = numpy.where(dgh == 0,l,dgh)
+			dg,dh = dg/dgh,dh/dgh
+			sin_beta = ((g-a)*dh-(h-b)*dg)/l
+			beta = numpy.arcsin(numpy.clip(sin_beta,-1,1))
+			stats = Curvatura.stats
+			if stats is not None:
+				stats.count("chord_angles.zero_chord",int((l == 0).sum()))
+				stats.count("chord_angles.zero_direction",
+				int((zero & (l > 0)).sum()))
+				stats.count("chord_angles.clipped",
+				int((numpy.abs(sin_alpha) > 1).sum()+(numpy.abs(sin_beta) > 1).sum()))
+		return l, alpha, beta, da, db, dg, dh
 	
 	# Given a cubic bezier path (a,b), (c,d), (e,f), (g,h)
 	# and the curvatures ka and kg 
@@ -510,56 +2965,107 @@ class Curvatura:
 			return c,d,e,f # no changes
 		else:
 			return a+t*da*l,b+t*db*l,g+s*dg*l,h+s*dh*l # scale back
+			
+	# Same as adjust_handles() but for many cubic bezier paths at once.
+	# segments is an array of shape (n,8) where every row holds 
+	# a,b,c,d,e,f,g,h and ka and kg are arrays of length n. Returns an
+	# array of shape (n,4) where every row holds the new handles c,d,e,f.
+	@staticmethod
+	def adjust_handles_batch(segments,ka,kg,cache=None):
+		if cache is not None:
+			return Curvatura.adjust_handles_cached(segments,ka,kg,cache)
+		if numpy is None:
+			return [Curvatura.adjust_handles(*(tuple(s)+(k1,k2)))
+			for s, k1, k2 in zip(segments,ka,kg)]
+		s = numpy.asarray(segments,dtype=float).reshape(-1,8)
+		a,b,c,d,e,f,g,h = s.T
+		l,alpha,beta,da,db,dg,dh = Curvatura.chord_angles_batch(s)
+		t,u = Curvatura.scale_handles_batch(alpha,beta,
+		numpy.asarray(ka,dtype=float)*l,numpy.asarray(kg,dtype=float)*l)
+		handles = numpy.stack((a+t*da*l,b+t*db*l,g+u*dg*l,h+u*dh*l),axis=1)
+		found = numpy.isfinite(handles).all(axis=1)
+		return numpy.where(found[:,None],handles,s[:,2:6]) # scale back
+		
+	# Same as adjust_handles_batch() but the results of scale_handles(),
+	# which only depend on the angles of chord_angles() and the 
+	# curvatures relative to the chord, are looked up in the 
+	# SegmentCache cache.
+	@staticmethod
+	def adjust_handles_cached(segments,ka,kg,cache):
+		l,alpha,beta,da,db,dg,dh = Curvatura.chord_angles_batch(segments)
+		keys = [cache.key("scale_handles",alpha[k],beta[k],ka[k]*l[k],
+		kg[k]*l[k]) for k in range(len(segments))]
+		lengths = cache.lookup(keys,lambda indices: list(zip(
+		*Curvatura.scale_handles_batch([alpha[i] for i in indices],
+		[beta[i] for i in indices],[ka[i]*l[i] for i in indices],
+		[kg[i]*l[i] for i in indices]))))
+		handles = []
+		for k in range(len(segments)):
+			a,b,c,d,e,f,g,h = segments[k]
+			t, s = lengths[k]
+			if t == t and s == s: # not nan
+				handles.append((a+t*da[k]*l[k],b+t*db[k]*l[k],
+				g+s*dg[k]*l[k],h+s*dh[k]*l[k]))
+			else:
+				handles.append((c,d,e,f)) # no changes
+		return handles
 		
 	# This harmonizes the selected paths by moving the handles in
 	# order to reach the average curvature at their nodes.
 	# The boolean is_glyph_variant is true iff the point selection
 	# in the UI does not matter.
 	@staticmethod
-	def harmonizehandles_contour(c,is_glyph_variant):
-		l = len(c)
+	def harmonizehandles_contour(c,is_glyph_variant,cache=None):
+		if c.is_quadratic:
+			return
+		x, y = c.x, c.y
+		neighbours = Curvatura.topology(c,is_glyph_variant).neighbours
 		# collecting the average curvatures at the moment:
 		curvatures = {}
 		for fivetimes in range(5): # iterate 5 times to average everything out
-			for i in range(l): # going through the points c[i]
-				if Curvatura.segments_selected_cubic(c,i,is_glyph_variant):
-					postcurvature = Curvatura.curvature_at_start(
-					c[i].x, c[i].y,	c[(i+1)%l].x, c[(i+1)%l].y, 
-					c[(i+2)%l].x, c[(i+2)%l].y, c[(i+3)%l].x, c[(i+3)%l].y)
-					precurvature = -Curvatura.curvature_at_start(
-					c[i].x, c[i].y, c[(i-1)%l].x, c[(i-1)%l].y,
-					c[(i-2)%l].x, c[(i-2)%l].y, c[(i-3)%l].x, c[(i-3)%l].y)
-					if postcurvature*precurvature < 0: # inflection node
-						postnew = 0
-						prenew = 0
-					else:
-						postnew = math.copysign(.5*(abs(postcurvature) \
-						+ abs(precurvature)),postcurvature)
-						prenew = math.copysign(.5*(abs(postcurvature) \
-						+ abs(precurvature)),precurvature)
-					curvatures[i] = [precurvature,postcurvature,prenew,postnew]
+			for h3, h2, h1, i, i1, i2, i3 in neighbours: # the nodes c[i]
+				postcurvature = Curvatura.curvature_at_start(
+				x[i], y[i], x[i1], y[i1], x[i2], y[i2], x[i3], y[i3])
+				precurvature = -Curvatura.curvature_at_start(
+				x[i], y[i], x[h1], y[h1], x[h2], y[h2], x[h3], y[h3])
+				if postcurvature*precurvature < 0: # inflection node
+					postnew = 0
+					prenew = 0
+				else:
+					postnew = math.copysign(.5*(abs(postcurvature) \
+					+ abs(precurvature)),postcurvature)
+					prenew = math.copysign(.5*(abs(postcurvature) \
+					+ abs(precurvature)),precurvature)
+				curvatures[i] = [precurvature,postcurvature,prenew,postnew]
 			# adjust the handles to fit the average curvatures:
 			# (curvatures at selection ends have not been calculated yet)
-			for i in curvatures:
+			# Every segment is adjusted at most once per pass and does 
+			# not depend on the others, so they are adjusted in one batch.
+			segments, kas, kgs, where = [], [], [], []
+			for h3, h2, h1, i, i1, i2, i3 in neighbours:
 				# looking on the previous segment
-				if (i-3)%l in curvatures:
-					ka = curvatures[(i-3)%l][3]
+				if h3 in curvatures:
+					ka = curvatures[h3][3]
 				else: 
 					ka = Curvatura.curvature_at_start(
-					c[(i-3)%l].x, c[(i-3)%l].y, c[(i-2)%l].x, c[(i-2)%l].y,
-					c[(i-1)%l].x, c[(i-1)%l].y, c[i].x, c[i].y)
-				c[(i-2)%l].x, c[(i-2)%l].y, c[(i-1)%l].x, c[(i-1)%l].y \
-				= Curvatura.adjust_handles(c[(i-3)%l].x, c[(i-3)%l].y, 
-				c[(i-2)%l].x, c[(i-2)%l].y,	c[(i-1)%l].x, c[(i-1)%l].y, 
-				c[i].x, c[i].y, ka, curvatures[i][2])
-				if not (i+3)%l in curvatures: # if we are at a selection end
+					x[h3], y[h3], x[h2], y[h2], x[h1], y[h1], x[i], y[i])
+				segments.append((x[h3], y[h3], x[h2], y[h2], x[h1], y[h1], 
+				x[i], y[i]))
+				kas.append(ka)
+				kgs.append(curvatures[i][2])
+				where.append((h2,h1))
+				if not i3 in curvatures: # if we are at a selection end
 					kg = -Curvatura.curvature_at_start(
-					c[(i+3)%l].x, c[(i+3)%l].y, c[(i+2)%l].x, c[(i+2)%l].y,
-					c[(i+1)%l].x, c[(i+1)%l].y, c[i].x, c[i].y)
-					c[(i+1)%l].x, c[(i+1)%l].y, c[(i+2)%l].x, c[(i+2)%l].y \
-					= Curvatura.adjust_handles(c[i].x, c[i].y,
-					c[(i+1)%l].x, c[(i+1)%l].y, c[(i+2)%l].x, c[(i+2)%l].y, 
-					c[(i+3)%l].x, c[(i+3)%l].y, curvatures[i][3], kg)
+					x[i3], y[i3], x[i2], y[i2], x[i1], y[i1], x[i], y[i])
+					segments.append((x[i], y[i], x[i1], y[i1], x[i2], y[i2], 
+					x[i3], y[i3]))
+					kas.append(curvatures[i][3])
+					kgs.append(kg)
+					where.append((i1,i2))
+			handles = Curvatura.adjust_handles_batch(segments,kas,kgs,cache)
+			for k in range(len(where)):
+				j1, j2 = where[k]
+				x[j1], y[j1], x[j2], y[j2] = handles[k]
 				
 	# For two adjoint cubic bezier curves (a,b) (c,d) (e,f) (g,h) 
 	# and (g,h) (i,j) (k,l) (m,n) this function returns o,p,q,r
@@ -571,94 +3077,1259 @@ class Curvatura:
 		kappa_mn = -Curvatura.curvature_at_start(m,n,k,l,i,j,g,h)
 		return Curvatura.adjust_handles(a,b,c,d,k,l,m,n,kappa_ab,kappa_mn)
 	
-	# this works only for one selected point
+	# Merges the first selected smooth node of a contour buffer c
+	# (this works only for one selected point) or, if merge_all is True,
+	# all the selected smooth nodes in one pass, where every merge sees
+	# the merges before it (the contour is rebuilt once then). Without a
+	# selection (is_glyph_variant), merge_all does nothing, the whole 
+	# outline is simplified by reduce_contour() within its tolerances. 
+	# The compatible contour buffers masters (e.g. of the other masters
+	# of the glyph) merge the same nodes, each with its own new handles.
 	@staticmethod
-	def softmerge_contour_old(c,is_glyph_variant):
+	def softmerge_contour(c,is_glyph_variant,merge_all=False,masters=()):
+		if c.is_quadratic:
+			return
+		if merge_all:
+			if is_glyph_variant:
+				return
+			nodes = Curvatura.topology(c,is_glyph_variant).nodes
+			links = [Curvatura.node_links(m) for m in (c,)+tuple(masters)]
+			merged = []
+			for i in nodes:
+				if Curvatura.softmerge_linked(c,links[0],i) is not None:
+					for k in range(len(masters)):
+						Curvatura.softmerge_linked(masters[k],links[k+1],i)
+					merged.append(i)
+			for m in (c,)+tuple(masters):
+				m.remove_nodes(merged)
+			Curvatura.count("softmerge.modified",len(merged))
+			return
+		for p in Curvatura.topology(c,is_glyph_variant).neighbours[:1]:
+			i = p[3] # the first selected node c[i]
+			for m in (c,)+tuple(masters):
+				x, y = m.x, m.y
+				cc,cd,ce,cf = Curvatura.softmerge(*[v for k in p 
+				for v in (x[k],y[k])])
+				start = m.merge(i)
+				l = len(m)
+				m.x[(start+1)%l], m.y[(start+1)%l] = cc, cd
+				m.x[(start+2)%l], m.y[(start+2)%l] = ce, cf
+			Curvatura.count("softmerge.modified")
+
+	# Returns the arrays prv and nxt holding the indices of the previous
+	# and the next on-curve point of every on-curve point of the contour
+	# buffer c (-1 at the ends of an open contour and for off-curve points).
+	@staticmethod
+	def node_links(c):
 		l = len(c)
-		for i in range(l): # going through the points c[i]
-			if Curvatura.segments_selected_cubic(c,i,is_glyph_variant):
-				cc,cd,ce,cf = Curvatura.softmerge(c[(i-3)%l].x,
-				c[(i-3)%l].y, c[(i-2)%l].x, c[(i-2)%l].y, c[(i-1)%l].x, 
-				c[(i-1)%l].y, c[i].x, c[i].y, c[(i+1)%l].x, c[(i+1)%l].y, 
-				c[(i+2)%l].x, c[(i+2)%l].y, c[(i+3)%l].x, c[(i+3)%l].y)
-				c.merge(i)
-				l = len(c)
-				c[(i-2)%l].x, c[(i-2)%l].y, c[(i-1)%l].x, c[(i-1)%l].y = cc,cd,ce,cf
-				break	
-				
+		nodes = [k for k in range(l) if c.flags[k] & ContourBuffer.ON_CURVE]
+		prv, nxt = array('l',[-1]*l), array('l',[-1]*l)
+		for k in range(len(nodes)-1):
+			nxt[nodes[k]] = nodes[k+1]
+			prv[nodes[k+1]] = nodes[k]
+		if c.closed and len(nodes) > 1:
+			nxt[nodes[-1]] = nodes[0]
+			prv[nodes[0]] = nodes[-1]
+		return prv, nxt
+
+	# Returns a,b,c,d,e,f,g,h of the cubic segment of the contour buffer
+	# c from node s to node e (the handles are the points next to them).
 	@staticmethod
-	def softmerge_contour(c,is_glyph_variant):
+	def linked_segment(c,s,e):
 		l = len(c)
-		for i in range(l): # going through the points c[i]
-			if Curvatura.segments_selected_cubic(c,i,is_glyph_variant):
-				cc,cd,ce,cf = Curvatura.softmerge(c[(i-3)%l].x,
-				c[(i-3)%l].y, c[(i-2)%l].x, c[(i-2)%l].y, c[(i-1)%l].x, 
-				c[(i-1)%l].y, c[i].x, c[i].y, c[(i+1)%l].x, c[(i+1)%l].y, 
-				c[(i+2)%l].x, c[(i+2)%l].y, c[(i+3)%l].x, c[(i+3)%l].y)
-				c.merge(i)
-				l = len(c)
-				c[(i-2)%l].x, c[(i-2)%l].y, c[(i-1)%l].x, c[(i-1)%l].y = cc,cd,ce,cf
-				break	
+		x, y = c.x, c.y
+		return x[s],y[s],x[(s+1)%l],y[(s+1)%l],x[(e-1)%l],y[(e-1)%l],x[e],y[e]
+
+	# Merges the node i of the contour buffer c softly with respect to the
+	# links of node_links(), which are updated (the points stay in the
+	# buffer, see remove_nodes()). The new handles are the ones of
+	# softmerge() unless they are given. Returns the new handles or None
+	# if i has not two different neighbours.
+	@staticmethod
+	def softmerge_linked(c,links,i,handles=None):
+		prv, nxt = links
+		s, e = prv[i], nxt[i]
+		if s < 0 or e < 0 or s == e:
+			return None
+		if handles is None:
+			handles = Curvatura.softmerge(*(Curvatura.linked_segment(c,s,i)
+			+Curvatura.linked_segment(c,i,e)[2:]))
+		l = len(c)
+		c.x[(s+1)%l], c.y[(s+1)%l], c.x[(e-1)%l], c.y[(e-1)%l] = handles
+		nxt[s], prv[e] = e, s
+		prv[i] = nxt[i] = -1
+		return handles
+
+	# Returns the point at time t of the cubic bezier path
+	# (a,b), (c,d), (e,f), (g,h).
+	@staticmethod
+	def bezier_point(a,b,c,d,e,f,g,h,t):
+		s = 1-t
+		return s**3*a+3*s*s*t*c+3*s*t*t*e+t**3*g, \
+		s**3*b+3*s*s*t*d+3*s*t*t*f+t**3*h
+
+	# Returns the distance of the point (px,py) from the polyline through
+	# the points with the coordinates xs and ys together with the index
+	# of the nearest edge. The edges are searched from the edge start on
+	# (and the one before) up to a local minimum (a few edges beyond it 
+	# are looked at), which suits points that walk along the polyline.
+	@staticmethod
+	def polyline_distance(px,py,xs,ys,start=0):
+		best, nearest = math.inf, start
+		k = max(0,start-1)
+		while k < len(xs)-1:
+			u, v = xs[k+1]-xs[k], ys[k+1]-ys[k]
+			norm = u*u+v*v
+			t = 0 if norm == 0 else ((px-xs[k])*u+(py-ys[k])*v)/norm
+			t = 1 if t > 1 else 0 if t < 0 else t
+			d = ((px-xs[k]-t*u)**2+(py-ys[k]-t*v)**2)**.5
+			if d < best:
+				best, nearest = d, k
+			elif k > nearest+2:
+				break
+			k += 1
+		return best, nearest
+
+	# Returns how far the segment from node s to node e of the contour
+	# buffer c with the handles (cc,cd), (ce,cf) deviates from the
+	# original outline (with the coordinates x0, y0 and the links of
+	# node_links() of the original contour) from s to e, which is
+	# sampled 8 times per segment. The deviation is inf if curvature
+	# is given and the curvature at s or e changes by more than curvature
+	# (relative to the chord from s to e). The computation stops as soon
+	# as the deviation exceeds limit.
+	@staticmethod
+	def merge_deviation(c,s,e,handles,x0,y0,links0,curvature=None,limit=math.inf):
+		l = len(c)
+		merged = (c.x[s],c.y[s])+tuple(handles)+(c.x[e],c.y[e])
+		original = lambda s, e: (x0[s],y0[s],x0[(s+1)%l],y0[(s+1)%l],
+		x0[(e-1)%l],y0[(e-1)%l],x0[e],y0[e])
+		if curvature is not None:
+			chord = ((merged[6]-merged[0])**2+(merged[7]-merged[1])**2)**.5
+			a,b,cc,cd,ce,cf,g,h = merged
+			first = original(s,links0[1][s])
+			last = original(links0[0][e],e)
+			if abs(Curvatura.curvature_at_start(*merged)
+			-Curvatura.curvature_at_start(*first))*chord > curvature \
+			or abs(Curvatura.curvature_at_start(g,h,ce,cf,cc,cd,a,b)
+			-Curvatura.curvature_at_start(*(last[6:]+last[4:6]+last[2:4]
+			+last[:2])))*chord > curvature:
+				return math.inf
+		xs, ys = [], []
+		for k in range(25): # the merged segment as a polyline
+			px, py = Curvatura.bezier_point(*(merged+(k/24,)))
+			xs.append(px)
+			ys.append(py)
+		deviation = 0
+		edge = 0 # the samples walk along the polyline
+		i = s
+		while i != e:
+			j = links0[1][i]
+			segment = original(i,j)
+			for k in range(1 if i == s else 0,8):
+				d, edge = Curvatura.polyline_distance(*(Curvatura.bezier_point(
+				*(segment+(k/8,)))+(xs,ys,edge)))
+				if d > deviation:
+					deviation = d
+					if deviation > limit:
+						return deviation
+			i = j
+		return deviation
+
+	# Reduces the nodes of a contour buffer c by softmerge() as long as
+	# the outline stays within distance font units of the original one
+	# and (if curvature is given) the curvatures at the remaining nodes
+	# do not change by more than curvature relative to the chords (see
+	# merge_deviation()). The candidates are the selected smooth nodes
+	# between cubic segments (all of them if is_glyph_variant). A priority
+	# queue always merges the node whose merge deviates least and
+	# re-evaluates its neighbours. The contour is rebuilt once at the end.
+	# The compatible contour buffers masters (e.g. of the other masters
+	# of the glyph) merge the same nodes, which have to keep the 
+	# tolerances in all of them. Returns the number of merged nodes.
+	@staticmethod
+	def reduce_contour(c,is_glyph_variant,distance=1.,curvature=None,
+	masters=()):
+		if c.is_quadratic:
+			return 0
+		l = len(c)
+		candidate = bytearray(l)
+		for i in Curvatura.topology(c,is_glyph_variant).nodes:
+			candidate[i] = 1
+		if not any(candidate):
+			return 0
+		contours = (c,)+tuple(masters)
+		original = [(array('d',m.x),array('d',m.y)) for m in contours]
+		links0 = Curvatura.node_links(c) # the same for all masters
+		links = [Curvatura.node_links(m) for m in contours]
+		version = [0]*l # entries of older versions in the queue are stale
+		queue = []
+		def push(i):
+			prv, nxt = links[0]
+			s, e = prv[i], nxt[i]
+			if s < 0 or e < 0 or s == e:
+				return
+			deviation = 0
+			handles = []
+			for m, (x0, y0) in zip(contours,original):
+				handles.append(Curvatura.softmerge(*(Curvatura.linked_segment(
+				m,s,i)+Curvatura.linked_segment(m,i,e)[2:])))
+				deviation = max(deviation,Curvatura.merge_deviation(m,s,e,
+				handles[-1],x0,y0,links0,curvature,distance))
+				if deviation > distance:
+					return
+			heapq.heappush(queue,(deviation,i,version[i],handles))
+		for i in range(l):
+			if candidate[i]:
+				push(i)
+		merged = []
+		while queue:
+			deviation, i, v, handles = heapq.heappop(queue)
+			if v != version[i] or not candidate[i]:
+				continue
+			s, e = links[0][0][i], links[0][1][i]
+			for k in range(len(contours)):
+				Curvatura.softmerge_linked(contours[k],links[k],i,handles[k])
+			candidate[i] = 0
+			merged.append(i)
+			for j in (s,e): # their segments have changed
+				if candidate[j]:
+					version[j] += 1
+					push(j)
+		for m in contours:
+			m.remove_nodes(merged)
+		Curvatura.count("reduce.modified",len(merged))
+		return len(merged)
+
+	# Applies the action to the contour buffer b.
+	# The string action is either "harmonize", "harmonizehandles", 
+	# "tunnify", "inflection", "softmerge", "softmergeall" (all selected 
+	# nodes) or "reduce" (see reduce_contour()).
+	@staticmethod
+	def modify_buffer(action,b,is_glyph_variant,cache=None,masters=()):
+		if action in {"softmerge","softmergeall","reduce"}:
+			if b.is_quadratic:
+				return
+			if action == "reduce":
+				Curvatura.reduce_contour(b,is_glyph_variant,
+				masters=masters,**Curvatura.reduce_options)
+			else:
+				Curvatura.softmerge_contour(b,is_glyph_variant,
+				action == "softmergeall",masters)
+			return
+		for b in (b,)+tuple(masters): # they share the topology of b
+			if action == "harmonize":
+				Curvatura.harmonize_contour(b,is_glyph_variant)
+			elif action == "harmonizehandles":
+				Curvatura.harmonizehandles_contour(b,is_glyph_variant,cache)
+			elif action == "tunnify" and not b.is_quadratic:
+				Curvatura.tunnify_contour(b,is_glyph_variant)
+			elif action == "inflection" and not b.is_quadratic:
+				Curvatura.inflection_contour(b,is_glyph_variant)
+			
+	# Applies the action to all the contour buffers (tunnify and 
+	# inflection run in one batch over all of them). Segment results
+	# are shared through the SegmentCache cache if it is given. The 
+	# list masters (if given) groups the indices of compatible buffers
+	# (see master_groups()), every buffer belongs to one group. The 
+	# buffers of a group are changed at the places selected in the first
+	# one (they share its Topology), such that nodes are inserted or 
+	# merged in all of them alike.
+	@staticmethod
+	def modify_buffers(action,buffers,is_glyph_variant,cache=None,
+	masters=None):
+		stats = Curvatura.stats
+		if stats is not None:
+			stats.count(action+".visited",
+			Curvatura.count_visited(action,buffers,is_glyph_variant))
+			before = [(len(b),array('d',b.x),array('d',b.y)) for b in buffers]
+		if masters is not None:
+			Curvatura.share_topology([[buffers[k] for k in g] 
+			for g in masters],is_glyph_variant)
+		if action == "tunnify":
+			Curvatura.tunnify_buffers(buffers,is_glyph_variant,cache)
+		elif action == "inflection":
+			Curvatura.inflection_buffers(buffers,is_glyph_variant,cache,
+			masters)
+		elif masters is not None:
+			for g in masters:
+				Curvatura.modify_buffer(action,buffers[g[0]],is_glyph_variant,
+				cache,tuple(buffers[k] for k in g[1:]))
+		else:
+			for b in buffers:
+				Curvatura.modify_buffer(action,b,is_glyph_variant,cache)
+		if stats is not None and action not in {"inflection","softmerge",
+		"softmergeall","reduce"}:
+			stats.count(action+".modified",sum(Curvatura.changed_segments(
+			buffers[k],*before[k]) for k in range(len(buffers))))
+			
+	# Returns the number of places the action visits in the contour 
+	# buffers (for the statistics): the selected segments for tunnify 
+	# and inflection and the selected nodes otherwise.
+	@staticmethod
+	def count_visited(action,buffers,is_glyph_variant):
+		if action in {"tunnify","inflection"}:
+			return len(Curvatura.selected_segments(buffers,is_glyph_variant)[0])
+		n = 0
+		for c in buffers:
+			nodes = Curvatura.topology(c,is_glyph_variant).nodes
+			if action == "softmerge": # merges one node only
+				n += min(1,len(nodes))
+			else:
+				n += len(nodes)
+		return n
+		
+	# Returns the number of segments of the contour buffer b in which
+	# points have been moved with respect to the coordinates x and y
+	# (0 if the buffer does not have the length l anymore).
+	@staticmethod
+	def changed_segments(b,l,x,y):
+		if len(b) != l:
+			return 0
+		moved = [b.x[k] != x[k] or b.y[k] != y[k] for k in range(l)]
+		nodes = [k for k in range(l) if b.flags[k] & ContourBuffer.ON_CURVE]
+		ends = nodes[1:]+([nodes[0]+l] if b.closed and nodes else [])
+		return sum(1 for i, j in zip(nodes,ends) 
+		if any(moved[k%l] for k in range(i,j+1)))
+			
+	# Writes the contour buffers back to the contours of the fontforge
+	# layer and returns the layer. If points have been inserted or merged
+	# in any of the contours, a new layer is built.
+	@staticmethod
+	def write_back_layer(layer,buffers):
+		restructured = False
+		for b in buffers:
+			restructured = restructured or b.restructured
+		contours = [buffers[i].write_back(layer[i]) for i in range(len(buffers))]
+		if not restructured:
+			return layer
+		new = Curvatura.load_fontforge().layer()
+		new.is_quadratic = layer.is_quadratic
+		for c in contours:
+			new += c
+		return new
+		
+	# Applies the actions (a list of the strings accepted by 
+	# modify_buffers()) one after another to the contour buffers, which
+	# keep the geometry in memory between the stages. The time of each
+	# action is added to the statistics under the given key. The
+	# groups of compatible buffers masters are passed to modify_buffers().
+	@staticmethod
+	def modify_pipeline(actions,buffers,is_glyph_variant,cache=None,key=None,
+	masters=None):
+		for action in actions:
+			start = time.perf_counter()
+			Curvatura.modify_buffers(action,buffers,is_glyph_variant,cache,
+			masters)
+			if Curvatura.stats is not None:
+				Curvatura.stats.add_time(action,time.perf_counter()-start,key)
 	
 	# This is the high level method for using the methods described before.
-	# The string action is either "harmonize", "harmonizehandles", 
-	# "tunnify", "inflection" or "softmerge".
+	# The action is either "harmonize", "harmonizehandles", "tunnify", 
+	# "inflection", "softmerge", "softmergeall" or "reduce" or a list of 
+	# these, which are applied
+	# in this order with a single undo snapshot and a single write back.
+	# The layers of layer_options are changed (each with an undo
+	# snapshot), the selection of the active layer counts.
 	@staticmethod
 	def modify_contours(action,glyph):
-		glyph.preserveLayerAsUndo()
-		layer = glyph.layers[glyph.activeLayer]
+		actions = [action] if isinstance(action,str) else action
+		keys, layers, buffers = Curvatura.read_layers(glyph)
+		journal = None
+		if Curvatura.undo_options["mode"] == "layer":
+			for k in keys:
+				glyph.preserveLayerAsUndo(k)
+		elif Curvatura.undo_options["mode"] == "journal":
+			journal = Curvatura.journal = Journal(glyph.font)
 		# first, we check, if anything is selected at all
 		# because nothing selected means that the whole glyph
 		# should be harmonized (at least the author thinks so)
 		is_glyph_variant = True # temporary
-		for i in range(len(layer)): # going through the contours layer[i]
-			for j in range(len(layer[i])):
-				if layer[i][j].selected:
-					is_glyph_variant = False
-					break
-		for i in range(len(layer)): # going through the contours layer[i]
-			if action == "harmonize":
-				Curvatura.harmonize_contour(layer[i],is_glyph_variant)
-			elif action == "harmonizehandles":
-				Curvatura.harmonizehandles_contour(layer[i],is_glyph_variant)
-			elif action == "tunnify" and not layer[i].is_quadratic:
-				Curvatura.tunnify_contour(layer[i],is_glyph_variant)
-			elif action == "inflection" and not layer[i].is_quadratic:
-				Curvatura.inflection_contour(layer[i],is_glyph_variant)	
-			elif action == "softmerge" and not layer[i].is_quadratic:
-				Curvatura.softmerge_contour(layer[i],is_glyph_variant)	
-		glyph.layers[glyph.activeLayer] = layer
+		for b in buffers[0]:
+			if b.any_selected():
+				is_glyph_variant = False
+				break
+		Curvatura.modify_pipeline(actions,[b for bs in buffers for b in bs],
+		is_glyph_variant,None,glyph.glyphname,Curvatura.master_groups(buffers))
+		Curvatura.write_layers(glyph,keys,layers,buffers,journal)
+		
+	# Returns the keys of the layers of the glyph that are changed (see
+	# layer_options), the active layer first. "all" skips the background
+	# layers (0 and the ones added as background).
+	@staticmethod
+	def glyph_layers(glyph):
+		keys = [glyph.activeLayer]
+		layers = Curvatura.layer_options["layers"]
+		if layers == "all":
+			layers = [k for k in range(glyph.layer_cnt) 
+			if not glyph.font.layers[k].background]
+		for k in layers or []:
+			if k not in keys:
+				keys.append(k)
+		return keys
+		
+	# Returns the keys of the layers of the glyph that are changed, the
+	# fontforge layers and the lists of their contour buffers.
+	@staticmethod
+	def read_layers(glyph):
+		keys = Curvatura.glyph_layers(glyph)
+		layers = [glyph.layers[k] for k in keys]
+		return keys, layers, [[ContourBuffer.from_contour(c) for c in layer]
+		for layer in layers]
+		
+	# Writes the lists of contour buffers back to the layers (see 
+	# read_layers()) of the glyph. The changes are recorded in the 
+	# Journal journal if it is given.
+	@staticmethod
+	def write_layers(glyph,keys,layers,buffers,journal=None):
+		for k in range(len(keys)):
+			if journal is not None:
+				journal.record(glyph,keys[k],layers[k],buffers[k])
+			glyph.layers[keys[k]] = Curvatura.write_back_layer(layers[k],
+			buffers[k])
+			
+	# Returns True iff the contour buffers b and c have the same 
+	# structure: the same number of points, the same kind of segments 
+	# and the same on-curve and smooth points.
+	@staticmethod
+	def compatible(b,c):
+		mask = ContourBuffer.ON_CURVE | ContourBuffer.SMOOTH
+		return len(b) == len(c) and b.closed == c.closed \
+		and b.is_quadratic == c.is_quadratic \
+		and all(f & mask == g & mask for f, g in zip(b.flags,c.flags))
+			
+	# Returns the groups of compatible contour buffers of the lists of
+	# contour buffers of the layers of a glyph (the first one is the 
+	# reference) as lists of indices into the concatenation of these
+	# lists, which is the argument masters of modify_pipeline(). A layer
+	# is a master iff all its contours are compatible with the ones of
+	# the reference. Returns None if no layer is a master (or if 
+	# compatible of layer_options is False).
+	@staticmethod
+	def master_groups(buffers):
+		if not Curvatura.layer_options["compatible"] or len(buffers) < 2:
+			return None
+		reference = buffers[0]
+		offsets = [0]
+		for bs in buffers:
+			offsets.append(offsets[-1]+len(bs))
+		masters = [k for k in range(1,len(buffers)) 
+		if len(buffers[k]) == len(reference) and len(reference) > 0
+		and all(Curvatura.compatible(b,c) 
+		for b, c in zip(reference,buffers[k]))]
+		if not masters:
+			return None
+		groups = [[i]+[offsets[k]+i for k in masters] 
+		for i in range(len(reference))]
+		for k in range(1,len(buffers)):
+			if k not in masters:
+				groups += [[offsets[k]+i] for i in range(len(buffers[k]))]
+		return groups
 		
 	# This is the high level method for using the methods described before.
-	# The string action is either "harmonize", "harmonizehandles", 
-	# "tunnify" or "inflection".
+	# The action is either "harmonize", "harmonizehandles", "tunnify", 
+	# "inflection" or "reduce" or a list of these (see modify_contours()),
+	# which are applied to the selected glyphs as a Job.
 	@staticmethod
 	def modify_glyphs(action,font):
-		for glyph in font.selection.byGlyphs:
-			glyph.preserveLayerAsUndo()
-			layer = glyph.layers[glyph.activeLayer]
-			for i in range(len(layer)):
-				if action == "harmonize":
-					Curvatura.harmonize_contour(layer[i],True)
-				elif action == "harmonizehandles":
-					Curvatura.harmonizehandles_contour(layer[i],True)
-				elif action == "tunnify" and not layer[i].is_quadratic:
-					Curvatura.tunnify_contour(layer[i],True)
-				elif action == "inflection" and not layer[i].is_quadratic:
-					Curvatura.inflection_contour(layer[i],True)
-			glyph.layers[glyph.activeLayer] = layer
+		job = Job(action,font.selection.byGlyphs)
+		Curvatura.segment_cache = job.cache
+		if job.undo == "journal":
+			job.journal.font = font
+			Curvatura.journal = job.journal
+		job.run()
+		
+	# Reverts the last run in the undo mode "journal" (see Journal) if
+	# it has changed the font (any font if font is None). Returns the 
+	# number of the restored contours.
+	@staticmethod
+	def revert_last(junk=None,font=None):
+		if not Curvatura.can_revert(junk,font):
+			return 0
+		journal, Curvatura.journal = Curvatura.journal, None
+		return journal.revert()
+		
+	# Returns True iff there is a run on the font to revert (for the 
+	# tools menu).
+	@staticmethod
+	def can_revert(junk,font):
+		journal = Curvatura.journal
+		return journal is not None and (font is None or journal.font == font)
 			
 	# Returns false iff no glyph is selected 
 	# (needed for enabling in tools menu).
 	@staticmethod
 	def are_glyphs_selected(junk,font):
-		font = fontforge.activeFont()
+		font = Curvatura.load_fontforge().activeFont()
 		for glyph in font.selection.byGlyphs:
 			return True
 		return False
+		
+	# Returns the smoothness metrics of the glyphs (a list of lists of 
+	# contour buffers) without changing anything. All the segments and
+	# smooth nodes are evaluated in one batch. For every glyph, the
+	# dictionary holds the largest curvature jump at a smooth node (the
+	# quadratic segments are elevated to cubic ones, at inflection nodes
+	# only the absolute values count like in harmonize), the number of
+	# missing inflection points (see inflections()), the tunni imbalance
+	# (the longest move of a handle by tunnify()) and the numbers of the
+	# smooth nodes and the cubic segments.
+	@staticmethod
+	def audit_buffers(glyphs):
+		segments, owners = [], [] # the cubic segments
+		pairs, pair_owners = [], [] # the smooth nodes (two segments each)
+		for g in range(len(glyphs)):
+			cubic = [b for b in glyphs[g] if not b.is_quadratic]
+			s = Curvatura.selected_segments(cubic,True)[0]
+			segments += s
+			owners += [g]*len(s)
+			for b in glyphs[g]:
+				x, y = b.x, b.y
+				for p in Curvatura.topology(b,True).neighbours:
+					q = [v for k in p for v in (x[k],y[k])]
+					if not b.is_quadratic:
+						pairs.append(tuple(q))
+					else:
+						pairs.append(tuple(q[0:2]+[q[0]+2/3*(q[2]-q[0]),
+						q[1]+2/3*(q[3]-q[1]),q[4]+2/3*(q[2]-q[4]),
+						q[5]+2/3*(q[3]-q[5])]+q[4:6]+[q[4]+2/3*(q[6]-q[4]),
+						q[5]+2/3*(q[7]-q[5]),q[8]+2/3*(q[6]-q[8]),
+						q[9]+2/3*(q[7]-q[9])]+q[8:10]))
+					pair_owners.append(g)
+		result = [{"curvature_jump": 0., "inflections": 0, "tunni": 0.,
+		"smooth_nodes": 0, "segments": 0} for g in glyphs]
+		# the curvatures after and before the smooth nodes:
+		post = Curvatura.curvature_at_start_batch([p[6:] for p in pairs])
+		pre = Curvatura.curvature_at_start_batch([p[6:8]+p[4:6]+p[2:4]+p[0:2]
+		for p in pairs])
+		for k in range(len(pairs)):
+			r = result[pair_owners[k]]
+			r["smooth_nodes"] += 1
+			r["curvature_jump"] = max(r["curvature_jump"],
+			abs(abs(post[k])-abs(pre[k])))
+		times = Curvatura.inflections_batch(segments)
+		handles = Curvatura.tunnify_batch(segments)
+		for k in range(len(segments)):
+			r = result[owners[k]]
+			r["segments"] += 1
+			r["inflections"] += sum(1 for t in times[k] if t == t)
+			a,b,c,d,e,f,g,h = segments[k]
+			nc,nd,ne,nf = handles[k]
+			r["tunni"] = max(r["tunni"],((nc-c)**2+(nd-d)**2)**.5,
+			((ne-e)**2+(nf-f)**2)**.5)
+		for r in result: # plain numbers (e.g. for JSON)
+			r["curvature_jump"] = float(r["curvature_jump"])
+			r["tunni"] = float(r["tunni"])
+		return result
+		
+	# Returns the ranked audit report of the glyphs with the given names
+	# and lists of contour buffers (see audit_buffers()). The score of a
+	# glyph is the sum of its metrics relative to the thresholds of 
+	# audit_options, so a glyph with a score of at least 1 needs work.
+	# The glyphs with the highest scores come first. The glyphs are 
+	# spread over jobs worker processes (jobs = 1 works in this process).
+	@staticmethod
+	def audit_glyphs(names,glyphs,jobs=1):
+		if jobs > 1 and len(glyphs) > 1:
+			import multiprocessing
+			chunks = Curvatura.chunk_glyphs([sum(len(b) for b in g) 
+			for g in glyphs],4*jobs)
+			with multiprocessing.Pool(jobs) as pool:
+				results = pool.map(Curvatura.audit_buffers,
+				[[glyphs[k] for k in chunk] for chunk in chunks])
+			metrics = [None]*len(glyphs)
+			for chunk, result in zip(chunks,results):
+				for k, r in zip(chunk,result):
+					metrics[k] = r
+		else:
+			metrics = Curvatura.audit_buffers(glyphs)
+		report = []
+		options = Curvatura.audit_options
+		for name, r in zip(names,metrics):
+			r["score"] = sum(r[key]/options[key] for key in options)
+			r["glyph"] = name
+			report.append(r)
+		report.sort(key=lambda r: -r["score"])
+		return report
+		
+	# Audits the glyphs (the active layers) of the font and selects the
+	# glyphs that need work (a score of at least 1, see audit_glyphs()),
+	# such that the actions can be run on them only.
+	@staticmethod
+	def select_audited(junk,font):
+		names, glyphs = [], []
+		for name in font:
+			glyph = font[name]
+			names.append(name)
+			glyphs.append([ContourBuffer.from_contour(c) 
+			for c in glyph.layers[glyph.activeLayer]])
+		font.selection.none()
+		for r in Curvatura.audit_glyphs(names,glyphs):
+			if r["score"] >= 1:
+				font.selection.select(("more",None),r["glyph"])
+				
+	# Distributes the glyphs with the point counts counts on at most n
+	# chunks of roughly the same total point count. The largest glyphs
+	# are placed first, each into the chunk with the smallest total so 
+	# far. Returns the lists of glyph indices, largest chunks first.
+	@staticmethod
+	def chunk_glyphs(counts,n):
+		heap = [(0,k) for k in range(max(1,min(n,len(counts))))]
+		chunks = [[] for k in range(len(heap))]
+		for i in sorted(range(len(counts)),key=lambda i: -counts[i]):
+			total, k = heapq.heappop(heap)
+			chunks[k].append(i)
+			heapq.heappush(heap,(total+counts[i],k))
+		totals = {k: total for total, k in heap}
+		order = sorted(range(len(chunks)),key=lambda k: -totals[k])
+		return [chunks[k] for k in order if chunks[k]]
+		
+	# Applies the actions (in the given order) to a chunk of glyphs,
+	# which is a list of triples (glyph index, list of contour buffers,
+	# groups of compatible buffers or None, see master_groups()).
+	# Segment results are shared between the chunks of a process by a 
+	# SegmentCache of cache_size entries (0 for no cache).
+	# This runs in the worker processes of batch_fonts(). Returns the
+	# chunk, the numbers of cache hits and misses and the statistics
+	# (as_dict() of Stats) if with_stats is True (the glyphs are timed 
+	# one by one then and are named by their indices).
+	@staticmethod
+	def process_chunk(task):
+		actions, chunk, cache_size, with_stats = task
+		cache = None
+		if cache_size > 0:
+			if Curvatura.segment_cache is None \
+			or Curvatura.segment_cache.size != cache_size:
+				Curvatura.segment_cache = SegmentCache(cache_size)
+			cache = Curvatura.segment_cache
+			hits, misses = cache.hits, cache.misses
+		stats = None
+		if with_stats:
+			previous, Curvatura.stats = Curvatura.stats, Stats()
+			try:
+				for k, buffers, masters in chunk:
+					Curvatura.modify_pipeline(actions,buffers,True,cache,k,
+					masters)
+				stats = Curvatura.stats.as_dict()
+			finally:
+				Curvatura.stats = previous
+		else:
+			buffers = []
+			masters = []
+			for k, glyph_buffers, groups in chunk:
+				groups = groups or [[i] for i in range(len(glyph_buffers))]
+				masters += [[len(buffers)+i for i in g] for g in groups]
+				buffers += glyph_buffers
+			Curvatura.modify_pipeline(actions,buffers,True,cache,None,
+			masters if len(masters) < len(buffers) else None)
+		if cache is None:
+			return chunk, (0, 0), stats
+		return chunk, (cache.hits-hits, cache.misses-misses), stats
+		
+	# Applies the actions to all glyphs of the fonts in the files inputs
+	# and saves the results to the files outputs. The glyphs are spread
+	# over jobs worker processes (jobs = 1 works in this process), each
+	# with a SegmentCache of cache_size entries. Glyphs whose results are
+	# in the ResultCache result_cache (if given) are restored instead of
+	# being processed. The statistics of the processing are added to the
+	# Stats object stats (if given). After every chunk progress(done,
+	# total) is called (if given) like in Job, where total counts the 
+	# glyphs of the fonts opened so far. If it returns False, the run is
+	# cancelled: the font at hand is saved with the glyphs done so far
+	# if keep is True and not at all otherwise, the later fonts are not
+	# opened. Returns the cache statistics of the whole run (cancelled
+	# tells whether it has been cancelled).
+	@staticmethod
+	def batch_fonts(inputs,outputs,actions,jobs=1,cache_size=100000,
+	result_cache=None,stats=None,progress=None,keep=False):
+		hits = misses = 0
+		done = total = 0
+		cancelled = False
+		pool = None
+		if jobs > 1:
+			import multiprocessing
+			try: # the workers need to inherit the fontforge runtime
+				pool = multiprocessing.get_context("fork").Pool(jobs)
+			except ValueError: # no fork on this platform
+				pool = None
+		try:
+			for i in range(len(inputs)):
+				font = Curvatura.load_fontforge().open(inputs[i])
+				glyphs = []
+				for glyph_name in font:
+					glyph = font[glyph_name]
+					total += 1
+					done += 1 # until it turns out to need processing
+					keys, layers, layer_buffers = Curvatura.read_layers(glyph)
+					buffers = [b for bs in layer_buffers for b in bs]
+					if len(buffers) > 0:
+						masters = Curvatura.master_groups(layer_buffers)
+						key = None
+						if result_cache is not None:
+							key = ResultCache.key(actions,buffers,masters)
+							if result_cache.restore(key,buffers):
+								Curvatura.write_layers(glyph,keys,layers,
+								layer_buffers)
+								continue
+						glyphs.append((glyph,(keys,layers,layer_buffers),
+						buffers,key,masters))
+						done -= 1
+				counts = [sum(len(b) for b in g[2]) for g in glyphs]
+				chunks = Curvatura.chunk_glyphs(counts,
+				4*jobs if pool else 1) # more chunks than workers for balance
+				tasks = [(actions,[(k,glyphs[k][2],glyphs[k][4]) for k in chunk],
+				cache_size,stats is not None) for chunk in chunks]
+				if pool:
+					results = pool.imap_unordered(Curvatura.process_chunk,tasks)
+				else:
+					results = map(Curvatura.process_chunk,tasks)
+				for chunk, cache_counts, chunk_stats in results: # merge back
+					hits += cache_counts[0]
+					misses += cache_counts[1]
+					if chunk_stats is not None: # name the glyphs
+						glyph_seconds = chunk_stats["glyph_seconds"]
+						chunk_stats["glyph_seconds"] = dict((glyphs[k][0].glyphname
+						if len(inputs) == 1 else inputs[i]+":"+glyphs[k][0].glyphname,
+						glyph_seconds[k]) for k in glyph_seconds)
+						stats.merge(chunk_stats)
+					for k, buffers, masters in chunk:
+						glyph, key = glyphs[k][0], glyphs[k][3]
+						keys, layers, layer_buffers = glyphs[k][1]
+						if key is not None:
+							result_cache.store(key,buffers)
+						start = 0 # the buffers may be copies from a worker
+						for bs in layer_buffers:
+							bs[:] = buffers[start:start+len(bs)]
+							start += len(bs)
+						Curvatura.write_layers(glyph,keys,layers,layer_buffers)
+					done += len(chunk)
+					if progress is not None and progress(done,total) is False:
+						cancelled = True
+						break
+				if not cancelled or keep:
+					if outputs[i][-4:] == ".sfd":
+						font.save(outputs[i])
+					else:
+						font.generate(outputs[i])
+				font.close()
+				if result_cache is not None:
+					result_cache.commit()
+				if cancelled:
+					break
+		finally:
+			if pool:
+				if cancelled: # the chunks in flight are dropped
+					pool.terminate()
+				else:
+					pool.close()
+				pool.join()
+		stats = {"hits": hits, "misses": misses, 
+		"hit_rate": hits/(hits+misses) if hits+misses > 0 else 0.,
+		"cancelled": cancelled}
+		if result_cache is not None:
+			stats["results"] = result_cache.stats()
+		return stats
+				
+	# Applies the actions to the .glif files paths (a chunk of a UFO 
+	# layer) and writes the changed files back. This runs in the worker
+	# processes of batch_ufo(). Returns the number of changed files 
+	# followed by the results of process_outlines().
+	@staticmethod
+	def process_glifs(task):
+		import os
+		actions, paths, cache_size, with_stats, result_cache = task
+		glifs = []
+		for path in paths:
+			with open(path,"rb") as f:
+				glifs.append(Glif(f.read()))
+		results = Curvatura.process_outlines(actions,glifs,cache_size,
+		with_stats,result_cache)
+		changed = 0
+		for k in range(len(glifs)):
+			if glifs[k].changed():
+				with open(paths[k]+".tmp","wb") as f:
+					f.write(glifs[k].to_text())
+				os.replace(paths[k]+".tmp",paths[k])
+				changed += 1
+		return (changed,)+results
+		
+	# Applies the actions to the outlines (Glif or SFDGlyph objects) like
+	# process_chunk() but looks the results up in the cache file 
+	# result_cache (if given, it is only read here) first. Returns the
+	# numbers of segment cache hits and misses, the statistics (if 
+	# with_stats is True), the new results as a list of pairs (key, data
+	# of ResultCache.pack()) and the keys of the results that have been
+	# used.
+	@staticmethod
+	def process_outlines(actions,outlines,cache_size,with_stats,result_cache):
+		keys = [None]*len(outlines)
+		cache = None
+		if result_cache is not None:
+			cache = ResultCache(result_cache,read_only=True)
+		chunk = []
+		for k in range(len(outlines)):
+			if len(outlines[k].buffers) == 0:
+				continue
+			if cache is not None:
+				keys[k] = ResultCache.key(actions,outlines[k].buffers)
+				if cache.restore(keys[k],outlines[k].buffers):
+					continue
+			chunk.append((k,outlines[k].buffers,None))
+		if cache is not None:
+			cache.close()
+		chunk, cache_counts, stats = Curvatura.process_chunk((actions,chunk,
+		cache_size,with_stats))
+		if stats is not None: # name the glyphs
+			stats["glyph_seconds"] = dict((outlines[k].name,times) 
+			for k, times in stats["glyph_seconds"].items())
+		results = [(keys[k],ResultCache.pack(buffers)) for k, buffers, masters
+		in chunk if keys[k] is not None]
+		return cache_counts, stats, results, [] if cache is None else cache.used
+		
+	# Applies the actions to all glyphs of the default layer of the UFO
+	# source directory ufo without FontForge. If output is another
+	# directory, the source is copied there first. An existing output
+	# (other than an empty directory) is only replaced if force is True
+	# and never if it contains the source. Only the changed .glif files
+	# are written. The arguments jobs, cache_size, result_cache and 
+	# stats are the same as for batch_fonts(). Returns the cache 
+	# statistics and the number of changed glyphs.
+	@staticmethod
+	def batch_ufo(ufo,output,actions,jobs=1,cache_size=100000,
+	result_cache=None,stats=None,force=False):
+		import os, shutil
+		source, target = os.path.realpath(ufo), os.path.realpath(output)
+		if target != source:
+			if os.path.commonpath([source,target]) == target:
+				raise ValueError(output+" contains the source "+ufo)
+			if os.path.isdir(output) and not os.listdir(output):
+				os.rmdir(output)
+			elif os.path.exists(output):
+				if not force:
+					raise ValueError(output+" exists already")
+				if os.path.isdir(output):
+					shutil.rmtree(output)
+				else:
+					os.remove(output)
+			shutil.copytree(ufo,output)
+		layer = os.path.join(output,"glyphs")
+		paths = [os.path.join(layer,name) for name in sorted(os.listdir(layer))
+		if name.endswith(".glif")]
+		counts = [os.path.getsize(path) for path in paths]
+		chunks = Curvatura.chunk_glyphs(counts,4*jobs if jobs > 1 else 1)
+		tasks = [(actions,[paths[k] for k in chunk],cache_size,
+		stats is not None,None if result_cache is None else result_cache.path)
+		for chunk in chunks]
+		if jobs > 1:
+			import multiprocessing
+			pool = multiprocessing.Pool(jobs)
+			results = pool.imap_unordered(Curvatura.process_glifs,tasks)
+		else:
+			pool = None
+			results = map(Curvatura.process_glifs,tasks)
+		counts = {"hits": 0, "misses": 0, "changed": 0}
+		try:
+			for result in results:
+				counts["changed"] += result[0]
+				Curvatura.merge_outlines(result[1:],counts,result_cache,stats)
+		finally:
+			if pool:
+				pool.close()
+				pool.join()
+		if result_cache is not None:
+			result_cache.commit()
+			counts["results"] = result_cache.stats()
+		total = counts["hits"]+counts["misses"]
+		counts["hit_rate"] = counts["hits"]/total if total > 0 else 0.
+		return counts
+		
+	# Merges the results of process_outlines() into the dictionary counts
+	# of the segment cache hits and misses, the ResultCache result_cache
+	# and the Stats stats (if given).
+	@staticmethod
+	def merge_outlines(results,counts,result_cache,stats):
+		cache_counts, chunk_stats, new, used = results
+		counts["hits"] += cache_counts[0]
+		counts["misses"] += cache_counts[1]
+		if chunk_stats is not None:
+			stats.merge(chunk_stats)
+		if result_cache is not None:
+			result_cache.hits += len(used)
+			result_cache.misses += len(new)
+			result_cache.touch(used)
+			for key, data in new:
+				result_cache.store_data(key,data)
+				
+	# Applies the actions to the glyphs (lists of lines) of an .sfd file
+	# with quadratic (if is_quadratic) or cubic outlines. This runs in the
+	# worker processes of stream_sfd(). Returns the new lists of lines
+	# followed by the results of process_outlines().
+	@staticmethod
+	def process_sfd_glyphs(task):
+		actions, glyphs, is_quadratic, cache_size, with_stats, result_cache \
+		= task
+		glyphs = [SFDGlyph(lines,is_quadratic) for lines in glyphs]
+		results = Curvatura.process_outlines(actions,glyphs,cache_size,
+		with_stats,result_cache)
+		return ([g.lines() for g in glyphs],)+results
+		
+	# Applies the actions to all glyphs of the .sfd file sfd and writes
+	# the result to the file output (which may be sfd) without FontForge.
+	# The file is read line by line and the glyphs are processed in 
+	# windows of window glyphs (spread over jobs worker processes), such
+	# that the memory is bounded by the window instead of the font. 
+	# Everything but the contours of the Fore layer is copied verbatim.
+	# The arguments jobs, cache_size, result_cache and stats are the same
+	# as for batch_fonts(). Returns the cache statistics.
+	@staticmethod
+	def stream_sfd(sfd,output,actions,jobs=1,cache_size=100000,
+	result_cache=None,stats=None,window=None):
+		import os
+		window = window or 256*jobs
+		pool = None
+		if jobs > 1:
+			import multiprocessing
+			pool = multiprocessing.Pool(jobs)
+		counts = {"hits": 0, "misses": 0}
+		is_quadratic = False
+		pending = [] # the lines and glyphs that are not written yet
+		def flush():
+			indices = [k for k in range(len(pending)) 
+			if isinstance(pending[k],list)]
+			chunks = Curvatura.chunk_glyphs([len(pending[k]) for k in indices],
+			4*jobs if pool else 1)
+			tasks = [(actions,[pending[indices[i]] for i in chunk],is_quadratic,
+			cache_size,stats is not None,
+			None if result_cache is None else result_cache.path) 
+			for chunk in chunks]
+			results = (pool.map if pool else map)(Curvatura.process_sfd_glyphs,
+			tasks)
+			for chunk, result in zip(chunks,results):
+				for i, lines in zip(chunk,result[0]):
+					pending[indices[i]] = lines
+				Curvatura.merge_outlines(result[1:],counts,result_cache,stats)
+			for item in pending:
+				if isinstance(item,list):
+					target.writelines(item)
+				else:
+					target.write(item)
+			del pending[:]
+		try:
+			with open(sfd,encoding="utf-8",errors="surrogateescape",
+			newline="") as source, open(output+".tmp","w",encoding="utf-8",
+			errors="surrogateescape",newline="") as target:
+				glyph = None
+				glyphs = 0 # in pending
+				for line in source:
+					if glyph is not None:
+						glyph.append(line)
+						if line.startswith("EndChar"):
+							pending.append(glyph)
+							glyph = None
+							glyphs += 1
+							if glyphs >= window:
+								flush()
+								glyphs = 0
+					elif line.startswith("StartChar:"):
+						glyph = [line]
+					else:
+						is_quadratic = SFDGlyph.header_quadratic(line,is_quadratic)
+						pending.append(line)
+				if glyph is not None: # incomplete glyph at the end
+					pending.extend(glyph)
+				flush()
+			os.replace(output+".tmp",output)
+		finally:
+			if pool:
+				pool.close()
+				pool.join()
+		if result_cache is not None:
+			result_cache.commit()
+			counts["results"] = result_cache.stats()
+		total = counts["hits"]+counts["misses"]
+		counts["hit_rate"] = counts["hits"]/total if total > 0 else 0.
+		return counts
+				
+	# Returns the list of the names and the list of the lists of contour
+	# buffers of all glyphs (the active layers) of the UFO directory or
+	# font file path. UFO sources and (if stream is True or FontForge is
+	# not available) .sfd files are read without FontForge.
+	@staticmethod
+	def read_glyphs(path,stream=False):
+		import os
+		outlines = []
+		if os.path.isdir(path):
+			layer = os.path.join(path,"glyphs")
+			for name in sorted(os.listdir(layer)):
+				if name.endswith(".glif"):
+					with open(os.path.join(layer,name),"rb") as f:
+						outlines.append(Glif(f.read()))
+		elif path.lower().endswith(".sfd") and (stream 
+		or Curvatura.load_fontforge() is None):
+			is_quadratic = False
+			glyph = None
+			with open(path,encoding="utf-8",errors="surrogateescape",
+			newline="") as source:
+				for line in source:
+					if glyph is not None:
+						glyph.append(line)
+						if line.startswith("EndChar"):
+							outlines.append(SFDGlyph(glyph,is_quadratic))
+							glyph = None
+					elif line.startswith("StartChar:"):
+						glyph = [line]
+					else:
+						is_quadratic = SFDGlyph.header_quadratic(line,is_quadratic)
+		else:
+			font = Curvatura.load_fontforge().open(path)
+			names, glyphs = [], []
+			for name in font:
+				glyph = font[name]
+				names.append(name)
+				glyphs.append([ContourBuffer.from_contour(c) 
+				for c in glyph.layers[glyph.activeLayer]])
+			font.close()
+			return names, glyphs
+		return [o.name for o in outlines], [o.buffers for o in outlines]
+		
+	# Returns the audit report (see audit_glyphs()) of all glyphs of the
+	# fonts in the files (or UFO directories) inputs as one ranking. The
+	# glyph names are prefixed by the file names if there are several.
+	# The glyphs are audited by jobs worker processes.
+	@staticmethod
+	def audit_files(inputs,stream=False,jobs=1):
+		names, glyphs = [], []
+		for path in inputs:
+			n, g = Curvatura.read_glyphs(path,stream)
+			names += n if len(inputs) == 1 else [path+":"+name for name in n]
+			glyphs += g
+		return Curvatura.audit_glyphs(names,glyphs,jobs)
+				
+	# The command line interface for running the actions without UI, e.g.
+	# fontforge -script Curvatura.py -a inflection -a harmonize -j 8 
+	# -d out/ A.sfd B.sfd
+	# or for UFO sources (in place here) even without FontForge:
+	# python Curvatura.py -a tunnify -o A.ufo A.ufo
+	# or for a ranked report of the glyphs that need work:
+	# python Curvatura.py --audit -o report.json A.ufo
+	@staticmethod
+	def main(argv):
+		import argparse, os, sys
+		parser = argparse.ArgumentParser(prog="Curvatura.py",
+		description="Applies Curvatura actions to all glyphs of fonts.")
+		parser.add_argument("fonts",nargs="*",help="the input font files "
+		+"or UFO directories (or, without -o and -d, an input font file "
+		+"and the name of a new output file)")
+		parser.add_argument("-a","--action",action="append",
+		choices=["harmonize","harmonizehandles","tunnify","inflection",
+		"reduce"],
+		help="an action to apply, may be repeated (default: harmonize)")
+		parser.add_argument("-o","--output",
+		help="the output file name (for a single input font)")
+		parser.add_argument("-d","--output-dir",
+		help="the directory for the output fonts (same file names)")
+		parser.add_argument("-j","--jobs",type=int,default=os.cpu_count() or 1,
+		help="the number of worker processes (default: all cores)")
+		parser.add_argument("--segment-cache",type=int,default=100000,
+		metavar="SIZE",help="the number of segment results every worker "
+		+"keeps for identical segments (default: 100000, 0 disables it)")
+		parser.add_argument("--harmonize-tolerance",type=float,metavar="TOL",
+		help="harmonize until no node moves more than TOL font units "
+		+"(instead of a fixed number of sweeps)")
+		parser.add_argument("--harmonize-method",default="gauss-seidel",
+		choices=["gauss-seidel","jacobi"],
+		help="the iteration for --harmonize-tolerance (default: gauss-seidel)")
+		parser.add_argument("--relaxation",type=float,default=1.,
+		help="the relaxation factor for --harmonize-tolerance, between 0 "
+		+"and 2, at most 1 for jacobi (default: 1)")
+		parser.add_argument("--reduce-distance",type=float,default=1.,
+		metavar="DIST",help="reduce keeps the outline within DIST font units "
+		+"of the original one (default: 1)")
+		parser.add_argument("--reduce-curvature",type=float,metavar="TOL",
+		help="reduce keeps the changes of the curvatures at the nodes "
+		+"(relative to the merged segments) below TOL")
+		parser.add_argument("--fast-tunnify",action="store_true",
+		help="tunnify without trigonometric functions (see tunnify_fast(), "
+		+"e.g. for previews and large batches)")
+		parser.add_argument("--layers",metavar="LAYERS",
+		help="the layers of FontForge fonts that are changed besides the "
+		+"active one: all (the foreground layers) or a comma separated "
+		+"list of layer names or indices")
+		parser.add_argument("--compatible",action="store_true",
+		help="process the layers that are compatible with the active one "
+		+"as its masters, such that they stay compatible")
+		parser.add_argument("--result-cache",metavar="FILE",
+		help="a cache file for the results of whole glyphs, such that "
+		+"unchanged glyphs are not processed again in later runs")
+		parser.add_argument("--result-cache-size",type=int,default=200000,
+		metavar="SIZE",help="the number of glyphs the cache file keeps "
+		+"(default: 200000)")
+		parser.add_argument("--stream",action="store_true",
+		help="read and write .sfd files line by line without FontForge "
+		+"(which is the default if FontForge is not available)")
+		parser.add_argument("--audit",action="store_true",
+		help="do not change the fonts (all files are inputs) but write a "
+		+"ranked JSON report of the glyphs that need work (to -o or the "
+		+"standard output)")
+		parser.add_argument("--progress",action="store_true",
+		help="report the number of processed glyphs of FontForge fonts "
+		+"on the standard error")
+		parser.add_argument("--serve",action="store_true",
+		help="run as a service that answers JSON lines of outlines on the "
+		+"standard input (see Service) instead of changing fonts")
+		parser.add_argument("--socket",metavar="PATH",
+		help="run the service on the Unix socket PATH instead")
+		parser.add_argument("--force",action="store_true",
+		help="replace existing output UFO directories")
+		parser.add_argument("--cache-stats",action="store_true",
+		help="print the hit rates of the caches")
+		parser.add_argument("--stats",metavar="FILE",
+		help="write statistics (counters of the computations and the "
+		+"times per action and glyph) as JSON to FILE")
+		args = parser.parse_args(argv)
+		try:
+			Curvatura.check_harmonize_options(args.harmonize_method,
+			args.relaxation)
+		except ValueError as e:
+			parser.error(str(e))
+		Curvatura.tunnify_options["fast"] = args.fast_tunnify
+		if args.serve or args.socket:
+			service = Service(args.segment_cache)
+			if args.socket:
+				service.serve_socket(args.socket)
+			else:
+				service.serve(sys.stdin,sys.stdout)
+			return
+		if not args.fonts:
+			parser.error("the fonts are needed (unless --serve or --socket)")
+		inputs = [os.path.normpath(f) for f in args.fonts]
+		if args.audit: # nothing is changed
+			if Curvatura.load_fontforge() is None:
+				for f in inputs:
+					if not os.path.isdir(f) and not f.lower().endswith(".sfd"):
+						parser.error("FontForge is needed for "+f)
+			import json
+			report = {"thresholds": Curvatura.audit_options,
+			"glyphs": Curvatura.audit_files(inputs,args.stream,
+			max(1,args.jobs))}
+			report["needing_work"] = sum(1 for r in report["glyphs"] 
+			if r["score"] >= 1)
+			if args.output:
+				with open(args.output,"w") as f:
+					json.dump(report,f,indent=1)
+			else:
+				print(json.dumps(report,indent=1))
+			return
+		if args.output_dir:
+			outputs = [os.path.join(args.output_dir,os.path.basename(f))
+			for f in inputs]
+			if len(set(outputs)) < len(outputs):
+				parser.error("the inputs need different names for -d")
+		elif args.output:
+			if len(inputs) > 1:
+				parser.error("-o needs exactly one input font, use -d instead")
+			outputs = [args.output]
+		elif len(inputs) == 2: # the classic call: input and new output file
+			if os.path.isdir(inputs[0]) or os.path.isdir(inputs[1]):
+				parser.error("UFO sources need -o or -d")
+			if os.path.exists(inputs[1]):
+				parser.error(inputs[1]+" exists already (use -o to replace "
+				+"it or -d for several inputs)")
+			inputs, outputs = inputs[:1], inputs[1:]
+		else:
+			parser.error("an output file (-o) or directory (-d) is needed")
+		for k in range(len(inputs)):
+			if any(os.path.realpath(outputs[k]) == os.path.realpath(f)
+			for f in inputs[:k]+inputs[k+1:]):
+				parser.error(outputs[k]+" is also an input")
+		if args.harmonize_tolerance is not None:
+			Curvatura.harmonize_options.update(
+			tolerance=args.harmonize_tolerance,method=args.harmonize_method,
+			relaxation=args.relaxation)
+		Curvatura.reduce_options.update(distance=args.reduce_distance,
+		curvature=args.reduce_curvature)
+		if args.layers:
+			Curvatura.layer_options["layers"] = "all" \
+			if args.layers == "all" else [int(k) if k.isdigit() else k 
+			for k in args.layers.split(",")]
+		Curvatura.layer_options["compatible"] = args.compatible
+		result_cache = None
+		if args.result_cache:
+			result_cache = ResultCache(args.result_cache,
+			args.result_cache_size)
+		# UFO sources (directories) and streamed .sfd files do not need 
+		# FontForge:
+		ufos = [k for k in range(len(inputs)) if os.path.isdir(inputs[k])]
+		sfds = [k for k in range(len(inputs)) if k not in ufos 
+		and (args.stream or Curvatura.load_fontforge() is None) 
+		and inputs[k].lower().endswith(".sfd") 
+		and outputs[k].lower().endswith(".sfd")]
+		fonts = [k for k in range(len(inputs)) if k not in ufos+sfds]
+		for k in ufos: # see batch_ufo()
+			source, target = map(os.path.realpath,(inputs[k],outputs[k]))
+			if target == source:
+				continue
+			if os.path.commonpath([source,target]) == target:
+				parser.error(outputs[k]+" contains the input "+inputs[k])
+			if os.path.exists(target) and not args.force and not (
+			os.path.isdir(target) and not os.listdir(target)):
+				parser.error(outputs[k]+" exists already (use --force to "
+				+"replace it)")
+		if fonts and Curvatura.load_fontforge() is None:
+			parser.error("FontForge is needed for "+inputs[fonts[0]])
+		if args.output_dir:
+			os.makedirs(args.output_dir,exist_ok=True)
+		actions = args.action or ["harmonize"]
+		jobs = max(1,args.jobs)
+		run_stats = Stats() if args.stats else None
+		start = time.perf_counter()
+		stats = {"hits": 0, "misses": 0}
+		try:
+			if fonts:
+				def progress(done,total):
+					sys.stderr.write("\r%d/%d glyphs" % (done,total))
+					if done == total:
+						sys.stderr.write("\n")
+				stats = Curvatura.batch_fonts([inputs[k] for k in fonts],
+				[outputs[k] for k in fonts],actions,jobs,args.segment_cache,
+				result_cache,run_stats,progress if args.progress else None)
+			for k in ufos+sfds:
+				if k in ufos:
+					source_stats = Curvatura.batch_ufo(inputs[k],outputs[k],
+					actions,jobs,args.segment_cache,result_cache,run_stats,
+					args.force)
+				else:
+					source_stats = Curvatura.stream_sfd(inputs[k],outputs[k],
+					actions,jobs,args.segment_cache,result_cache,run_stats)
+				stats["hits"] += source_stats["hits"]
+				stats["misses"] += source_stats["misses"]
+		finally:
+			if result_cache is not None:
+				result_cache.close()
+		total = stats["hits"]+stats["misses"]
+		stats["hit_rate"] = stats["hits"]/total if total > 0 else 0.
+		if result_cache is not None:
+			stats["results"] = result_cache.stats()
+		if run_stats is not None:
+			import json
+			report = run_stats.as_dict()
+			report["total_seconds"] = time.perf_counter()-start
+			report["segment_cache"] = {"hits": stats["hits"],
+			"misses": stats["misses"]}
+			if "results" in stats:
+				report["result_cache"] = stats["results"]
+			with open(args.stats,"w") as f:
+				json.dump(report,f,indent=1)
+		if args.cache_stats:
+			print("segment cache: %d hits, %d misses, hit rate %.1f%%" 
+			% (stats["hits"],stats["misses"],100*stats["hit_rate"]))
+			if result_cache is not None:
+				results = stats["results"]
+				print("result cache: %d hits, %d misses, hit rate %.1f%%" 
+				% (results["hits"],results["misses"],100*results["hit_rate"]))
 
 if __name__ == '__main__':
-	if fontforge.hasUserInterface():
+	if Curvatura.load_fontforge() is not None and fontforge.hasUserInterface():
 		# Register the tools in the tools menu of FontForge:
 		fontforge.registerMenuItem(Curvatura.modify_glyphs,
 		Curvatura.are_glyphs_selected,"harmonize","Font",
@@ -672,6 +4343,17 @@ if __name__ == '__main__':
 		fontforge.registerMenuItem(Curvatura.modify_glyphs,
 		Curvatura.are_glyphs_selected,"inflection","Font",
 		None,"Curvatura","Add points of inflection");
+		fontforge.registerMenuItem(Curvatura.modify_glyphs,
+		Curvatura.are_glyphs_selected,"reduce","Font",
+		None,"Curvatura","Reduce nodes softly");
+		fontforge.registerMenuItem(Curvatura.select_audited,None,None,"Font",
+		None,"Curvatura","Select glyphs that need work");
+		fontforge.registerMenuItem(Curvatura.revert_last,
+		Curvatura.can_revert,None,"Font",None,"Curvatura",
+		"Revert last Curvatura run");
+		fontforge.registerMenuItem(Curvatura.modify_glyphs,
+		Curvatura.are_glyphs_selected,Curvatura.cleanup_actions,"Font",
+		None,"Curvatura","Clean up (inflections, harmonize, tunnify)");
 		fontforge.registerMenuItem(Curvatura.modify_contours,None,
 		"harmonize","Glyph",None,"Curvatura","Harmonize");
 		fontforge.registerMenuItem(Curvatura.modify_contours,None,
@@ -682,22 +4364,15 @@ if __name__ == '__main__':
 		"inflection","Glyph",None,"Curvatura","Add points of inflection");
 		fontforge.registerMenuItem(Curvatura.modify_contours,None,
 		"softmerge","Glyph",None,"Curvatura","Merge two adjacent curves softly");
+		fontforge.registerMenuItem(Curvatura.modify_contours,None,
+		"softmergeall","Glyph",None,"Curvatura",
+		"Merge at all selected nodes softly");
+		fontforge.registerMenuItem(Curvatura.modify_contours,None,
+		"reduce","Glyph",None,"Curvatura","Reduce nodes softly");
+		fontforge.registerMenuItem(Curvatura.modify_contours,None,
+		Curvatura.cleanup_actions,"Glyph",None,"Curvatura",
+		"Clean up (inflections, harmonize, tunnify)");
 	else:
 		import sys
-		if len(sys.argv) < 3:
-			print("Exactly 2 arguments are needed: input file name"\
-			+" and output file name.")
-		else:
-			if len(sys.argv) > 3:
-				print("Exactly 2 arguments are needed: input file name"\
-				+" and output file name. I will ignore additional arguments.")
-			font = fontforge.open(sys.argv[1])
-			for glyph_name in font:
-				layer = font[glyph_name].layers[font[glyph_name].activeLayer]
-				for j in range(len(layer)):
-					Curvatura.harmonize_contour(layer[j],True,False)
-			if sys.argv[2][-4:] == ".sfd":
-				font.save(sys.argv[2])
-			else:
-				font.generate(sys.argv[2])
+		Curvatura.main(sys.argv[1:])
 		
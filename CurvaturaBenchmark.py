@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+
+# Benchmarks for the Curvatura plug-in that run without FontForge.
+# If the fontforge module cannot be imported, a minimal pure Python
+# stand-in (see below) is used instead. Synthetic glyphs are generated
+# and every action is timed per glyph and per node, e.g.
+# python CurvaturaBenchmark.py --nodes 10,100,1000 -o bench.json
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import sys,math,random,time,json,types,importlib.util
+
+# The stand-in for the fontforge module, which provides the parts
+# of the python interface of FontForge that Curvatura uses.
+class point:
+	def __init__(self,x=0.,y=0.,on_curve=True,type=0,selected=False):
+		self.x = x
+		self.y = y
+		self.on_curve = on_curve
+		self.type = type # 1 and 2 are smooth points for Curvatura
+		self.selected = selected
+
+	def dup(self):
+		return point(self.x,self.y,self.on_curve,self.type,self.selected)
+
+	def __repr__(self):
+		return "point(%r,%r,%r,%r,%r)" % (self.x,self.y,self.on_curve,
+		self.type,self.selected)
+
+# Returns the numbers of the coordinates (given as numbers or as pairs).
+def flat(values):
+	return [v for value in values for v in (value if isinstance(value,tuple)
+	else (value,))]
+
+class contour:
+	def __init__(self,is_quadratic=False):
+		self.points = []
+		self.closed = False
+		self.is_quadratic = is_quadratic
+
+	def __len__(self):
+		return len(self.points)
+
+	def __iter__(self):
+		return iter(self.points)
+
+	def __getitem__(self,i):
+		if isinstance(i,slice):
+			c = contour(self.is_quadratic)
+			c.points = self.points[i]
+			return c
+		return self.points[i]
+
+	def __setitem__(self,i,p):
+		self.points[i] = p
+
+	def __iadd__(self,other):
+		if isinstance(other,contour):
+			self.points.extend(other.points)
+		else:
+			self.points.append(other)
+		return self
+
+	def moveTo(self,*xy):
+		self.points.append(point(*flat(xy),on_curve=True,type=1))
+		return self
+
+	def cubicTo(self,*xys):
+		cx, cy, dx, dy, x, y = flat(xys)
+		self.points += [point(cx,cy,False,0),point(dx,dy,False,0),
+		point(x,y,True,1)]
+		return self
+
+	def dup(self):
+		c = contour(self.is_quadratic)
+		c.points = [p.dup() for p in self.points]
+		c.closed = self.closed
+		return c
+
+	# Removes the on-curve point i together with the control points
+	# next to it (the neighbouring segments become one).
+	def merge(self,i):
+		l = len(self.points)
+		n = 1 if self.is_quadratic else 2 # control points per segment
+		remove = {i%l}
+		for k in range(1,n):
+			remove.update(((i-k)%l,(i+k)%l))
+		self.points = [self.points[k] for k in range(l) if k not in remove]
+
+	def reverseDirection(self):
+		self.points.reverse()
+		if self.closed: # the first point stays the first point
+			self.points.insert(0,self.points.pop())
+
+class layer:
+	def __init__(self):
+		self.contours = []
+		self.is_quadratic = False
+
+	def __len__(self):
+		return len(self.contours)
+
+	def __iter__(self):
+		return iter(self.contours)
+
+	def __getitem__(self,i):
+		return self.contours[i]
+
+	def __iadd__(self,other):
+		if isinstance(other,layer):
+			self.contours.extend(other.contours)
+		else:
+			self.contours.append(other)
+		return self
+
+	def dup(self):
+		l = layer()
+		l.contours = [c.dup() for c in self.contours]
+		l.is_quadratic = self.is_quadratic
+		return l
+
+class layerinfo:
+	def __init__(self,name,background=False):
+		self.name = name
+		self.background = background
+
+class glyph:
+	def __init__(self,name,l):
+		self.glyphname = name
+		self.layers = {1: l}
+		self.activeLayer = 1
+		self.layer_cnt = 2
+		self.undos = 0
+		font([self]) # sets self.font
+
+	def preserveLayerAsUndo(self,*args):
+		self.undos += 1
+
+class selection:
+	def __init__(self,glyphs):
+		self.byGlyphs = glyphs
+
+class font:
+	def __init__(self,glyphs):
+		self.glyphs = dict((g.glyphname,g) for g in glyphs)
+		self.selection = selection(glyphs)
+		self.layers = [layerinfo("Back",True),layerinfo("Fore")]
+		for g in glyphs:
+			g.font = self
+
+	def __iter__(self):
+		return iter(self.glyphs)
+
+	def __getitem__(self,name):
+		return self.glyphs[name]
+
+def hasUserInterface():
+	return False
+
+# Returns the stand-in as a module, which can be put into sys.modules.
+def stand_in():
+	module = types.ModuleType("fontforge")
+	for name in ("point","contour","layer","glyph","selection","font",
+	"hasUserInterface"):
+		setattr(module,name,globals()[name])
+	module.is_stand_in = True
+	return module
+
+# Imports Curvatura with the real fontforge module if possible and the
+# stand-in otherwise (or if use_stand_in is True).
+def import_curvatura(use_stand_in=False):
+	if use_stand_in or importlib.util.find_spec("fontforge") is None:
+		sys.modules["fontforge"] = stand_in()
+	import Curvatura
+	return Curvatura
+
+# Returns a closed (or open) contour with n nodes around a circle of
+# radius r, which the fontforge module ff provides. All nodes are
+# smooth. A fraction inflections of the nodes gets a tilted tangent,
+# which makes the adjacent segments s-shaped. The selection is one
+# of "none", "all", "alternate" (every other node with its control
+# points) or a number p (every node is selected with probability p).
+def make_contour(ff,n,quadratic=False,inflections=0.,selected="none",
+seed=0,closed=True,r=500.):
+	rand = random.Random(seed)
+	c = ff.contour()
+	c.is_quadratic = quadratic
+	step = 2*math.pi/n
+	nodes = []
+	for k in range(n):
+		angle = k*step
+		radius = r*(1+.05*step**2*rand.uniform(-1,1)) # no inflections
+		x, y = radius*math.cos(angle), radius*math.sin(angle)
+		tangent = angle+.5*math.pi+.1*step*rand.uniform(-1,1)
+		if rand.random() < inflections:
+			tangent += rand.choice((-1,1))*1.5*step
+		if selected == "all":
+			s = True
+		elif selected == "none":
+			s = False
+		elif selected == "alternate":
+			s = k%2 == 0
+		else:
+			s = rand.random() < float(selected)
+		nodes.append((x,y,math.cos(tangent),math.sin(tangent),s))
+	count = n if closed else n-1
+	for k in range(count):
+		x, y, dx, dy, s = nodes[k]
+		x2, y2, dx2, dy2, s2 = nodes[(k+1)%n]
+		chord = ((x2-x)**2+(y2-y)**2)**.5
+		c += ff.point(x,y,True,1,s)
+		if quadratic: # the control point on both tangents
+			det = dx2*dy-dy2*dx
+			t = ((x2-x)*(-dy2)+(y2-y)*dx2)/det if abs(det) > 1e-9 else .5*chord
+			t = min(max(t,.1*chord),.9*chord)
+			c += ff.point(x+t*dx,y+t*dy,False,0,s or s2)
+		else:
+			a = chord*rand.uniform(.25,.45)
+			b = chord*rand.uniform(.25,.45)
+			c += ff.point(x+a*dx,y+a*dy,False,0,s)
+			c += ff.point(x2-b*dx2,y2-b*dy2,False,0,s2)
+	if not closed:
+		x, y, dx, dy, s = nodes[n-1]
+		c += ff.point(x,y,True,1,s)
+	c.closed = closed
+	if quadratic: # the nodes have to lie on the lines between the controls
+		l = len(c)
+		for k in range(0,l,2):
+			if closed or 0 < k < l-1:
+				p, q = c[(k-1)%l], c[(k+1)%l]
+				t = rand.uniform(.4,.6)
+				c[k].x, c[k].y = (1-t)*p.x+t*q.x, (1-t)*p.y+t*q.y
+	return c
+
+# Returns a glyph of the fontforge module ff with the given number
+# of contours, each with n nodes (see make_contour() for the rest).
+def make_glyph(ff,name,contours,n,quadratic=False,inflections=0.,
+selected="none",seed=0,closed=True):
+	l = ff.layer()
+	l.is_quadratic = quadratic
+	for k in range(contours):
+		l += make_contour(ff,n,quadratic,inflections,selected,
+		seed*1000+k,closed,r=500.*(k+1))
+	return glyph(name,l)
+
+# Times the action on a fresh glyph (made by make()) repeat times
+# and returns the best and the median time in seconds.
+def time_action(curvatura,action,make,repeat):
+	times = []
+	for k in range(repeat):
+		g = make()
+		start = time.perf_counter()
+		curvatura.Curvatura.modify_contours(action,g)
+		times.append(time.perf_counter()-start)
+	times.sort()
+	return times[0], times[len(times)//2]
+
+# Runs all benchmarks and returns the results as a dictionary.
+def run(actions,sizes,contours=1,repeat=5,inflections=.2,selected="none",
+seed=0,use_stand_in=False):
+	curvatura = import_curvatura(use_stand_in)
+	ff = sys.modules["fontforge"]
+	results = []
+	for quadratic in (False,True):
+		for n in sizes:
+			for action in actions:
+				if quadratic and action != "harmonize":
+					continue # the other actions only work for cubic curves
+				make = lambda: make_glyph(ff,"bench",contours,n,quadratic,
+				inflections,selected,seed)
+				nodes = contours*n
+				best, median = time_action(curvatura,action,make,repeat)
+				results.append({"action": action,
+				"quadratic": quadratic, "contours": contours, "nodes": nodes,
+				"best_s": best, "median_s": median,
+				"best_per_node_us": 1e6*best/nodes,
+				"median_per_node_us": 1e6*median/nodes})
+	return {"python": sys.version.split()[0],
+	"numpy": curvatura.numpy is not None,
+	"stand_in": getattr(ff,"is_stand_in",False),
+	"curvatura": getattr(curvatura.Curvatura,"version",None),
+	"repeat": repeat, "inflections": inflections, "selected": selected,
+	"seed": seed, "results": results}
+
+def main(argv):
+	import argparse
+	parser = argparse.ArgumentParser(prog="CurvaturaBenchmark.py",
+	description="Times the Curvatura actions on synthetic glyphs.")
+	parser.add_argument("-a","--action",action="append",
+	choices=["harmonize","harmonizehandles","tunnify","inflection",
+	"softmerge","softmergeall","reduce"],
+	help="an action to time, may be repeated (default: all)")
+	parser.add_argument("--nodes",default="10,100,1000",
+	help="the comma separated numbers of nodes per contour "
+	+"(default: 10,100,1000)")
+	parser.add_argument("--contours",type=int,default=1,
+	help="the number of contours per glyph (default: 1)")
+	parser.add_argument("--repeat",type=int,default=5,
+	help="the number of runs per benchmark (default: 5)")
+	parser.add_argument("--inflections",type=float,default=.2,
+	help="the fraction of nodes with tilted tangents (default: 0.2)")
+	parser.add_argument("--selected",default="none",
+	help="none, all, alternate or a probability (default: none, "
+	+"which means the whole glyph)")
+	parser.add_argument("--seed",type=int,default=0)
+	parser.add_argument("--stand-in",action="store_true",
+	help="use the fontforge stand-in even if fontforge is installed")
+	parser.add_argument("--format",choices=["json","text"],default="json")
+	parser.add_argument("-o","--output",help="the output file "
+	+"(default: standard output)")
+	args = parser.parse_args(argv)
+	report = run(args.action or ["harmonize","harmonizehandles","tunnify",
+	"inflection","softmerge","softmergeall","reduce"],
+	[int(n) for n in args.nodes.split(",")],
+	args.contours,args.repeat,args.inflections,args.selected,args.seed,
+	args.stand_in)
+	if args.format == "json":
+		text = json.dumps(report,indent=1)
+	else:
+		text = "\n".join("%-16s %-9s %7d nodes %10.3f ms %8.2f us/node"
+		% (r["action"],"quadratic" if r["quadratic"] else "cubic",
+		r["nodes"],1e3*r["best_s"],r["best_per_node_us"])
+		for r in report["results"])
+	if args.output:
+		with open(args.output,"w") as f:
+			f.write(text+"\n")
+	else:
+		print(text)
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
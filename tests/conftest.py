@@ -0,0 +1,56 @@
+import os, random, sys
+
+import pytest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# A closed outline with four smooth curve nodes and unbalanced handles
+# (the points as x, y, on curve), which every action changes.
+BLOB = [(0,0,1),(60,-10,0),(140,20,0),(200,100,1),(230,160,0),(180,240,0),
+(100,250,1),(30,255,0),(-20,200,0),(-40,120,1),(-55,60,0),(-30,5,0)]
+
+# Cubic segments (a,b,c,d,e,f,g,h) whose discriminant in tunnify() is 
+# exactly 0 (the rounding made the implementations disagree).
+DOUBLE_ROOTS = [[500,500,-200,-200,-100,300,500,100],
+[-400,500,200,-100,100,200,-400,200],[0,-500,-300,100,-300,-200,-300,-400]]
+
+# Returns n random cubic segments with coordinates in [-500,500] on the
+# grid of the step (floats if step is None).
+def random_segments(n,step=None,seed=0):
+	rng = random.Random(seed)
+	if step is None:
+		return [[rng.uniform(-500,500) for k in range(8)] for r in range(n)]
+	return [[step*rng.randint(-500//step,500//step) for k in range(8)]
+	for r in range(n)]
+
+# Returns the text of a .glif file with the given contours (lists of
+# points like BLOB, where on = 1 is a smooth curve point and on = 2 a 
+# corner curve point).
+def glif_text(name,contours):
+	lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+	'<glyph name="%s" format="2">' % name,'  <outline>']
+	for contour in contours:
+		lines.append('    <contour>')
+		for x, y, on in contour:
+			lines.append('      <point x="%r" y="%r"%s/>' % (x,y,
+			' type="curve"'+(' smooth="yes"' if on == 1 else '') if on 
+			else ''))
+		lines.append('    </contour>')
+	lines += ['  </outline>','</glyph>','']
+	return "\n".join(lines)
+
+# Writes a UFO source with the glyphs (a dictionary of the names and 
+# their contours) to path and returns path.
+def write_ufo(path,glyphs):
+	os.makedirs(os.path.join(path,"glyphs"))
+	with open(os.path.join(path,"metainfo.plist"),"w") as f:
+		f.write("<plist/>")
+	for name, contours in glyphs.items():
+		with open(os.path.join(path,"glyphs",name+".glif"),"w") as f:
+			f.write(glif_text(name,contours))
+	return path
+
+@pytest.fixture
+def ufo(tmp_path):
+	return lambda name, glyphs={"a": [BLOB]}: write_ufo(
+	str(tmp_path/name),glyphs)
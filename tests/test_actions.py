@@ -0,0 +1,29 @@
+from array import array
+
+from Curvatura import Curvatura, ContourBuffer
+from conftest import BLOB
+
+ON, SELECTED, SMOOTH = ContourBuffer.ON_CURVE, ContourBuffer.SELECTED, \
+ContourBuffer.SMOOTH
+
+# Returns a closed cubic contour buffer of the points (like BLOB), where
+# the on-curve points with the indices in selected are selected.
+def buffer(points=BLOB,selected=()):
+	return ContourBuffer(array('d',[p[0] for p in points]),
+	array('d',[p[1] for p in points]),bytearray((ON|SMOOTH if p[2] else 0)
+	| (SELECTED if k in selected else 0) for k, p in enumerate(points)),
+	True)
+
+def nodes(b):
+	return sum(1 for f in b.flags if f & ON)
+
+def test_softmergeall_without_selection_does_nothing():
+	b = buffer()
+	Curvatura.modify_pipeline(["softmergeall"],[b],True)
+	assert nodes(b) == 4
+	assert list(b.x) == [p[0] for p in BLOB]
+
+def test_softmergeall_merges_the_selected_nodes():
+	b = buffer(selected={3,9})
+	Curvatura.modify_pipeline(["softmergeall"],[b],False)
+	assert nodes(b) == 2
@@ -0,0 +1,68 @@
+import json, os
+
+import pytest
+
+from Curvatura import Curvatura, Glif
+from conftest import BLOB, glif_text
+
+KAPPA = 0.5522847498 # handle length of a quarter circle
+
+# A circle of radius 100, which has nothing to audit.
+CIRCLE = [(100,0,1),(100,100*KAPPA,0),(100*KAPPA,100,0),(0,100,1),
+(-100*KAPPA,100,0),(-100,100*KAPPA,0),(-100,0,1),(-100,-100*KAPPA,0),
+(-100*KAPPA,-100,0),(0,-100,1),(100*KAPPA,-100,0),(100,-100*KAPPA,0)]
+
+# Quarter circles of the radii 50 and 100 meeting at the smooth node 
+# (100,0) with a kink of the curvature, closed by a straight segment.
+KINK = [(50,-50,2),(50+50*KAPPA,-50,0),(100,-50*KAPPA,0),(100,0,1),
+(100,100*KAPPA,0),(100*KAPPA,100,0),(0,100,2),(50/3,50,0),(100/3,0,0)]
+
+# A closed contour with an S-shaped segment (one missing inflection).
+S = [(0,0,2),(100,100,0),(200,-100,0),(300,0,2),(300,100,0),(0,100,0)]
+
+GLYPHS = {"o": [CIRCLE], "kink": [KINK], "s": [S], "blob": [BLOB]}
+
+def audit(*names):
+	return Curvatura.audit_buffers([Glif(glif_text(name,GLYPHS[name]
+	).encode()).buffers for name in names])
+
+def test_known_kinks():
+	o, kink, s = audit("o","kink","s")
+	assert o["curvature_jump"] < 1e-12 and o["tunni"] < 1e-9
+	assert (o["inflections"], o["smooth_nodes"], o["segments"]) == (0,4,4)
+	# the curvature at the ends of a quarter circle of radius r is
+	# 2/3*(1-KAPPA)/KAPPA**2/r:
+	assert kink["curvature_jump"] == pytest.approx(
+	2/3*(1-KAPPA)/KAPPA**2*(1/50-1/100),rel=1e-9)
+	assert (kink["inflections"], kink["smooth_nodes"]) == (0,1)
+	assert (s["inflections"], s["smooth_nodes"], s["segments"]) == (1,0,2)
+
+def test_ranking():
+	report = Curvatura.audit_glyphs(["o","kink","s"],[Glif(glif_text(name,
+	GLYPHS[name]).encode()).buffers for name in ("o","kink","s")])
+	assert [r["glyph"] for r in report][-1] == "o"
+	assert report[-1]["score"] < 1 <= min(r["score"] for r in report[:-1])
+
+def test_audit_leaves_the_ufo_unchanged(ufo,tmp_path):
+	source = ufo("A.ufo",GLYPHS)
+	def snapshot():
+		files = {}
+		for root, dirs, names in os.walk(source):
+			for name in names:
+				path = os.path.join(root,name)
+				with open(path,"rb") as f:
+					files[path] = (f.read(),os.stat(path).st_mtime_ns)
+		return files
+	before = snapshot()
+	output = str(tmp_path/"report.json")
+	Curvatura.main(["--audit","-j","1","-o",output,source])
+	assert snapshot() == before
+	with open(output) as f:
+		report = json.load(f)
+	assert report["needing_work"] == 3
+	glyphs = dict((r["glyph"],r) for r in report["glyphs"])
+	assert set(glyphs) == set(GLYPHS)
+	assert glyphs["o"]["score"] < 1
+	assert glyphs["kink"]["curvature_jump"] == pytest.approx(
+	audit("kink")[0]["curvature_jump"])
+	assert glyphs["s"]["inflections"] == 1
@@ -0,0 +1,42 @@
+import pytest
+
+from Curvatura import Curvatura, Glif, SFDGlyph
+from conftest import BLOB, glif_text
+
+# BLOB with a corner at its second node
+CORNER = BLOB[:3]+[(200,100,2)]+BLOB[4:]
+
+# Returns the lines of an .sfd glyph with the closed contour (a list of
+# points like BLOB that starts on-curve, flags 0 for curve and 1 for
+# corner points).
+def sfd_lines(contour):
+	lines = ["StartChar: a\n","Encoding: 97 97 0\n","Fore\n","SplineSet\n"]
+	first = contour[0]
+	points = contour[1:]+contour[:1]
+	lines.append("%r %r m %d\n" % (first[0],first[1],first[2]-1))
+	for k in range(0,len(points),3):
+		(cx, cy, _), (dx, dy, _), (x, y, on) = points[k:k+3]
+		lines.append(" %r %r %r %r %r %r c %d\n" % (cx,cy,dx,dy,x,y,on-1))
+	return lines+["EndSplineSet\n","EndChar\n"]
+
+def points(outline):
+	return [(list(b.x),list(b.y),list(b.flags)) for b in outline.buffers]
+
+@pytest.mark.parametrize("contour",[BLOB,CORNER])
+@pytest.mark.parametrize("actions",[["harmonize"],["harmonizehandles"],
+["tunnify"],["inflection"],["softmerge"],Curvatura.cleanup_actions])
+def test_glif_and_sfd_agree(contour,actions):
+	glif = Glif(glif_text("a",[contour]).encode())
+	sfd = SFDGlyph(sfd_lines(contour))
+	assert points(glif) == points(sfd)
+	for outline in (glif,sfd):
+		Curvatura.process_outlines(actions,[outline],0,False,None)
+	assert points(glif) == points(sfd)
+	assert glif.changed() == sfd.changed()
+	if "harmonize" in actions or "tunnify" in actions:
+		assert sfd.changed()
+
+def test_sfd_curve_points_are_smooth():
+	sfd = SFDGlyph(sfd_lines(CORNER))
+	smooth = [bool(f & 4) for f in sfd.buffers[0].flags if f & 1]
+	assert smooth == [True,False,True,True]
@@ -0,0 +1,52 @@
+import sys
+
+import pytest
+
+import CurvaturaBenchmark as bench
+
+Curvatura = bench.import_curvatura(True).Curvatura
+ff = sys.modules["fontforge"]
+
+from baseline import Baseline
+
+# Returns the points of the contours of the glyph, where closed contours
+# start at their first on-curve point (merging the first node may move
+# the start).
+def outline(glyph):
+	contours = []
+	for c in glyph.layers[1]:
+		points = [(p.x,p.y,p.on_curve) for p in c]
+		if c.closed:
+			r = next((k for k in range(len(points)) if points[k][2]),0)
+			points = points[r:]+points[:r]
+		contours.append(points)
+	return contours
+
+def assert_close(a,b):
+	assert len(a) == len(b)
+	for c, d in zip(a,b):
+		assert len(c) == len(d)
+		for p, q in zip(c,d):
+			assert p[2] == q[2]
+			assert p[0] == pytest.approx(q[0],rel=1e-9,abs=1e-9)
+			assert p[1] == pytest.approx(q[1],rel=1e-9,abs=1e-9)
+
+@pytest.mark.parametrize("action",["harmonize","harmonizehandles",
+"tunnify","inflection","softmerge"])
+@pytest.mark.parametrize("quadratic",[False,True])
+@pytest.mark.parametrize("selected",["none","alternate",.3])
+@pytest.mark.parametrize("closed",[True,False])
+def test_actions_agree_with_the_baseline(action,quadratic,selected,closed):
+	if (action == "softmerge" and closed and not quadratic
+	and selected in {"none","alternate"}):
+		pytest.skip("the baseline moves the node before the merged one "
+		+"(instead of the handle) if it merges the first point")
+	make = lambda: bench.make_glyph(ff,"a",2,12,quadratic,.3,selected,7,
+	closed)
+	glyph, reference = make(), make()
+	Curvatura.modify_contours(action,glyph)
+	is_glyph_variant = not any(p.selected for c in reference.layers[1] 
+	for p in c)
+	for c in reference.layers[1]:
+		Baseline.modify_contour(action,c,is_glyph_variant)
+	assert_close(outline(glyph),outline(reference))
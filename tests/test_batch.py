@@ -0,0 +1,44 @@
+import math
+
+import pytest
+
+import Curvatura as module
+from Curvatura import Curvatura
+from conftest import DOUBLE_ROOTS, random_segments
+
+numpy = pytest.importorskip("numpy")
+if module.numpy is None:
+	pytest.skip("Curvatura runs without numpy",allow_module_level=True)
+
+SEGMENTS = DOUBLE_ROOTS+random_segments(3000,100) \
++random_segments(3000,10,1)+random_segments(1000,None,2)
+
+def assert_rows(rows,expected,tolerance=1e-6):
+	assert len(rows) == len(expected)
+	for s, r, e in zip(SEGMENTS,rows,expected):
+		for x, y in zip(r,e):
+			if math.isnan(y):
+				assert math.isnan(x), s
+			else:
+				assert x == pytest.approx(y,rel=tolerance,abs=tolerance), s
+
+def test_tunnify_batch_agrees_with_tunnify():
+	assert_rows(Curvatura.tunnify_batch(SEGMENTS),
+	[Curvatura.tunnify(*s) for s in SEGMENTS])
+
+def test_inflection_batch_agrees_with_inflection():
+	expected = [Curvatura.inflection(*s) for s in SEGMENTS]
+	assert_rows([[t] for t in Curvatura.inflection_batch(SEGMENTS)],
+	[[math.nan if t is None else t] for t in expected],1e-9)
+
+def test_inflections_batch_agrees_with_inflections():
+	expected = [Curvatura.inflections(*s) for s in SEGMENTS]
+	assert_rows(Curvatura.inflections_batch(SEGMENTS),
+	[t+[math.nan]*(2-len(t)) for t in expected],1e-9)
+
+def test_chord_angles_batch_agrees_with_chord_angles():
+	rows = numpy.stack(Curvatura.chord_angles_batch(SEGMENTS),axis=1)
+	# without a chord, only l, alpha and beta are defined
+	expected = [Curvatura.chord_angles(*s) if s[:2] != s[6:] 
+	else (0.,math.nan,math.nan) for s in SEGMENTS]
+	assert_rows(rows,expected,1e-12)
@@ -0,0 +1,195 @@
+import math, os
+
+import pytest
+
+from Curvatura import Curvatura, Glif, ResultCache, SegmentCache
+from conftest import BLOB, glif_text, random_segments
+
+# Returns the segment rotated by angle, scaled by scale and translated.
+def moved(segment,angle=.7,scale=2.5,dx=13,dy=-7):
+	cos, sin = math.cos(angle), math.sin(angle)
+	return [v for x, y in zip(segment[0::2],segment[1::2]) for v in 
+	(scale*(cos*x-sin*y)+dx,scale*(sin*x+cos*y)+dy)]
+
+def test_lookup_evicts_the_least_recently_used():
+	cache = SegmentCache(3)
+	computed = []
+	def lookup(*values):
+		keys = [cache.key("k",v) for v in values]
+		def compute(indices):
+			computed.extend(values[i] for i in indices)
+			return [10*values[i] for i in indices]
+		return cache.lookup(keys,compute)
+	assert lookup(1,2,3) == [10,20,30]
+	assert lookup(1) == [10] # 2 is the least recently used now
+	assert lookup(4) == [40]
+	assert len(cache.entries) == 3
+	assert cache.key("k",2) not in cache.entries
+	del computed[:]
+	assert lookup(1,3,4,2) == [10,30,40,20]
+	assert computed == [2]
+	assert cache.stats()["entries"] == 3
+
+def test_duplicates_are_computed_once():
+	cache = SegmentCache()
+	keys = [cache.key("k",1.)]*3
+	calls = []
+	assert cache.lookup(keys,lambda indices: calls.append(indices) 
+	or [1]*len(indices)) == [1]*3
+	assert calls == [[0]]
+	assert (cache.hits, cache.misses) == (2,1)
+
+@pytest.mark.parametrize("value",[math.nan,math.inf,-math.inf,1e301])
+def test_non_finite_keys_are_not_cached(value):
+	cache = SegmentCache()
+	assert cache.key("k",1.,value) is None
+	calls = []
+	assert cache.lookup([None,None],lambda indices: calls.append(indices)
+	or [5]*len(indices)) == [5,5]
+	assert calls == [[0,1]]
+	assert len(cache.entries) == 0 and cache.hits == cache.misses == 0
+
+def test_tiny_keys_stay_apart_from_zero():
+	cache = SegmentCache()
+	assert cache.key("k",1e-20) != cache.key("k",0.)
+
+def test_tunnify_cached_agrees_with_tunnify():
+	segments = random_segments(200)+random_segments(200,100,1)
+	handles = Curvatura.tunnify_batch(segments)
+	cached = Curvatura.tunnify_cached(segments,SegmentCache())
+	for h, c in zip(handles,cached):
+		assert c == pytest.approx(h,abs=1e-9)
+
+def test_moved_copies_hit_the_cache():
+	segments = random_segments(100)
+	copies = [moved(s) for s in segments]
+	cache = SegmentCache()
+	Curvatura.tunnify_cached(segments,cache)
+	misses = cache.misses
+	cached = Curvatura.tunnify_cached(copies,cache)
+	assert cache.misses == misses
+	assert cache.hits == len(copies)
+	for h, c in zip(Curvatura.tunnify_batch(copies),cached):
+		assert c == pytest.approx(h,abs=1e-8)
+
+def test_degenerate_segments_are_not_cached():
+	segments = [[10,10,20,30,40,30,10,10],[0,0,30,40,70,80,100,0]]
+	cache = SegmentCache()
+	cached = Curvatura.tunnify_cached(segments,cache)
+	assert len(cache.entries) == 1
+	for h, c in zip(Curvatura.tunnify_batch(segments),cached):
+		assert c == pytest.approx(h,abs=1e-9)
+
+# A closed contour with an S-shaped segment, which gets an inflection node.
+S = [(0,0,2),(100,100,0),(200,-100,0),(300,0,2),(300,100,0),(0,100,0)]
+
+# Returns the contour buffers of a .glif file with the contours.
+def buffers(contours=(BLOB,S)):
+	return Glif(glif_text("a",contours).encode()).buffers
+
+def state(buffers):
+	return [(list(b.x),list(b.y),list(b.origin),bytes(b.flags),
+	b.restructured) for b in buffers]
+
+def processed(actions=("inflection","harmonize")):
+	bs = buffers()
+	Curvatura.modify_pipeline(list(actions),bs,True)
+	return bs
+
+def test_pack_unpack_round_trip():
+	bs = processed()
+	assert [b.restructured for b in bs] == [False,True]
+	contours = ResultCache.unpack(ResultCache.pack(bs))
+	assert [(list(x),list(y),list(origin),bytes(flags),restructured) for
+	x, y, origin, flags, restructured in contours] == state(bs)
+
+def test_store_and_restore(tmp_path):
+	path = str(tmp_path/"results")
+	key = ResultCache.key(["inflection","harmonize"],buffers())
+	cache = ResultCache(path)
+	cache.store(key,processed())
+	cache.close()
+	cache = ResultCache(path)
+	bs = buffers()
+	assert cache.restore(key,bs)
+	assert state(bs) == state(processed())
+	assert all(b.topology is None for b in bs)
+	assert not cache.restore(ResultCache.key(["tunnify"],buffers()),buffers())
+	assert (cache.hits, cache.misses) == (1,1)
+	cache.close()
+
+def test_truncated_data_is_rejected():
+	data = ResultCache.pack(processed())
+	for n in range(len(data)):
+		assert ResultCache.unpack(data[:n]) is None
+	assert ResultCache.unpack(data+b"\0") is None
+	assert ResultCache.unpack(b"\xff"*8+data[8:]) is None
+
+@pytest.mark.parametrize("options, name, value",[
+("harmonize_options","iterations",7),("tunnify_options","fast",True),
+("energy_options","method","gauss")])
+def test_option_changes_drop_the_results(tmp_path,options,name,value):
+	path = str(tmp_path/"results")
+	key = ResultCache.key(["harmonize"],buffers())
+	cache = ResultCache(path)
+	cache.store(key,processed(["harmonize"]))
+	cache.close()
+	old = getattr(Curvatura,options)[name]
+	getattr(Curvatura,options)[name] = value
+	try:
+		cache = ResultCache(path)
+		assert not cache.restore(key,buffers())
+		cache.close()
+	finally:
+		getattr(Curvatura,options)[name] = old
+	cache = ResultCache(path) # the results of value are gone, too
+	assert not cache.restore(key,buffers())
+	cache.close()
+
+def test_corrupt_file_is_replaced(tmp_path):
+	path = str(tmp_path/"results")
+	with open(path,"wb") as f:
+		f.write(b"no sqlite file"*100)
+	cache = ResultCache(path)
+	key = ResultCache.key(["harmonize"],buffers())
+	assert not cache.restore(key,buffers())
+	cache.store(key,processed(["harmonize"]))
+	cache.close()
+	cache = ResultCache(path)
+	assert cache.restore(key,buffers())
+	cache.close()
+
+def test_commit_evicts_the_least_recently_used(tmp_path):
+	path = str(tmp_path/"results")
+	outlines = [buffers([BLOB[k:]+BLOB[:k]]) for k in (0,3,6)]
+	keys = [ResultCache.key(["harmonize"],bs) for bs in outlines]
+	cache = ResultCache(path)
+	for key, bs in zip(keys[:2],outlines):
+		cache.store(key,bs)
+	cache.close()
+	cache = ResultCache(path,size=2) # a new run uses the first result
+	assert cache.restore(keys[0],buffers([BLOB]))
+	cache.store(keys[2],outlines[2])
+	cache.commit()
+	assert {k for k, in cache.db.execute("select key from results")} \
+	== {keys[0],keys[2]}
+	cache.close()
+
+def test_second_batch_run_is_served_from_the_cache(ufo,tmp_path):
+	source = ufo("A.ufo",{"a": [BLOB], "b": [BLOB[3:]+BLOB[:3]],
+	"c": [[(x//2,y,on) for x, y, on in BLOB]]})
+	output = str(tmp_path/"B.ufo")
+	path = str(tmp_path/"results")
+	texts = []
+	for run in range(2):
+		cache = ResultCache(path)
+		counts = Curvatura.batch_ufo(source,output,["inflection","harmonize"],
+		result_cache=cache,force=True)
+		cache.close()
+		texts.append([open(os.path.join(output,"glyphs",name+".glif")).read()
+		for name in "abc"])
+		assert counts["changed"] == 3
+		assert counts["results"]["hits"] == (3 if run else 0)
+		assert counts["results"]["misses"] == (0 if run else 3)
+	assert counts["hits"] == counts["misses"] == 0 # nothing processed
+	assert texts[0] == texts[1]
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from Curvatura import Curvatura
+
+def test_existing_output_is_kept(ufo):
+	source, output = ufo("A.ufo"), ufo("B.ufo")
+	open(os.path.join(output,"only_b"),"w").close()
+	with pytest.raises(SystemExit):
+		Curvatura.main(["-a","tunnify","-j","1","-o",output,source])
+	assert os.path.exists(os.path.join(output,"only_b"))
+
+def test_force_replaces_output(ufo):
+	source, output = ufo("A.ufo"), ufo("B.ufo")
+	open(os.path.join(output,"only_b"),"w").close()
+	Curvatura.main(["-a","tunnify","-j","1","--force","-o",output,source])
+	assert not os.path.exists(os.path.join(output,"only_b"))
+	assert os.path.exists(os.path.join(output,"glyphs","a.glif"))
+
+def test_empty_output_directory_is_used(ufo,tmp_path):
+	source, output = ufo("A.ufo"), str(tmp_path/"E.ufo")
+	os.mkdir(output)
+	Curvatura.main(["-a","tunnify","-j","1","-o",output,source])
+	assert os.path.exists(os.path.join(output,"glyphs","a.glif"))
+
+def test_output_containing_input_is_refused(ufo,tmp_path):
+	source = ufo("A.ufo")
+	with pytest.raises(SystemExit):
+		Curvatura.main(["-a","tunnify","-j","1","--force","-o",
+		str(tmp_path),source])
+	assert os.path.exists(os.path.join(source,"glyphs","a.glif"))
+	with pytest.raises(ValueError):
+		Curvatura.batch_ufo(source,str(tmp_path),["tunnify"],force=True)
+
+def test_batch_ufo_refuses_existing_output(ufo):
+	source, output = ufo("A.ufo"), ufo("B.ufo")
+	with pytest.raises(ValueError):
+		Curvatura.batch_ufo(source,output,["tunnify"])
+
+def test_in_place(ufo):
+	source = ufo("A.ufo")
+	path = os.path.join(source,"glyphs","a.glif")
+	before = open(path).read()
+	Curvatura.main(["-a","tunnify","-j","1","-o",source,source])
+	assert open(path).read() != before
+
+def test_two_names_need_a_new_output_file(ufo,tmp_path):
+	source, other = ufo("A.ufo"), ufo("B.ufo")
+	with pytest.raises(SystemExit):
+		Curvatura.main(["-a","tunnify","-j","1",source,other])
+	existing = tmp_path/"B.sfd"
+	existing.write_text("SplineFontDB: 3.0\n")
+	with pytest.raises(SystemExit):
+		Curvatura.main(["-a","tunnify","-j","1",str(tmp_path/"A.sfd"),
+		str(existing)])
+	assert existing.read_text() == "SplineFontDB: 3.0\n"
+
+def test_output_dir(ufo,tmp_path):
+	source = ufo("A.ufo")
+	output = tmp_path/"out"/"new"
+	Curvatura.main(["-a","tunnify","-j","1","-d",str(output),source])
+	assert (output/"A.ufo"/"glyphs"/"a.glif").exists()
+
+def test_output_dir_needs_different_names(tmp_path):
+	first, second = tmp_path/"x"/"A.sfd", tmp_path/"y"/"A.sfd"
+	with pytest.raises(SystemExit):
+		Curvatura.main(["-a","tunnify","-d",str(tmp_path/"out"),
+		str(first),str(second)])
+	assert not (tmp_path/"out").exists()
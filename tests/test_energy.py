@@ -0,0 +1,55 @@
+import math, random
+
+import pytest
+
+import Curvatura as module
+from Curvatura import Curvatura
+
+# Returns n random paths (alpha,beta,a,b), smooth ones (short handles
+# and moderate angles) or wild ones (which include cusps and loops).
+def paths(n,smooth=True,seed=0):
+	rng = random.Random(seed)
+	if smooth:
+		return [(rng.uniform(-1,1),rng.uniform(-1,1),rng.uniform(.2,.6),
+		rng.uniform(.2,.6)) for k in range(n)]
+	return [(rng.uniform(-3,3),rng.uniform(-3,3),rng.uniform(.01,5),
+	rng.uniform(.01,5)) for k in range(n)]
+
+def exact(path):
+	return Curvatura.energy_quadrature(Curvatura.energy_coefficients(*path),
+	"adaptive",10,1e-9)
+
+def test_simpson_quadrature_is_energy():
+	for path in paths(200):
+		assert Curvatura.energy_quadrature(Curvatura.energy_coefficients(
+		*path)) == pytest.approx(Curvatura.energy(*path),rel=1e-12)
+
+@pytest.mark.parametrize("method, nodes",[("simpson",10),("gauss",10),
+("gauss",20),("adaptive",10)])
+def test_quadratures_agree_on_smooth_paths(method,nodes):
+	for path in paths(300):
+		assert Curvatura.energy_quadrature(Curvatura.energy_coefficients(
+		*path),method,nodes) == pytest.approx(exact(path),rel=2e-2)
+
+def test_unknown_quadrature_is_rejected():
+	with pytest.raises(ValueError):
+		Curvatura.energy_quadrature(Curvatura.energy_coefficients(
+		*paths(1)[0]),"romberg")
+
+def test_bound_is_below_the_exact_energy():
+	for path in paths(300)+paths(2000,False):
+		assert Curvatura.energy_bound(*path) <= exact(path)*(1+1e-9), path
+
+def test_bound_is_below_simpson_on_smooth_paths():
+	for path in paths(300):
+		assert Curvatura.energy_bound(*path) <= Curvatura.energy(*path)
+
+def test_energy_batch_agrees_with_the_quadrature():
+	if module.numpy is None:
+		pytest.skip("numpy is not installed")
+	ps = paths(200)+paths(200,False)
+	for method in ("simpson","gauss","adaptive"):
+		batch = Curvatura.energy_batch(*zip(*ps),method=method)
+		for path, e in zip(ps,batch):
+			assert e == pytest.approx(Curvatura.energy_quadrature(
+			Curvatura.energy_coefficients(*path),method),rel=1e-9)
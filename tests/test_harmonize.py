@@ -0,0 +1,113 @@
+import sys
+
+import pytest
+
+import CurvaturaBenchmark as bench
+
+module = bench.import_curvatura(True)
+Curvatura, ContourBuffer = module.Curvatura, module.ContourBuffer
+ff = sys.modules["fontforge"]
+
+def contour(quadratic,n=60,seed=0):
+	return ContourBuffer.from_contour(bench.make_contour(ff,n,quadratic,.3,
+	"none",seed,True,r=500.))
+
+def points(c):
+	return list(c.x)+list(c.y)
+
+# Returns the contour after repeating the sweeps of harmonize_contour()
+# until nothing moves anymore (the fixed point).
+def fixed_point(c):
+	for k in range(1000):
+		before = points(c)
+		Curvatura.harmonize_contour(c,True)
+		if max(abs(p-q) for p, q in zip(before,points(c))) < 1e-12:
+			return c
+	raise AssertionError("no fixed point")
+
+@pytest.mark.parametrize("quadratic",[False,True])
+@pytest.mark.parametrize("method, relaxation",[("gauss-seidel",1.),
+("gauss-seidel",1.2),("gauss-seidel",1.5),("jacobi",1.),("jacobi",.8)])
+def test_solve_reaches_the_fixed_point(quadratic,method,relaxation):
+	c = contour(quadratic)
+	sweeps = Curvatura.harmonize_solve(c,True,1e-10,method,relaxation,2000)
+	assert sweeps < 2000
+	assert points(c) == pytest.approx(points(fixed_point(contour(quadratic))),
+	abs=1e-6)
+
+@pytest.mark.parametrize("quadratic",[False,True])
+def test_harmonic_contour_exits_at_once(quadratic):
+	c = contour(quadratic)
+	Curvatura.harmonize_solve(c,True,1e-10,iterations=2000)
+	assert Curvatura.harmonize_solve(c,True,1e-6) <= 2
+
+@pytest.mark.parametrize("method, relaxation",[("gauss-seidel",0.),
+("gauss-seidel",2.),("gauss-seidel",-.5),("jacobi",1.5),("jacobi",1.9)])
+def test_divergent_settings_are_rejected(method,relaxation):
+	c = contour(True)
+	before = points(c)
+	with pytest.raises(ValueError):
+		Curvatura.harmonize_solve(c,True,1e-6,method,relaxation)
+	assert points(c) == before
+	with pytest.raises(SystemExit):
+		Curvatura.main(["--harmonize-tolerance","1e-6","--harmonize-method",
+		method,"--relaxation",str(relaxation),"a.sfd"])
+	with pytest.raises(ValueError):
+		module.Service().handle({"id": 1, "actions": "harmonize",
+		"options": {"harmonize": {"tolerance": 1e-6, "method": method, 
+		"relaxation": relaxation}}, "contours": []})
+	assert Curvatura.harmonize_options["relaxation"] == 1.
+
+def test_unknown_method_is_rejected():
+	with pytest.raises(ValueError):
+		Curvatura.harmonize_solve(contour(True),True,1e-6,"newton")
+
+def test_no_convergence_keeps_the_outline():
+	c = contour(True)
+	before = points(c)
+	assert Curvatura.harmonize_solve(c,True,1e-12,iterations=3) == 3
+	assert points(c) == before
+
+def copy(c):
+	return ContourBuffer(c.x[:],c.y[:],c.flags[:],c.closed,c.is_quadratic)
+
+# Drags the point k of the contour c and returns the indices of the
+# points that harmonize_local() moves (by more than 1e-9), the indices
+# it returns and the dragged contour before harmonize_local().
+def drag(c,k,handles=False):
+	c.x[k] += 30
+	c.y[k] -= 20
+	before = copy(c)
+	changed = Curvatura.harmonize_local(c,[k],handles=handles,
+	tolerance=1e-9)
+	moved = [i for i in range(len(c)) if abs(c.x[i]-before.x[i]) > 1e-9
+	or abs(c.y[i]-before.y[i]) > 1e-9]
+	return moved, changed, before
+
+@pytest.mark.parametrize("quadratic, k",[(False,4),(False,5),(True,3)])
+def test_local_matches_the_full_solve(quadratic,k):
+	c = contour(quadratic,24)
+	Curvatura.harmonize_solve(c,True,1e-12,iterations=5000)
+	moved, changed, full = drag(c,k)
+	assert changed == moved
+	if not quadratic: # only the nodes next to the handle
+		assert len(changed) == 2
+	Curvatura.harmonize_solve(full,True,1e-12,iterations=5000)
+	assert points(c) == pytest.approx(points(full),abs=1e-6)
+
+def test_local_handles_match_harmonizehandles():
+	c = contour(False,24)
+	for k in range(30):
+		Curvatura.harmonizehandles_contour(c,True)
+	moved, changed, full = drag(c,4,True)
+	assert changed == moved
+	for k in range(30):
+		Curvatura.harmonizehandles_contour(full,True)
+	assert points(c) == pytest.approx(points(full),abs=1e-5)
+
+def test_local_handles_skip_quadratic_contours():
+	c = contour(True,24)
+	c.x[3] += 30
+	before = points(c)
+	assert Curvatura.harmonize_local(c,[3],handles=True) == []
+	assert points(c) == before
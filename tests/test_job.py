@@ -0,0 +1,123 @@
+import sys
+
+import pytest
+
+import CurvaturaBenchmark as bench
+
+Curvatura = bench.import_curvatura(True)
+Job, Curvatura = Curvatura.Job, Curvatura.Curvatura
+ff = sys.modules["fontforge"]
+
+def glyphs(count,selected="none"):
+	return [bench.make_glyph(ff,"g%d" % k,2,12,False,.3,selected,k)
+	for k in range(count)]
+
+def outline(glyph):
+	return [[(p.x,p.y,p.on_curve,p.type,p.selected) for p in c]
+	for c in glyph.layers[1]]
+
+@pytest.fixture
+def undo_mode():
+	mode = Curvatura.undo_options["mode"]
+	yield lambda m: Curvatura.undo_options.update(mode=m)
+	Curvatura.undo_options["mode"] = mode
+	Curvatura.journal = None
+
+def test_chunks_without_budget_hold_one_glyph():
+	job = Job("harmonize",glyphs(5),budget=0)
+	steps = 1
+	while job.step():
+		steps += 1
+	assert steps == 5
+	assert job.finished() and job.done == 5
+
+def test_first_chunk_is_a_single_glyph():
+	job = Job("harmonize",glyphs(5),budget=1e9)
+	assert job.step()
+	assert job.done == 1
+	assert not job.step()
+	assert job.done == 5
+
+def test_progress_and_undo_snapshots():
+	calls = []
+	gs = glyphs(4)
+	job = Job(["harmonize","tunnify"],gs,budget=0,
+	progress=lambda done, total: calls.append((done,total)),undo="layer")
+	assert job.run()
+	assert calls == [(1,4),(2,4),(3,4),(4,4)]
+	assert [g.undos for g in gs] == [1]*4
+	assert job.journal is None
+
+@pytest.mark.parametrize("keep",[True,False])
+def test_cancel_after_the_first_chunk(keep):
+	gs, before = glyphs(3), [outline(g) for g in glyphs(3)]
+	job = Job("inflection",gs,budget=0,progress=lambda done, total: False,
+	keep=keep)
+	assert not job.run()
+	assert job.cancelled and job.done == 1
+	assert (outline(gs[0]) != before[0]) == keep
+	assert [outline(g) for g in gs[1:]] == before[1:]
+
+@pytest.mark.parametrize("action",["harmonize","inflection","softmerge"])
+def test_cancel_rolls_back_all_chunks(action):
+	gs, before = glyphs(4,"alternate"), [outline(g) for g in
+	glyphs(4,"alternate")]
+	job = Job(action,gs,budget=0,
+	progress=lambda done, total: done < 3,keep=False)
+	assert not job.run()
+	assert job.done == 3
+	assert [outline(g) for g in gs] == before
+
+@pytest.mark.parametrize("action",["harmonizehandles","tunnify",
+"inflection","softmerge",["softmerge","harmonize"]])
+@pytest.mark.parametrize("selected",["none","alternate"])
+def test_journal_round_trip(undo_mode,action,selected):
+	undo_mode("journal")
+	g, before = glyphs(1,selected)[0], outline(glyphs(1,selected)[0])
+	Curvatura.modify_contours(action,g)
+	assert outline(g) != before
+	assert g.undos == 0
+	other = ff.font([])
+	assert Curvatura.can_revert(None,g.font)
+	assert not Curvatura.can_revert(None,other)
+	assert Curvatura.revert_last(None,other) == 0
+	assert Curvatura.revert_last(None,g.font) == 2
+	assert outline(g) == before
+	assert not Curvatura.can_revert(None,g.font)
+	assert Curvatura.revert_last() == 0
+
+def test_journal_skips_contours_edited_since(undo_mode):
+	undo_mode("journal")
+	g = glyphs(1)[0]
+	Curvatura.modify_contours("inflection",g)
+	c = g.layers[1][0]
+	c += ff.point(0,0)
+	edited = outline(g)[0]
+	assert Curvatura.revert_last() == 1
+	assert outline(g)[0] == edited
+
+def test_all_layers_skip_the_background_layers():
+	layers = Curvatura.layer_options["layers"]
+	Curvatura.layer_options["layers"] = "all"
+	try:
+		g = glyphs(1)[0]
+		g.layers[2], g.layers[3] = g.layers[1].dup(), g.layers[1].dup()
+		g.layer_cnt = 4
+		g.font.layers += [bench.layerinfo("Sketch",True),
+		bench.layerinfo("Bold")]
+		assert Curvatura.glyph_layers(g) == [1,3]
+		g.activeLayer = 2
+		assert Curvatura.glyph_layers(g) == [2,1,3]
+	finally:
+		Curvatura.layer_options["layers"] = layers
+
+def test_modify_glyphs_journal_belongs_to_the_font(undo_mode):
+	undo_mode("journal")
+	gs = glyphs(3)
+	before = [outline(g) for g in gs]
+	font = ff.font(gs)
+	Curvatura.modify_glyphs("inflection",font)
+	assert not Curvatura.can_revert(None,glyphs(1)[0].font)
+	assert Curvatura.can_revert(None,font)
+	assert Curvatura.revert_last(None,font) == 6
+	assert [outline(g) for g in gs] == before
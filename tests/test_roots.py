@@ -0,0 +1,76 @@
+import math, random
+
+import pytest
+
+import Curvatura as module
+from Curvatura import Curvatura
+
+# polynomials (coefficients, highest first) with their distinct real roots
+# and the multiplicity of the worst one
+KNOWN = [([1,-10,35,-50,24],[1,2,3,4],1),
+([1,0,-2,0,1],[-1,1],2), # double roots
+([1,-3,3,-1,0],[0,1],3), # a triple root
+([1,-4,6,-4,1],[1],4),
+([1,0,0,0,-16],[-2,2],1),
+([1,0,1,0,1],[],1), # no real roots
+([0,1e-20,1,-3,2],[-1e20,1,2],1), # leading coefficient almost 0
+([0,1e-12,-2e-12,1,-1],[1],1),
+([0,0,1,-2,1],[1],2),
+([0,0,0,2,-1],[.5],1),
+([0,0,0,0,3],[],1),
+([0,0,0,0,0],[],1)] # the zero polynomial
+
+def needs_numpy():
+	if module.numpy is None:
+		pytest.skip("numpy is not installed")
+
+@pytest.mark.parametrize("coeffs, roots, multiplicity",KNOWN)
+def test_real_roots_finds_the_known_roots(coeffs,roots,multiplicity):
+	assert Curvatura.real_roots(coeffs) == pytest.approx(roots,rel=1e-9,
+	abs=1e-9)
+
+@pytest.mark.parametrize("coeffs, roots, multiplicity",KNOWN)
+def test_real_roots_batch_finds_the_known_roots(coeffs,roots,multiplicity):
+	needs_numpy()
+	found = [x for x in Curvatura.real_roots_batch([coeffs])[0] 
+	if not math.isnan(x)]
+	# a root of multiplicity m is only determined up to about eps**(1/m)
+	tolerance = 1e-9 if multiplicity == 1 else 1e-14**(1./multiplicity)
+	assert all(any(x == pytest.approx(r,rel=tolerance,abs=tolerance)
+	for x in found) for r in roots)
+	assert all(any(x == pytest.approx(r,rel=tolerance,abs=tolerance)
+	for r in roots) for x in found)
+
+def test_real_roots_batch_agrees_with_real_roots():
+	needs_numpy()
+	rng = random.Random(0)
+	coeffs = [[rng.choice([0,1])*rng.uniform(-5,5)]+[rng.uniform(-5,5) 
+	for k in range(4)] for n in range(2000)]
+	batch = Curvatura.real_roots_batch(coeffs)
+	for f, found in zip(coeffs,batch):
+		roots = Curvatura.real_roots(f)
+		if any(b-a < 1e-3 for a, b in zip(roots,roots[1:])):
+			continue # (almost) multiple roots, see above
+		assert [x for x in found if not math.isnan(x)] == pytest.approx(
+		roots,rel=1e-9,abs=1e-9), f
+
+def test_scale_handles_batch_agrees_with_scale_handles():
+	needs_numpy()
+	rng = random.Random(1)
+	args = [(rng.uniform(-1.5,1.5),rng.uniform(-1.5,1.5),
+	rng.choice([0.,1e-17,rng.uniform(-3,3)]),
+	rng.choice([0.,-1e-17,rng.uniform(-3,3)])) for n in range(3000)]
+	a, b = Curvatura.scale_handles_batch(*zip(*args))
+	for k in range(len(args)):
+		expected = Curvatura.scale_handles(*args[k])
+		if expected[0] is None:
+			assert math.isnan(a[k]) and math.isnan(b[k]), args[k]
+		else:
+			assert (a[k],b[k]) == pytest.approx(expected,rel=1e-7,abs=1e-7), \
+			args[k]
+
+def test_rounding_level_curvatures_count_as_zero():
+	assert Curvatura.scale_handles(.5,.7,1e-16,.3) \
+	== Curvatura.scale_handles(.5,.7,0.,.3)
+	a, b = Curvatura.scale_handles(.5,.7,2e-16,0.)
+	assert a < 10 and b < 10
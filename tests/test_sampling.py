@@ -0,0 +1,31 @@
+import math, random
+
+import pytest
+
+import Curvatura as module
+from Curvatura import Curvatura
+
+random.seed(3)
+SEGMENTS = [[random.uniform(-500,500) for k in range(8)] 
+for r in range(20)]+[[0,0,0,0,100,0,100,0],[0,0,300,0,-200,0,100,0]]
+
+@pytest.fixture(params=["numpy","python"])
+def backend(request,monkeypatch):
+	if request.param == "numpy" and module.numpy is None:
+		pytest.skip("numpy is not installed")
+	if request.param == "python":
+		monkeypatch.setattr(module,"numpy",None)
+
+@pytest.mark.parametrize("spacing",[0,-1.,float("nan")])
+def test_spacing_must_be_positive(backend,spacing):
+	with pytest.raises(ValueError):
+		Curvatura.sample_segments(SEGMENTS,spacing=spacing)
+
+@pytest.mark.parametrize("spacing",[50.,7.,2.])
+def test_steps_are_at_most_spacing(backend,spacing):
+	r = Curvatura.sample_segments(SEGMENTS,spacing=spacing)
+	segment, x, y = list(r["segment"]), list(r["x"]), list(r["y"])
+	steps = [math.hypot(x[k]-x[k-1],y[k]-y[k-1]) 
+	for k in range(1,len(x)) if segment[k] == segment[k-1]]
+	assert max(steps) <= spacing*(1+1e-6)
+	assert list(r["t"]).count(1.) == len(SEGMENTS)
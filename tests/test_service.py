@@ -0,0 +1,56 @@
+import io, json
+
+from Curvatura import Service
+from conftest import BLOB
+
+# the points of a degenerate contour (all of them coincide)
+POINT = [[0,0,5],[0,0,0],[0,0,0]]*3
+
+def serve(*requests):
+	out = io.StringIO()
+	Service().serve([r if isinstance(r,str) else json.dumps(r) 
+	for r in requests],out)
+	return [json.loads(line) for line in out.getvalue().splitlines()]
+
+def blob(selected=False):
+	return {"closed": True, "points": [[x,y,(5|2*selected) if on else 0]
+	for x, y, on in BLOB]}
+
+def test_answers_in_order():
+	answers = serve({"id": 1, "actions": "harmonize", "contours": [blob()]},
+	{"id": 2, "actions": ["tunnify"], "contours": [blob()]})
+	assert [a["id"] for a in answers] == [1,2]
+	assert all("contours" in a for a in answers)
+	assert answers[0]["contours"][0]["points"] != blob()["points"]
+
+def test_broken_requests_get_errors():
+	answers = serve("[1,2,3]","{broken",
+	{"id": 3, "actions": "harmonize", "options": {"harmonize": 5},
+	"contours": []},
+	{"id": 4, "actions": "harmonize", "options": {"sharpen": {}},
+	"contours": []},
+	{"id": 5, "actions": "harmonize", "options": {"harmonize": {"x": 1}},
+	"contours": []},
+	{"id": 6, "actions": "sharpen", "contours": []},
+	{"id": 7, "actions": "tunnify", "contours": "x"},
+	{"id": 8, "actions": "tunnify", "contours": [{"closed": True}]},
+	{"id": 9, "actions": "tunnify", "contours": [blob()]})
+	assert [a.get("id") for a in answers] == [None,None,3,4,5,6,7,8,9]
+	assert all("error" in a for a in answers[:-1])
+	assert "contours" in answers[-1]
+
+def test_failing_actions_keep_the_service():
+	answers = serve(*[{"id": action, "actions": action, 
+	"contours": [{"points": POINT}]} 
+	for action in ("reduce","softmerge","softmergeall")]
+	+[{"id": "blob", "actions": "reduce", "contours": [blob()]}])
+	assert [a["id"] for a in answers] == ["reduce","softmerge",
+	"softmergeall","blob"]
+	assert "contours" in answers[-1]
+
+def test_options_are_restored():
+	from Curvatura import Curvatura
+	before = dict(Curvatura.reduce_options)
+	serve({"id": 1, "actions": "reduce", "options": {"reduce": 
+	{"distance": 5.}}, "contours": [blob()]})
+	assert Curvatura.reduce_options == before
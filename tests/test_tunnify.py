@@ -0,0 +1,29 @@
+import pytest
+
+import Curvatura as module
+from Curvatura import Curvatura
+from conftest import DOUBLE_ROOTS, random_segments
+
+SEGMENTS = DOUBLE_ROOTS+random_segments(3000,100) \
++random_segments(3000,10,1)+random_segments(1000,None,2)
+
+def assert_handles(handles):
+	assert len(handles) == len(SEGMENTS)
+	for s, h in zip(SEGMENTS,handles):
+		assert list(h) == pytest.approx(list(Curvatura.tunnify(*s)),
+		rel=1e-9,abs=1e-9), s
+
+def test_fast_segment_agrees_with_tunnify():
+	assert_handles([Curvatura.tunnify_fast_segment(*s) for s in SEGMENTS])
+
+def test_fast_agrees_with_tunnify():
+	if module.numpy is None:
+		pytest.skip("numpy is not installed")
+	assert_handles(Curvatura.tunnify_fast(SEGMENTS))
+
+def test_double_roots_keep_their_handle_directions():
+	for s in DOUBLE_ROOTS:
+		c, d, e, f = Curvatura.tunnify(*s)
+		assert (c-s[0])*(s[3]-s[1]) == pytest.approx((d-s[1])*(s[2]-s[0]))
+		assert (e-s[6])*(s[5]-s[7]) == pytest.approx((f-s[7])*(s[4]-s[6]))
+		assert Curvatura.tunnify_fast_segment(*s) == pytest.approx((c,d,e,f))